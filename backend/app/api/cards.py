@@ -1,26 +1,46 @@
+import asyncio
+import json
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.core.auth import AuthenticatedUser, get_current_user
+from app.core.process_pool import PoolSaturatedError
 from app.models import models, schemas
-from app.services.card_generator import CardGenerator
+from app.services.card_writer import insert_cards
+from app.services.daily_quiz import forget_daily_quizzes, open_daily_quiz_ids
+from app.services.dedup import card_signature, filter_duplicate_cards, register_cards, unregister_cards
+from app.services.due_queue import forget_cards
+from app.services.tags import replace_card_tags
+from app.services.generation import (
+    clone_cached_cards,
+    generate_note_cards,
+    generation_cache_key,
+    generation_pool,
+    load_distractor_pool,
+    lookup_cached_cards,
+    store_cached_cards,
+)
 
 router = APIRouter()
 
 
 @router.post("/cards/generate", response_model=List[schemas.Card])
-def generate_cards(
+async def generate_cards(
     request: schemas.GenerateCardsRequest,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ノートからカードを自動生成"""
     # ノートの存在確認
-    note = (
-        db.query(models.Note)
-        .filter(models.Note.id == request.note_id, models.Note.user_id == current_user.id)
-        .first()
+    note = await db.scalar(
+        select(models.Note)
+        .where(models.Note.id == request.note_id, models.Note.user_id == current_user.id)
     )
     
     if not note:
@@ -29,76 +49,176 @@ def generate_cards(
             detail="Note not found"
         )
     
-    # カードを生成
-    generator = CardGenerator()
-    card_creates = generator.generate_cards(
-        text=note.raw_text,
-        note_id=request.note_id,
-        language=request.language,
-        subject=request.subject
-    )
+    # 既存カードを誤選択肢に使う場合、結果はユーザーごとに異なるためキャッシュを使わない
+    distractor_pool = None
+    if request.use_user_distractors:
+        distractor_pool = await db.run_sync(load_distractor_pool, current_user.id)
+    
+    # 同じ内容のノートを生成済みならキャッシュから複製
+    cache_key = generation_cache_key(note.raw_text, request.language, request.subject)
+    cached = None
+    if not distractor_pool:
+        cached = (await db.run_sync(lookup_cached_cards, [cache_key])).get(cache_key)
     
-    # データベースに保存
-    db_cards = []
-    for card_create in card_creates:
-        db_card = models.Card(
-            user_id=current_user.id,
-            note_id=card_create.note_id,
-            type=card_create.type.value,
-            prompt=card_create.prompt,
-            answer=card_create.answer,
-            choices=card_create.choices,
-            tags=card_create.tags,
-            rationale=card_create.rationale
+    if cached is not None:
+        card_dicts = clone_cached_cards(cached, note.id)
+    else:
+        # カードを生成（CPU処理のためイベントループ外で実行）
+        card_dicts = await run_in_threadpool(
+            generate_note_cards, note.raw_text, note.id, request.language, request.subject, distractor_pool
         )
-        db.add(db_card)
-        db_cards.append(db_card)
+        if not distractor_pool:
+            await db.run_sync(store_cached_cards, cache_key, card_dicts, request.language, request.subject)
     
-    db.commit()
+    response.headers["X-Generation-Cache"] = "hit" if cached is not None else "miss"
     
-    # IDを設定するためにrefresh
-    for card in db_cards:
-        db.refresh(card)
+    # 既存カードとほぼ同じものは作成しない
+    card_dicts, skipped = await db.run_sync(filter_duplicate_cards, current_user.id, card_dicts)
+    response.headers["X-Duplicates-Skipped"] = str(skipped)
+    
+    # データベースに保存（RETURNINGで取得するためrefreshは不要）
+    db_cards = await db.run_sync(insert_cards, current_user.id, card_dicts)
+    await db.commit()
+    register_cards(current_user.id, db_cards)
     
     return db_cards
 
 
+@router.post("/cards/generate/batch")
+async def generate_cards_batch(
+    request: schemas.BatchGenerateCardsRequest,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """複数ノートからカードを一括生成し、ノートごとの進捗をNDJSONで返す"""
+    note_ids = list(dict.fromkeys(request.note_ids))
+    if len(note_ids) > settings.CARD_BATCH_MAX_NOTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many notes (max {settings.CARD_BATCH_MAX_NOTES})"
+        )
+    
+    rows = (await db.execute(
+        select(models.Note.id, models.Note.raw_text)
+        .where(models.Note.id.in_(note_ids), models.Note.user_id == current_user.id)
+    )).all()
+    texts = {note_id: raw_text for note_id, raw_text in rows}
+    
+    distractor_pool = None
+    if request.use_user_distractors:
+        distractor_pool = await db.run_sync(load_distractor_pool, current_user.id)
+    
+    # 生成済みの内容はキャッシュから複製し、プロセスプールには投入しない
+    cache_keys = {
+        note_id: generation_cache_key(text, request.language, request.subject)
+        for note_id, text in texts.items()
+    }
+    cached = {}
+    if not distractor_pool:
+        cached = await db.run_sync(lookup_cached_cards, cache_keys.values())
+    
+    # 1リクエストがプールを占有しないよう、同時に投入する件数を制限
+    semaphore = asyncio.Semaphore(generation_pool.max_workers * 2)
+    
+    async def generate(note_id: int):
+        async with semaphore:
+            try:
+                cards = await generation_pool.run(
+                    generate_note_cards, texts[note_id], note_id, request.language, request.subject,
+                    distractor_pool,
+                )
+            except PoolSaturatedError:
+                return note_id, None, "busy"
+            except Exception:
+                return note_id, None, "failed"
+            return note_id, cards, None
+    
+    async def progress():
+        total_cards = 0
+        for note_id in note_ids:
+            if note_id not in texts:
+                yield json.dumps({"note_id": note_id, "status": "not_found"}) + "\n"
+        
+        async def from_cache(note_id: int):
+            return note_id, clone_cached_cards(cached[cache_keys[note_id]], note_id), None
+        
+        tasks = [
+            asyncio.create_task(from_cache(note_id) if cache_keys[note_id] in cached else generate(note_id))
+            for note_id in note_ids if note_id in texts
+        ]
+        try:
+            async with AsyncSessionLocal() as session:
+                for next_done in asyncio.as_completed(tasks):
+                    note_id, cards, error = await next_done
+                    if error:
+                        yield json.dumps({"note_id": note_id, "status": error}) + "\n"
+                        continue
+                    
+                    cache_hit = cache_keys[note_id] in cached
+                    if not cache_hit and not distractor_pool:
+                        await session.run_sync(
+                            store_cached_cards, cache_keys[note_id], cards, request.language, request.subject
+                        )
+                    
+                    cards, skipped = await session.run_sync(filter_duplicate_cards, current_user.id, cards)
+                    
+                    # ノート単位でまとめてINSERT
+                    db_cards = await session.run_sync(insert_cards, current_user.id, cards)
+                    await session.commit()
+                    register_cards(current_user.id, db_cards)
+                    total_cards += len(db_cards)
+                    
+                    yield json.dumps({
+                        "note_id": note_id,
+                        "status": "done",
+                        "cache": "hit" if cache_hit else "miss",
+                        "card_count": len(db_cards),
+                        "skipped_duplicates": skipped,
+                        "card_ids": [card.id for card in db_cards],
+                    }) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        yield json.dumps({"status": "completed", "notes": len(note_ids), "cards": total_cards}) + "\n"
+    
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
 @router.get("/cards", response_model=List[schemas.Card])
-def get_cards(
+async def get_cards(
     skip: int = 0,
     limit: int = 50,
     note_id: int = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """カード一覧を取得"""
-    query = db.query(models.Card).filter(models.Card.user_id == current_user.id)
+    query = select(models.Card).where(models.Card.user_id == current_user.id)
     
     if note_id:
-        query = query.filter(models.Card.note_id == note_id)
+        query = query.where(models.Card.note_id == note_id)
     
-    cards = (
+    cards = (await db.scalars(
         query
         .order_by(models.Card.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
-    )
+    )).all()
     
     return cards
 
 
 @router.get("/cards/{card_id}", response_model=schemas.Card)
-def get_card(
+async def get_card(
     card_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """特定のカードを取得"""
-    card = (
-        db.query(models.Card)
-        .filter(models.Card.id == card_id, models.Card.user_id == current_user.id)
-        .first()
+    card = await db.scalar(
+        select(models.Card)
+        .where(models.Card.id == card_id, models.Card.user_id == current_user.id)
     )
     
     if not card:
@@ -111,17 +231,16 @@ def get_card(
 
 
 @router.patch("/cards/{card_id}", response_model=schemas.Card)
-def update_card(
+async def update_card(
     card_id: int,
     card_update: schemas.CardUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """カードを更新"""
-    card = (
-        db.query(models.Card)
-        .filter(models.Card.id == card_id, models.Card.user_id == current_user.id)
-        .first()
+    card = await db.scalar(
+        select(models.Card)
+        .where(models.Card.id == card_id, models.Card.user_id == current_user.id)
     )
     
     if not card:
@@ -134,24 +253,31 @@ def update_card(
     update_data = card_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(card, field, value)
+    if "prompt" in update_data or "answer" in update_data:
+        card.minhash = card_signature(card.prompt, card.answer).tobytes()
+    if "tags" in update_data:
+        await db.run_sync(replace_card_tags, card)
+    # 出題中のクイズに古い内容を出さないよう、コミット後にキャッシュを削除する
+    quiz_ids = await db.run_sync(open_daily_quiz_ids, current_user.id, [card_id])
     
-    db.commit()
-    db.refresh(card)
+    await db.commit()
+    await db.refresh(card)
+    register_cards(current_user.id, [card])
+    forget_daily_quizzes(quiz_ids)
     
     return card
 
 
 @router.delete("/cards/{card_id}")
-def delete_card(
+async def delete_card(
     card_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """カードを削除"""
-    card = (
-        db.query(models.Card)
-        .filter(models.Card.id == card_id, models.Card.user_id == current_user.id)
-        .first()
+    card = await db.scalar(
+        select(models.Card)
+        .where(models.Card.id == card_id, models.Card.user_id == current_user.id)
     )
     
     if not card:
@@ -160,9 +286,14 @@ def delete_card(
             detail="Card not found"
         )
     
-    # 関連するReviewStateも削除
-    db.query(models.ReviewState).filter(models.ReviewState.card_id == card_id).delete()
-    db.delete(card)
-    db.commit()
+    quiz_ids = await db.run_sync(open_daily_quiz_ids, current_user.id, [card_id])
+    # 関連するReviewState・タグも削除（復習ログは追記専用のため残す）
+    await db.execute(delete(models.ReviewState).where(models.ReviewState.card_id == card_id))
+    await db.execute(delete(models.CardTag).where(models.CardTag.card_id == card_id))
+    await db.delete(card)
+    await db.commit()
+    unregister_cards(current_user.id, [card_id])
+    forget_cards(current_user.id, [card_id])
+    forget_daily_quizzes(quiz_ids)
     
     return {"message": "Card deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,131 @@
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.auth import AuthenticatedUser, get_current_user
+from app.models import models, schemas
+
+router = APIRouter()
+
+
+async def _get_user_job(db: AsyncSession, job_id: int, user_id: int) -> models.Job:
+    job = await db.scalar(
+        select(models.Job)
+        .where(models.Job.id == job_id, models.Job.user_id == user_id)
+    )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job
+
+
+@router.post("/jobs/generate-cards", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_generate_cards(
+    request: schemas.BatchGenerateCardsRequest,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """カード生成ジョブを登録（生成はワーカープロセスで実行）"""
+    note_ids = list(dict.fromkeys(request.note_ids))
+    if len(note_ids) > settings.CARD_BATCH_MAX_NOTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many notes (max {settings.CARD_BATCH_MAX_NOTES})"
+        )
+    
+    job = models.Job(
+        user_id=current_user.id,
+        kind="generate_cards",
+        status=schemas.JobStatus.QUEUED.value,
+        payload={
+            "note_ids": note_ids,
+            "language": request.language,
+            "subject": request.subject,
+            "use_user_distractors": request.use_user_distractors,
+        },
+        total=len(note_ids),
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    
+    return job
+
+
+@router.get("/jobs", response_model=List[schemas.Job])
+async def get_jobs(
+    skip: int = 0,
+    limit: int = 20,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """ジョブ一覧を取得"""
+    jobs = (await db.scalars(
+        select(models.Job)
+        .where(models.Job.user_id == current_user.id)
+        .order_by(models.Job.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )).all()
+    
+    return jobs
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def get_job(
+    job_id: int,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """ジョブの状態・結果を取得"""
+    return await _get_user_job(db, job_id, current_user.id)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=schemas.Job)
+async def cancel_job(
+    job_id: int,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """ジョブをキャンセル（実行中の場合はワーカーが次の区切りで停止）"""
+    job = await _get_user_job(db, job_id, current_user.id)
+    
+    # 待機中ならその場でキャンセル（ワーカーの取得と競合しないよう条件付きUPDATE）
+    cancelled = (await db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == schemas.JobStatus.QUEUED.value)
+        .values(
+            status=schemas.JobStatus.CANCELLED.value,
+            cancel_requested=True,
+            finished_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    
+    if not cancelled:
+        requested = (await db.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == schemas.JobStatus.RUNNING.value)
+            .values(cancel_requested=True, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        
+        if not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Job already finished"
+            )
+    
+    await db.commit()
+    await db.refresh(job)
+    
+    return job
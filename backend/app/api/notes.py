@@ -1,64 +1,179 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.auth import AuthenticatedUser, get_current_user
 from app.models import models, schemas
+from app.services.card_writer import insert_cards
+from app.services.daily_quiz import forget_daily_quizzes, open_daily_quiz_ids
+from app.services.dedup import filter_duplicate_cards, register_cards, signature_indexes
+from app.services.due_queue import due_queues
+from app.services.generation import (
+    clone_cached_cards,
+    generate_analysis_cards,
+    lookup_cached_cards,
+    store_cached_cards,
+)
+from app.services.ingest import UPLOAD_EXTENSIONS, UndecodableUpload, UploadTooLarge, ingest_upload
 
 router = APIRouter()
 
 
 @router.post("/notes", response_model=schemas.Note)
-def create_note(
+async def create_note(
     note: schemas.NoteCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ノートを作成"""
+    title = note.title
+    if not title:
+        note_count = await db.scalar(
+            select(func.count()).select_from(models.Note).where(models.Note.user_id == current_user.id)
+        )
+        title = f"Note {note_count + 1}"
+    
     db_note = models.Note(
         user_id=current_user.id,
         raw_text=note.raw_text,
         source_type=note.source_type.value,
-        title=note.title or f"Note {len(current_user.notes) + 1}"
+        title=title
     )
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    await db.commit()
+    await db.refresh(db_note)
     
     return db_note
 
 
+@router.post("/notes/upload", response_model=schemas.NoteUpload)
+async def upload_note(
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    generate_cards: bool = Form(False),
+    language: str = Form("auto"),
+    subject: str = Form("general"),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """テキスト・Markdown・CSVファイルからノートを作成（必要ならカードも生成）"""
+    filename = file.filename or ""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in UPLOAD_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported file type (allowed: {', '.join(UPLOAD_EXTENSIONS)})"
+        )
+    
+    if file.size is not None and file.size > settings.NOTE_UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {settings.NOTE_UPLOAD_MAX_BYTES} bytes)"
+        )
+    
+    # チャンクごとにデコード・正規化・解析を行う（ファイルI/OとCPU処理のためイベントループ外で実行）
+    try:
+        ingested = await run_in_threadpool(
+            ingest_upload,
+            file.file,
+            UPLOAD_EXTENSIONS[extension],
+            language,
+            subject,
+            settings.NOTE_UPLOAD_MAX_BYTES,
+            settings.NOTE_UPLOAD_CHUNK_BYTES,
+        )
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {settings.NOTE_UPLOAD_MAX_BYTES} bytes)"
+        )
+    except UndecodableUpload as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    finally:
+        await file.close()
+    
+    if not ingested.text:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is empty"
+        )
+    
+    db_note = models.Note(
+        user_id=current_user.id,
+        raw_text=ingested.text,
+        source_type=schemas.SourceType.FILE.value,
+        title=title or os.path.splitext(os.path.basename(filename))[0][:200] or None
+    )
+    db.add(db_note)
+    await db.flush()
+    
+    db_cards = []
+    cache_status = None
+    skipped = 0
+    if generate_cards:
+        # 読み込み時の解析結果とキャッシュキーをそのまま使い、本文を再走査しない
+        cached = (await db.run_sync(lookup_cached_cards, [ingested.cache_key])).get(ingested.cache_key)
+        if cached is not None:
+            card_dicts = clone_cached_cards(cached, db_note.id)
+        else:
+            card_dicts = await run_in_threadpool(
+                generate_analysis_cards, ingested.analysis, db_note.id, language, subject
+            )
+            await db.run_sync(store_cached_cards, ingested.cache_key, card_dicts, language, subject)
+        cache_status = "hit" if cached is not None else "miss"
+        
+        card_dicts, skipped = await db.run_sync(filter_duplicate_cards, current_user.id, card_dicts)
+        db_cards = await db.run_sync(insert_cards, current_user.id, card_dicts)
+    
+    await db.commit()
+    register_cards(current_user.id, db_cards)
+    
+    return schemas.NoteUpload(
+        note=db_note,
+        encoding=ingested.encoding,
+        size_bytes=ingested.size_bytes,
+        cards=db_cards,
+        generation_cache=cache_status,
+        skipped_duplicates=skipped,
+    )
+
+
 @router.get("/notes", response_model=List[schemas.Note])
-def get_notes(
+async def get_notes(
     skip: int = 0,
     limit: int = 20,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ユーザーのノート一覧を取得"""
-    notes = (
-        db.query(models.Note)
-        .filter(models.Note.user_id == current_user.id)
+    notes = (await db.scalars(
+        select(models.Note)
+        .where(models.Note.user_id == current_user.id)
         .order_by(models.Note.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
-    )
+    )).all()
     
     return notes
 
 
 @router.get("/notes/{note_id}", response_model=schemas.Note)
-def get_note(
+async def get_note(
     note_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """特定のノートを取得"""
-    note = (
-        db.query(models.Note)
-        .filter(models.Note.id == note_id, models.Note.user_id == current_user.id)
-        .first()
+    note = await db.scalar(
+        select(models.Note)
+        .where(models.Note.id == note_id, models.Note.user_id == current_user.id)
     )
     
     if not note:
@@ -71,16 +186,15 @@ def get_note(
 
 
 @router.delete("/notes/{note_id}")
-def delete_note(
+async def delete_note(
     note_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ノートを削除"""
-    note = (
-        db.query(models.Note)
-        .filter(models.Note.id == note_id, models.Note.user_id == current_user.id)
-        .first()
+    note = await db.scalar(
+        select(models.Note)
+        .where(models.Note.id == note_id, models.Note.user_id == current_user.id)
     )
     
     if not note:
@@ -89,9 +203,17 @@ def delete_note(
             detail="Note not found"
         )
     
-    # 関連するカードも削除
-    db.query(models.Card).filter(models.Card.note_id == note_id).delete()
-    db.delete(note)
-    db.commit()
+    # 関連するカード（とそのReviewState・タグ）も削除（復習ログは追記専用のため残す）
+    note_card_ids = select(models.Card.id).where(models.Card.note_id == note_id)
+    quiz_ids = await db.run_sync(open_daily_quiz_ids, current_user.id, note_card_ids)
+    await db.execute(delete(models.ReviewState).where(models.ReviewState.card_id.in_(note_card_ids)))
+    await db.execute(delete(models.CardTag).where(models.CardTag.card_id.in_(note_card_ids)))
+    await db.execute(delete(models.Card).where(models.Card.note_id == note_id))
+    await db.delete(note)
+    await db.commit()
+    # 削除したカードを索引から外すため、次回の生成時に作り直す
+    signature_indexes.pop(current_user.id)
+    due_queues.pop(current_user.id)
+    forget_daily_quizzes(quiz_ids)
     
     return {"message": "Note deleted successfully"}
\ No newline at end of file
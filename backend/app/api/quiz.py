@@ -1,25 +1,61 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from app.core.database import get_db
-from app.core.auth import get_current_user
+from app.core.database import get_async_db
+from app.core.auth import AuthenticatedUser, get_current_user
 from app.models import models, schemas
-from app.services.spaced_repetition import SM2Algorithm
+from app.services.activity import record_activity
+from app.services.daily_quiz import daily_quiz_key, daily_quiz_payloads, get_open_daily_quiz_id
+from app.services.scheduling import answer_quality, get_scheduler
+from app.services.tags import get_tag_cards, record_tag_results
 
 router = APIRouter()
 
 
 @router.get("/daily-quiz", response_model=schemas.DailyQuiz)
-def get_daily_quiz(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_daily_quiz(
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """今日の学習クイズを取得"""
-    sm2 = SM2Algorithm()
+    """
+    今日の学習クイズを取得
     
+    同じ学習日（STUDY_TIMEZONE）の未提出のクイズがあればそれを返し、なければ作成する。
+    クイズの内容はシリアライズ済みのJSONをキャッシュし、2回目以降は書き込みをしない。
+    """
+    scheduler = get_scheduler()
+    key = daily_quiz_key()
+    
+    quiz_id = await db.run_sync(get_open_daily_quiz_id, current_user.id, key)
+    cached = daily_quiz_payloads.get(quiz_id) if quiz_id is not None else None
+    if cached is None:
+        if quiz_id is None:
+            quiz = await _create_daily_quiz(db, scheduler, current_user.id, key)
+        else:
+            quiz = await _load_quiz(db, quiz_id)
+        cached = (quiz.model_dump_json().encode(), len(quiz.quiz_items))
+        daily_quiz_payloads.set(quiz.id, cached)
+    payload, item_count = cached
+    
+    # 統計情報を取得（件数はキャッシュせずに毎回求める）
+    remaining_count = await scheduler.count_due_cards_async(db, current_user.id) - item_count
+    streak_days = await scheduler.calculate_study_streak_async(db, current_user.id)
+    
+    # schemas.DailyQuiz と同じ形のJSONを、キャッシュしたクイズのJSONに件数を付けて組み立てる
+    return Response(
+        content=b'{"quiz":' + payload
+        + f',"remaining_count":{max(0, remaining_count)},"streak_days":{streak_days}}}'.encode(),
+        media_type="application/json"
+    )
+
+
+async def _create_daily_quiz(db: AsyncSession, scheduler, user_id: int, key: str) -> schemas.Quiz:
+    """今日のクイズを作成（同時のリクエストが先に作成していればそれを返す）"""
     # 今日学習すべきカードを取得
-    daily_cards = sm2.get_daily_cards(db, current_user.id)
+    daily_cards = await scheduler.get_daily_cards_async(db, user_id)
     
     if not daily_cards:
         raise HTTPException(
@@ -27,80 +63,183 @@ def get_daily_quiz(
             detail="No cards available for today"
         )
     
-    # クイズを作成
+    # クイズを作成（IDを得るためにフラッシュし、アイテムと一緒にコミット）
+    db_quiz = models.Quiz(
+        user_id=user_id,
+        title=f"Daily Quiz - {key}",
+        daily_key=key
+    )
+    db.add(db_quiz)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # (user_id, daily_key) の一意インデックスに違反したら、先に作成されたクイズを使う
+        await db.rollback()
+        quiz_id = await db.run_sync(get_open_daily_quiz_id, user_id, key)
+        if quiz_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Daily quiz was submitted concurrently"
+            )
+        return await _load_quiz(db, quiz_id)
+    
+    # クイズアイテムを1回のINSERTで作成
+    # RETURNINGの行の順序は保証されないため、カードIDでアイテムを引く
+    quiz_items = {
+        item.card_id: item
+        for item in await db.scalars(
+            insert(models.QuizItem).returning(models.QuizItem),
+            [{"quiz_id": db_quiz.id, "card_id": card.id} for card in daily_cards],
+        )
+    }
+    
+    await db.commit()
+    
+    return schemas.Quiz(
+        id=db_quiz.id,
+        user_id=db_quiz.user_id,
+        title=db_quiz.title,
+        completed=db_quiz.completed,
+        score=db_quiz.score,
+        created_at=db_quiz.created_at,
+        completed_at=db_quiz.completed_at,
+        quiz_items=[
+            schemas.QuizItem(
+                id=quiz_items[card.id].id,
+                card_id=card.id,
+                card=schemas.Card(
+                    id=card.id,
+                    user_id=card.user_id,
+                    note_id=card.note_id,
+                    type=schemas.QuestionType(card.type),
+                    prompt=card.prompt,
+                    answer=card.answer,
+                    choices=card.choices,
+                    tags=card.tags,
+                    rationale=card.rationale,
+                    created_at=card.created_at
+                )
+            ) for card in daily_cards
+        ]
+    )
+
+
+async def _load_quiz(db: AsyncSession, quiz_id: int) -> schemas.Quiz:
+    """クイズとアイテム・カードを読み込む（アイテムとカードは1回のクエリ）"""
+    quiz = await db.get(models.Quiz, quiz_id)
+    rows = (await db.execute(
+        select(models.QuizItem, models.Card)
+        .join(models.Card, models.Card.id == models.QuizItem.card_id)
+        .where(models.QuizItem.quiz_id == quiz_id)
+        .order_by(models.QuizItem.id)
+    )).all()
+    
+    return schemas.Quiz(
+        id=quiz.id,
+        user_id=quiz.user_id,
+        title=quiz.title,
+        completed=quiz.completed,
+        score=quiz.score,
+        created_at=quiz.created_at,
+        completed_at=quiz.completed_at,
+        quiz_items=[
+            schemas.QuizItem(
+                id=item.id,
+                card_id=item.card_id,
+                card=schemas.Card(
+                    id=card.id,
+                    user_id=card.user_id,
+                    note_id=card.note_id,
+                    type=schemas.QuestionType(card.type),
+                    prompt=card.prompt,
+                    answer=card.answer,
+                    choices=card.choices,
+                    tags=card.tags,
+                    rationale=card.rationale,
+                    created_at=card.created_at
+                ),
+                user_answer=item.user_answer,
+                is_correct=item.is_correct,
+                time_sec=item.time_sec
+            ) for item, card in rows
+        ]
+    )
+
+
+@router.get("/drill", response_model=schemas.Quiz)
+async def get_tag_drill(
+    tag: str,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """タグを指定した練習クイズを作成（期限の早いカードから出題）"""
+    cards = await db.run_sync(get_tag_cards, current_user.id, tag, limit)
+    
+    if not cards:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No cards with this tag"
+        )
+    
     db_quiz = models.Quiz(
         user_id=current_user.id,
-        title=f"Daily Quiz - {datetime.now().strftime('%Y-%m-%d')}"
+        title=f"Drill - {tag}"
     )
     db.add(db_quiz)
-    db.commit()
-    db.refresh(db_quiz)
-    
-    # クイズアイテムを作成
-    quiz_items = []
-    for card in daily_cards:
-        quiz_item = models.QuizItem(
-            quiz_id=db_quiz.id,
-            card_id=card.id
+    await db.flush()
+    
+    # RETURNINGの行の順序は保証されないため、カードIDでアイテムを引く
+    quiz_items = {
+        item.card_id: item
+        for item in await db.scalars(
+            insert(models.QuizItem).returning(models.QuizItem),
+            [{"quiz_id": db_quiz.id, "card_id": card.id} for card in cards],
         )
-        db.add(quiz_item)
-        quiz_items.append(quiz_item)
-    
-    db.commit()
-    
-    # レスポンスを構築
-    for item in quiz_items:
-        db.refresh(item)
-    
-    # 統計情報を取得
-    remaining_count = len(sm2.get_due_cards(db, current_user.id, limit=100)) - len(daily_cards)
-    streak_days = sm2.calculate_study_streak(db, current_user.id)
-    
-    return schemas.DailyQuiz(
-        quiz=schemas.Quiz(
-            id=db_quiz.id,
-            user_id=db_quiz.user_id,
-            title=db_quiz.title,
-            completed=db_quiz.completed,
-            score=db_quiz.score,
-            created_at=db_quiz.created_at,
-            completed_at=db_quiz.completed_at,
-            quiz_items=[
-                schemas.QuizItem(
-                    id=item.id,
-                    card_id=item.card_id,
-                    card=schemas.Card(
-                        id=item.card.id,
-                        user_id=item.card.user_id,
-                        note_id=item.card.note_id,
-                        type=schemas.QuestionType(item.card.type),
-                        prompt=item.card.prompt,
-                        answer=item.card.answer,
-                        choices=item.card.choices,
-                        tags=item.card.tags,
-                        rationale=item.card.rationale,
-                        created_at=item.card.created_at
-                    )
-                ) for item in quiz_items
-            ]
-        ),
-        remaining_count=max(0, remaining_count),
-        streak_days=streak_days
+    }
+    
+    await db.commit()
+    
+    return schemas.Quiz(
+        id=db_quiz.id,
+        user_id=db_quiz.user_id,
+        title=db_quiz.title,
+        completed=db_quiz.completed,
+        score=db_quiz.score,
+        created_at=db_quiz.created_at,
+        completed_at=db_quiz.completed_at,
+        quiz_items=[
+            schemas.QuizItem(
+                id=quiz_items[card.id].id,
+                card_id=card.id,
+                card=schemas.Card(
+                    id=card.id,
+                    user_id=card.user_id,
+                    note_id=card.note_id,
+                    type=schemas.QuestionType(card.type),
+                    prompt=card.prompt,
+                    answer=card.answer,
+                    choices=card.choices,
+                    tags=card.tags,
+                    rationale=card.rationale,
+                    created_at=card.created_at
+                )
+            ) for card in cards
+        ]
     )
 
 
 @router.post("/submit-quiz", response_model=schemas.Quiz)
-def submit_quiz(
+async def submit_quiz(
     submission: schemas.QuizSubmission,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """クイズの回答を提出して採点"""
     # クイズの存在確認
-    quiz = (
-        db.query(models.Quiz)
-        .filter(models.Quiz.id == submission.quiz_id, models.Quiz.user_id == current_user.id)
-        .first()
+    quiz = await db.scalar(
+        select(models.Quiz)
+        .where(models.Quiz.id == submission.quiz_id, models.Quiz.user_id == current_user.id)
     )
     
     if not quiz:
@@ -115,66 +254,105 @@ def submit_quiz(
             detail="Quiz already completed"
         )
     
-    sm2 = SM2Algorithm()
+    scheduler = get_scheduler()
+    
+    # クイズのアイテムとカードを1回のクエリで読み込む
+    rows = (await db.execute(
+        select(
+            models.QuizItem.id,
+            models.QuizItem.card_id,
+            models.QuizItem.user_answer,
+            models.QuizItem.is_correct,
+            models.QuizItem.time_sec,
+            models.Card,
+        )
+        .join(models.Card, models.Card.id == models.QuizItem.card_id)
+        .where(models.QuizItem.quiz_id == quiz.id)
+        .order_by(models.QuizItem.id)
+    )).all()
+    items = [
+        {
+            "id": row.id,
+            "card_id": row.card_id,
+            "card": row.Card,
+            "user_answer": row.user_answer,
+            "is_correct": row.is_correct,
+            "time_sec": row.time_sec,
+        }
+        for row in rows
+    ]
+    items_by_card = {}
+    for item in items:
+        items_by_card.setdefault(item["card_id"], item)
+    
     correct_count = 0
     total_count = len(submission.answers)
+    reviewed_card_ids = []
+    qualities = []
+    time_secs = []
+    tag_results = []
+    total_time_sec = 0
+    answered = {}
     
-    # 各回答を採点してReviewStateを更新
+    # 各回答をメモリ上で採点
     for answer in submission.answers:
-        quiz_item = (
-            db.query(models.QuizItem)
-            .filter(
-                models.QuizItem.quiz_id == submission.quiz_id,
-                models.QuizItem.card_id == answer.card_id
-            )
-            .first()
-        )
-        
-        if not quiz_item:
+        item = items_by_card.get(answer.card_id)
+        if item is None:
             continue
         
         # 採点
-        card = quiz_item.card
+        card = item["card"]
         is_correct = _evaluate_answer(card, answer.user_answer)
         
-        # QuizItemを更新
-        quiz_item.user_answer = answer.user_answer
-        quiz_item.is_correct = is_correct
-        quiz_item.time_sec = answer.time_sec
+        item["user_answer"] = answer.user_answer
+        item["is_correct"] = is_correct
+        item["time_sec"] = answer.time_sec
+        answered[item["id"]] = item
         
         if is_correct:
             correct_count += 1
+        total_time_sec += answer.time_sec or 0
         
-        # ReviewStateを更新（SM-2アルゴリズム）
-        review_state = (
-            db.query(models.ReviewState)
-            .filter(
-                models.ReviewState.user_id == current_user.id,
-                models.ReviewState.card_id == answer.card_id
-            )
-            .first()
+        # 解答品質に変換（正解: 3-5（回答時間による）, 不正解: 1）
+        reviewed_card_ids.append(answer.card_id)
+        qualities.append(answer_quality(is_correct, answer.time_sec))
+        time_secs.append(answer.time_sec)
+        tag_results.append((card.tags, is_correct))
+    
+    # QuizItemを1回の一括UPDATE（主キー指定）で更新
+    if answered:
+        await db.execute(
+            update(models.QuizItem),
+            [
+                {
+                    "id": item["id"],
+                    "user_answer": item["user_answer"],
+                    "is_correct": item["is_correct"],
+                    "time_sec": item["time_sec"],
+                }
+                for item in answered.values()
+            ],
         )
-        
-        if review_state:
-            # SM-2の品質スコアに変換（正解: 4-5, 不正解: 0-2）
-            quality = 4 if is_correct else 1
-            sm2.calculate_next_review(review_state, quality)
     
-    # クイズを完了状態に
+    # ReviewStateをまとめて更新（設定したスケジューラ）し、復習ログに追記
+    await scheduler.apply_reviews_async(db, current_user.id, reviewed_card_ids, qualities, time_secs, quiz.id)
+    
+    # 日ごとの学習量と連続学習日数を更新
+    await db.run_sync(record_activity, current_user.id, len(reviewed_card_ids), correct_count, total_time_sec)
+    
+    # タグごとの回答数・正解数を更新
+    await db.run_sync(record_tag_results, current_user.id, tag_results)
+    
+    # クイズを完了状態に（今日のクイズは次に取得したときに新しく作成する）
     quiz.completed = True
     quiz.score = correct_count / total_count if total_count > 0 else 0.0
     quiz.completed_at = datetime.utcnow()
+    quiz.daily_key = None
     
-    db.commit()
-    
-    # 更新されたクイズを返す
-    db.refresh(quiz)
-    quiz_items = (
-        db.query(models.QuizItem)
-        .filter(models.QuizItem.quiz_id == quiz.id)
-        .all()
-    )
+    await db.commit()
+    daily_quiz_payloads.pop(quiz.id)
     
+    # 採点結果はメモリ上にあるので読み直さずに返す
     return schemas.Quiz(
         id=quiz.id,
         user_id=quiz.user_id,
@@ -185,24 +363,24 @@ def submit_quiz(
         completed_at=quiz.completed_at,
         quiz_items=[
             schemas.QuizItem(
-                id=item.id,
-                card_id=item.card_id,
+                id=item["id"],
+                card_id=item["card_id"],
                 card=schemas.Card(
-                    id=item.card.id,
-                    user_id=item.card.user_id,
-                    note_id=item.card.note_id,
-                    type=schemas.QuestionType(item.card.type),
-                    prompt=item.card.prompt,
-                    answer=item.card.answer,
-                    choices=item.card.choices,
-                    tags=item.card.tags,
-                    rationale=item.card.rationale,
-                    created_at=item.card.created_at
+                    id=item["card"].id,
+                    user_id=item["card"].user_id,
+                    note_id=item["card"].note_id,
+                    type=schemas.QuestionType(item["card"].type),
+                    prompt=item["card"].prompt,
+                    answer=item["card"].answer,
+                    choices=item["card"].choices,
+                    tags=item["card"].tags,
+                    rationale=item["card"].rationale,
+                    created_at=item["card"].created_at
                 ),
-                user_answer=item.user_answer,
-                is_correct=item.is_correct,
-                time_sec=item.time_sec
-            ) for item in quiz_items
+                user_answer=item["user_answer"],
+                is_correct=item["is_correct"],
+                time_sec=item["time_sec"]
+            ) for item in items
         ]
     )
 
@@ -245,21 +423,20 @@ def _evaluate_answer(card: models.Card, user_answer: str) -> bool:
 
 
 @router.get("/quiz-history", response_model=List[schemas.Quiz])
-def get_quiz_history(
+async def get_quiz_history(
     skip: int = 0,
     limit: int = 20,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """クイズ履歴を取得"""
-    quizzes = (
-        db.query(models.Quiz)
-        .filter(models.Quiz.user_id == current_user.id, models.Quiz.completed == True)
+    quizzes = (await db.scalars(
+        select(models.Quiz)
+        .where(models.Quiz.user_id == current_user.id, models.Quiz.completed == True)
         .order_by(models.Quiz.completed_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
-    )
+    )).all()
     
     return [
         schemas.Quiz(
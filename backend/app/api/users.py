@@ -1,12 +1,24 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from app.core.database import get_db
-from app.core.auth import authenticate_user, create_access_token, get_password_hash, get_current_user
+from app.core.database import get_async_db
+from app.core.auth import (
+    AuthenticatedUser,
+    authenticate_user,
+    create_access_token,
+    get_current_user,
+    get_password_hash_async,
+    get_user_by_email,
+)
 from app.core.config import settings
 from app.models import models, schemas
+from app.services.activity import effective_streak, get_activity, get_user_streak, study_day
+from app.services.forecast import forecast_reviews
+from app.services.review_log import ReviewArchive
+from app.services.scheduling import get_scheduler
 
 router = APIRouter()
 security = HTTPBearer()
@@ -23,34 +35,34 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """ユーザー登録"""
     # 既存ユーザーのチェック
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # 新しいユーザーを作成
-    hashed_password = get_password_hash(user.password)
+    # 新しいユーザーを作成（ハッシュ化は専用プロセスプールで実行）
+    hashed_password = await get_password_hash_async(user.password)
     db_user = models.User(
         name=user.name,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 
 @router.post("/login", response_model=Token)
-def login(login_request: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """ログイン"""
-    user = authenticate_user(db, login_request.email, login_request.password)
+    user = await authenticate_user(db, login_request.email, login_request.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,32 +79,33 @@ def login(login_request: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: AuthenticatedUser = Depends(get_current_user)):
     """現在のユーザー情報を取得"""
     return current_user
 
 
 @router.get("/stats", response_model=schemas.UserStats)
-def get_user_stats(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_user_stats(
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """ユーザー統計情報を取得"""
-    from app.services.spaced_repetition import SM2Algorithm
     
-    sm2 = SM2Algorithm()
+    scheduler = get_scheduler()
     
     # 連続日数
-    streak_days = sm2.calculate_study_streak(db, current_user.id)
+    streak_days = await scheduler.calculate_study_streak_async(db, current_user.id)
     
     # 総カード数
-    total_cards = db.query(models.Card).filter(models.Card.user_id == current_user.id).count()
+    total_cards = await db.scalar(
+        select(func.count()).select_from(models.Card).where(models.Card.user_id == current_user.id)
+    )
     
     # 今日期限のカード数
-    due_today = len(sm2.get_due_cards(db, current_user.id, limit=100))
+    due_today = await scheduler.count_due_cards_async(db, current_user.id)
     
     # 弱点タグ
-    weak_tags = sm2.get_weak_tags(db, current_user.id)
+    weak_tags = await scheduler.get_weak_tags_async(db, current_user.id)
     
     # 推奨学習時間（1問1分として計算）
     recommended_study_time = max(due_today, 10)  # 最低10分
@@ -110,4 +123,52 @@ def get_user_stats(
             ) for tag in weak_tags
         ],
         recommended_study_time=recommended_study_time
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/activity", response_model=schemas.ActivityHeatmap)
+async def get_user_activity(
+    days: int = Query(365, ge=1, le=366 * 3),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """学習ヒートマップ（直近 days 日間の日ごとの学習量）と連続学習日数を取得"""
+    end = study_day()
+    start = end - timedelta(days=days - 1)
+    activity = await db.run_sync(get_activity, current_user.id, start, end)
+    streak = await db.run_sync(get_user_streak, current_user.id)
+    
+    return schemas.ActivityHeatmap(
+        start=start,
+        end=end,
+        days=[
+            schemas.DailyActivity(
+                day=row.day,
+                reviews=row.reviews,
+                correct=row.correct,
+                time_sec=row.time_sec
+            ) for row in activity
+        ],
+        current_streak=effective_streak(streak, end),
+        longest_streak=streak.longest_streak if streak else 0
+    )
+
+
+@router.get("/forecast", response_model=schemas.ReviewForecast)
+async def get_review_forecast(
+    days: int = Query(settings.FORECAST_DAYS, ge=1, le=365),
+    runs: int = Query(settings.FORECAST_RUNS, ge=1, le=200),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """今後 days 日間の日ごとの復習数の予測（期限の来たカードを毎日すべて復習した場合）"""
+    archive = ReviewArchive(settings.REVIEW_ARCHIVE_DIR)
+    forecast = await db.run_sync(forecast_reviews, get_scheduler(), current_user.id, days, runs, archive)
+    daily = forecast.daily()
+    
+    return schemas.ReviewForecast(
+        start=forecast.start,
+        runs=runs,
+        days=[schemas.ForecastDay(**row) for row in daily],
+        total_reviews=round(sum(row["reviews"] for row in daily), 1)
+    )
@@ -1,16 +1,73 @@
+import secrets
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.process_pool import BoundedProcessPool, PoolSaturatedError
 from app.models.models import User
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+metrics_security = HTTPBearer(auto_error=False)
+
+# bcryptはCPUを占有するため、リクエスト用スレッドプールとは別のプロセスで実行
+password_pool = BoundedProcessPool(
+    "password_hashing",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+# トークン -> AuthenticatedUser のキャッシュ（認証のためのDBアクセスを省略）
+# ユーザーの変更・削除時の破棄はこのプロセスのキャッシュだけに効くため、他のワーカーでは
+# AUTH_CACHE_TTL_SECONDS 秒（トークンの有効期限の方が短ければそれまで）は変更前のユーザーで認証される
+user_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAXSIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """認証済みユーザーの軽量な識別情報（セッションに紐付かない）"""
+    id: int
+    name: str
+    email: str
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, user: User) -> "AuthenticatedUser":
+        return cls(id=user.id, name=user.name, email=user.email, created_at=user.created_at)
+
+
+def invalidate_user_cache(user_id: int) -> int:
+    """指定ユーザーのキャッシュエントリを破棄"""
+    return user_cache.invalidate_where(lambda token, user: user.id == user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    """ユーザーの変更・削除時にキャッシュを破棄"""
+    invalidate_user_cache(target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_cached_users_on_bulk_write(orm_execute_state: ORMExecuteState):
+    """一括の update()・delete() ではマッパーのイベントが発生しないため、User への文なら実行後にキャッシュを全て破棄"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    if not any(mapper.class_ is User for mapper in orm_execute_state.all_mappers):
+        return None
+    result = orm_execute_state.invoke_statement()
+    user_cache.clear()
+    return result
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -23,6 +80,27 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_in_password_pool(fn, *args):
+    try:
+        return await password_pool.run(fn, *args)
+    except PoolSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """パスワードをプロセスプール上で検証"""
+    return await _run_in_password_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """パスワードをプロセスプール上でハッシュ化"""
+    return await _run_in_password_pool(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """アクセストークンを作成"""
     to_encode = data.copy()
@@ -36,21 +114,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """メールアドレスからユーザーを取得"""
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     """ユーザーを認証"""
-    user = db.query(User).filter(User.email == email).first()
+    user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthenticatedUser:
     """現在のユーザーを取得"""
+    token = credentials.credentials
+    cached_user = user_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,7 +147,7 @@ def get_current_user(
     
     try:
         payload = jwt.decode(
-            credentials.credentials, 
+            token, 
             settings.SECRET_KEY, 
             algorithms=[settings.ALGORITHM]
         )
@@ -69,8 +157,27 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    user = await get_user_by_email(db, email)
     if user is None:
         raise credentials_exception
     
-    return user
\ No newline at end of file
+    current_user = AuthenticatedUser.from_model(user)
+    # トークンの有効期限を超えてキャッシュしない
+    expires_in = payload.get("exp", 0) - time.time()
+    user_cache.set(token, current_user, ttl=expires_in)
+    
+    return current_user
+
+
+def require_metrics_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(metrics_security),
+) -> None:
+    """内部向けのエンドポイントを METRICS_TOKEN で保護（未設定なら存在しないものとして扱う）"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not secrets.compare_digest(credentials.credentials, settings.METRICS_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
\ No newline at end of file
@@ -4,9 +4,99 @@ from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./learn2quiz.db"
+    # 未指定の場合は DATABASE_URL から aiosqlite / asyncpg のURLを導出
+    ASYNC_DATABASE_URL: Optional[str] = None
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # SQLite（ローカル・小規模運用）
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -64000  # 負の値はKiB単位（約64MB）
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB
+
+    # PostgreSQLなどの接続プール
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # 認証済みユーザーのキャッシュ
+    AUTH_CACHE_MAXSIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60  # 他のワーカーでのユーザーの変更・削除はこの秒数以内に反映される
+
+    # /metrics（キャッシュ・プロセスプールの統計）はこのトークンを Bearer で送った場合だけ返す（未設定なら無効）
+    METRICS_TOKEN: Optional[str] = None
+
+    # パスワードハッシュ専用のプロセスプール
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # カード一括生成（未指定の場合はCPUコア数）
+    CARD_GENERATION_WORKERS: Optional[int] = None
+    CARD_GENERATION_MAX_PENDING: int = 256
+    CARD_BATCH_MAX_NOTES: int = 500
+
+    # 生成結果キャッシュ（DBの前段に置くプロセス内LRU）
+    GENERATION_CACHE_MAXSIZE: int = 1000
+    GENERATION_CACHE_TTL_SECONDS: int = 3600
+    # 誤選択肢候補として使う既存カード（ユーザーごと）の上限
+    DISTRACTOR_POOL_MAX_CARDS: int = 500
+
+    # カード作成時に初期ReviewStateも作成する（作成すると新規カード枠ではなく翌日の復習に入る）
+    CARD_EAGER_REVIEW_STATES: bool = False
+
+    # 期限切れカードの件数・順序を答えるユーザーごとのキュー（無効にするとDBで数える）
+    DUE_QUEUE_ENABLED: bool = True
+    DUE_QUEUE_MAXSIZE: int = 1024  # キューをメモリに保持するユーザー数
+    DUE_QUEUE_TTL_SECONDS: int = 60  # 他プロセスでの復習はこの秒数以内に反映される
+    # 次回の期限を間隔に応じた範囲内でずらし、期限のカードが少ない日に寄せる（同じ日に期限が集中するのを防ぐ。既定は無効）
+    DUE_LOAD_BALANCING: bool = False
+
+    # 重複カードの検出（問題文・正解の推定類似度がしきい値以上なら作成しない）
+    CARD_DEDUP_ENABLED: bool = True
+    CARD_DEDUP_THRESHOLD: float = 0.85
+    CARD_DEDUP_INDEX_MAXSIZE: int = 256  # 索引をメモリに保持するユーザー数
+    CARD_DEDUP_INDEX_TTL_SECONDS: int = 3600
+
+    # ノートのファイルアップロード
+    NOTE_UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    NOTE_UPLOAD_CHUNK_BYTES: int = 64 * 1024
+
+    # 学習日の区切り（今日のクイズ・学習記録・連続学習日数で共通）
+    STUDY_TIMEZONE: str = "Asia/Tokyo"
+
+    # 今日のクイズ（同じ日の未提出のクイズを使い回し、シリアライズ済みの内容をキャッシュする）
+    DAILY_QUIZ_CACHE_MAXSIZE: int = 10000
+    DAILY_QUIZ_CACHE_TTL_SECONDS: int = 300
+
+    # 復習スケジューラ（sm2 / fsrs）
+    SCHEDULER: str = "sm2"
+    FSRS_DESIRED_RETENTION: float = 0.9  # 次回の復習時の想起率がこの値になるように間隔を決める
+    FSRS_MAXIMUM_INTERVAL_DAYS: int = 36500
+    FSRS_OPTIMIZER_MIN_REVIEWS: int = 1000  # ユーザーごとのパラメータを推定する最低復習数
+    # 回答時間から解答品質を決める（正解でもこれより遅ければ「苦労した」、速ければ「完璧」）
+    ANSWER_FAST_SECONDS: int = 5
+    ANSWER_SLOW_SECONDS: int = 20
+
+    # 復習量の予測（モンテカルロ法）
+    FORECAST_DAYS: int = 30
+    FORECAST_RUNS: int = 10
+    FORECAST_DEFAULT_ACCURACY: float = 0.85  # 復習ログがない場合の正解率
+
+    # 復習ログのアーカイブ（保持期間を過ぎた月をファイルに移す）
+    REVIEW_EVENTS_RETENTION_DAYS: int = 90
+    REVIEW_ARCHIVE_DIR: str = "review_archive"
+    REVIEW_ARCHIVE_CHUNK_ROWS: int = 500000  # 1回に読み込んで書き出す行数
+
+    # バックグラウンドジョブ
+    JOB_LEASE_SECONDS: int = 60
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_SECONDS: int = 5
     
     class Config:
         env_file = ".env"
@@ -1,21 +1,126 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from .config import settings
+from sqlalchemy.orm import Session, sessionmaker
+from .config import Settings, settings
 
-# SQLiteの場合は check_same_thread=False が必要
-if settings.DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(settings.DATABASE_URL)
+# 同期ドライバに対応する非同期ドライバ
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _apply_sqlite_pragmas(engine: Engine, config: Settings, in_memory: bool) -> None:
+    """接続ごとにSQLiteのPRAGMAを設定"""
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WALにすると読み取りが書き込みをブロックしない（インメモリDBでは不可）
+        if config.SQLITE_WAL and not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size={int(config.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_in_memory(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def _pool_options(config: Settings) -> dict:
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+
+def create_db_engine(url: str = None, config: Settings = settings) -> Engine:
+    """設定に応じてチューニング済みのエンジンを作成"""
+    url = url or config.DATABASE_URL
+
+    if _is_sqlite(url):
+        # SQLiteの場合は check_same_thread=False が必要
+        engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        )
+        _apply_sqlite_pragmas(engine, config, _is_in_memory(url))
+        return engine
+
+    return create_engine(url, **_pool_options(config))
+
+
+def to_async_url(url: str) -> str:
+    """同期用のURLを非同期ドライバ（aiosqlite / asyncpg）のURLに変換"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.drivername == driver:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def create_async_db_engine(url: str = None, config: Settings = settings) -> AsyncEngine:
+    """非同期ドライバのエンジンを作成"""
+    url = url or config.ASYNC_DATABASE_URL or to_async_url(config.DATABASE_URL)
+
+    if _is_sqlite(url):
+        engine = create_async_engine(
+            url,
+            connect_args={"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+        _apply_sqlite_pragmas(engine.sync_engine, config, _is_in_memory(url))
+        return engine
+
+    return create_async_engine(url, **_pool_options(config))
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 非同期セッションではコミット後の遅延ロードを避けるため expire_on_commit=False
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 
+def dialect_insert(db: Session, model):
+    """接続先の方言に応じたINSERT（on_conflict_do_nothing / on_conflict_do_update を使う場合）"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for {dialect}")
+    return insert(model)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,11 +1,13 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import notes, cards, quiz, users
-from app.core.database import engine
-from app.models import models
+from app.api import notes, cards, jobs, quiz, users
+from app.core.auth import password_pool, require_metrics_token, user_cache
+from app.services.daily_quiz import daily_quiz_payloads
+from app.services.dedup import signature_indexes
+from app.services.due_queue import due_queues
+from app.services.generation import generation_cache, generation_pool
 
-# データベーステーブルを作成
-models.Base.metadata.create_all(bind=engine)
+# テーブルは Alembic で管理する（backend/ で `alembic upgrade head`）
 
 app = FastAPI(title="Learn2Quiz API", version="1.0.0")
 
@@ -23,6 +25,12 @@ app.include_router(users.router, prefix="/api/v1")
 app.include_router(notes.router, prefix="/api/v1")
 app.include_router(cards.router, prefix="/api/v1")
 app.include_router(quiz.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    password_pool.shutdown()
+    generation_pool.shutdown()
 
 @app.get("/")
 async def root():
@@ -30,4 +38,16 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    return {
+        "auth_cache": user_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "generation_pool": generation_pool.stats(),
+        "generation_cache": generation_cache.stats(),
+        "card_dedup_indexes": signature_indexes.stats(),
+        "due_queues": due_queues.stats(),
+        "daily_quiz_payloads": daily_quiz_payloads.stats(),
+    }
\ No newline at end of file
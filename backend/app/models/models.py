@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, Boolean, ForeignKey, JSON, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -49,6 +49,7 @@ class Card(Base):
     choices = Column(JSON)  # 選択肢（MCQの場合）
     tags = Column(JSON)  # タグリスト
     rationale = Column(Text)  # 根拠・解説
+    minhash = Column(LargeBinary)  # 重複検出用のMinHash署名（app.services.dedup）
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # リレーション
@@ -56,6 +57,10 @@ class Card(Base):
     note = relationship("Note", back_populates="cards")
     review_state = relationship("ReviewState", back_populates="card", uselist=False)
     quiz_items = relationship("QuizItem", back_populates="card")
+    
+    __table_args__ = (
+        Index("ix_cards_user_created", "user_id", "created_at"),
+    )
 
 
 class ReviewState(Base):
@@ -70,10 +75,18 @@ class ReviewState(Base):
     due_date = Column(DateTime, nullable=False)
     last_result = Column(Integer)  # 0-5
     last_reviewed = Column(DateTime)
+    stability = Column(Float)  # FSRSの記憶安定度（日）。SM-2のみで復習したカードは NULL
+    difficulty = Column(Float)  # FSRSの難易度（1-10）
     
     # リレーション
     user = relationship("User", back_populates="review_states")
     card = relationship("Card", back_populates="review_state")
+    
+    __table_args__ = (
+        # 期限切れカードの取得はインデックスのみで完結させる
+        Index("ix_review_states_user_due", "user_id", "due_date", "card_id"),
+        Index("uq_review_states_user_card", "user_id", "card_id", unique=True),
+    )
 
 
 class Quiz(Base):
@@ -86,10 +99,17 @@ class Quiz(Base):
     score = Column(Float)  # 正答率
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime)
+    daily_key = Column(String(32))  # 未提出の今日のクイズの日付（提出すると NULL）
     
     # リレーション
     user = relationship("User", back_populates="quizzes")
     quiz_items = relationship("QuizItem", back_populates="quiz")
+    
+    __table_args__ = (
+        Index("ix_quizzes_user_completed", "user_id", "completed", "completed_at"),
+        # 同じ日の今日のクイズは1ユーザー1件（同時のリクエストで重複して作成しない）
+        Index("uq_quizzes_user_daily_key", "user_id", "daily_key", unique=True),
+    )
 
 
 class QuizItem(Base):
@@ -105,6 +125,10 @@ class QuizItem(Base):
     # リレーション
     quiz = relationship("Quiz", back_populates="quiz_items")
     card = relationship("Card", back_populates="quiz_items")
+    
+    __table_args__ = (
+        Index("ix_quiz_items_quiz_card", "quiz_id", "card_id"),
+    )
 
 
 class Assignment(Base):
@@ -117,4 +141,122 @@ class Assignment(Base):
     card_ids = Column(JSON)  # 出題するカードのIDリスト
     assignee_ids = Column(JSON)  # 受講者のIDリスト
     due_on = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(50), nullable=False)  # generate_cards
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    progress = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    cancel_requested = Column(Boolean, default=False)
+    available_at = Column(DateTime, default=datetime.utcnow)  # リトライ時はバックオフ後の時刻
+    lease_owner = Column(String(100))  # 実行中のワーカーID
+    lease_expires_at = Column(DateTime)  # 期限切れのジョブは他のワーカーが再取得できる
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_jobs_status_available", "status", "available_at"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
+
+
+class GenerationCacheEntry(Base):
+    __tablename__ = "generation_cache"
+    
+    key = Column(String(64), primary_key=True)  # 正規化したテキスト・生成器バージョン・言語・分野のSHA-256
+    generator_version = Column(String(20), nullable=False)
+    language = Column(String(50))
+    subject = Column(String(50))
+    cards = Column(JSON, nullable=False)  # note_idを除いたカードのリスト
+    card_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DailyActivity(Base):
+    __tablename__ = "daily_activity"
+    
+    # ユーザー・学習日（STUDY_TIMEZONE での日付）ごとの学習量（クイズ提出時に加算）
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    reviews = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    time_sec = Column(Integer, nullable=False, default=0)
+
+
+class UserStreak(Base):
+    __tablename__ = "user_streaks"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0)  # last_active_day までの連続学習日数
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_active_day = Column(Date)
+
+
+class ReviewEvent(Base):
+    __tablename__ = "review_events"
+    
+    # 復習ごとの追記専用ログ（古い月は app.services.review_log でファイルに移してから削除）
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    card_id = Column(Integer, nullable=False)  # カードを削除しても履歴を残すため外部キーにしない
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"))
+    reviewed_at = Column(DateTime, nullable=False)
+    quality = Column(Integer, nullable=False)  # 0-5
+    time_sec = Column(Integer)
+    # 復習後の状態
+    easiness = Column(Float, nullable=False)
+    interval_days = Column(Integer, nullable=False)
+    repetition = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_review_events_reviewed", "reviewed_at"),
+        Index("ix_review_events_user_reviewed", "user_id", "reviewed_at"),
+    )
+
+
+class CardTag(Base):
+    __tablename__ = "card_tags"
+    
+    # Card.tags（JSON）を正規化したもの（タグでの検索・集計用、カードの作成・更新時に同期）
+    card_id = Column(Integer, ForeignKey("cards.id"), primary_key=True)
+    tag = Column(String(100), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_card_tags_user_tag", "user_id", "tag", "card_id"),
+    )
+
+
+class TagStat(Base):
+    __tablename__ = "tag_stats"
+    
+    # ユーザー・タグごとの回答数と正解数（クイズ提出時に加算）
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tag = Column(String(100), primary_key=True)
+    correct = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class SchedulerParams(Base):
+    __tablename__ = "scheduler_params"
+    
+    # 復習履歴から推定したスケジューラのパラメータ（user_id = 0 は全ユーザー共通）
+    scheduler = Column(String(20), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    params = Column(JSON, nullable=False)
+    review_count = Column(Integer, default=0)  # 推定に使った復習数
+    loss = Column(Float)  # 推定後の対数損失
+    fitted_at = Column(DateTime, default=datetime.utcnow)
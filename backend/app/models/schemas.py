@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Any
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 
@@ -16,6 +16,14 @@ class SourceType(str, Enum):
     URL = "url"
 
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
 # User schemas
 class UserBase(BaseModel):
     name: str
@@ -86,6 +94,15 @@ class Card(CardBase):
         from_attributes = True
 
 
+class NoteUpload(BaseModel):
+    note: Note
+    encoding: str
+    size_bytes: int
+    cards: List[Card] = []
+    generation_cache: Optional[str] = None  # hit / miss（カードを生成した場合）
+    skipped_duplicates: int = 0
+
+
 # ReviewState schemas
 class ReviewState(BaseModel):
     id: int
@@ -167,8 +184,63 @@ class UserStats(BaseModel):
     recommended_study_time: int  # minutes
 
 
+class DailyActivity(BaseModel):
+    day: date
+    reviews: int
+    correct: int
+    time_sec: int
+
+
+class ActivityHeatmap(BaseModel):
+    start: date
+    end: date
+    days: List[DailyActivity]  # 学習した日のみ
+    current_streak: int
+    longest_streak: int
+
+
+class ForecastDay(BaseModel):
+    day: date
+    reviews: float  # 試行の平均
+    low: int  # 試行の10%点
+    high: int  # 試行の90%点
+
+
+class ReviewForecast(BaseModel):
+    start: date
+    runs: int
+    days: List[ForecastDay]
+    total_reviews: float
+
+
 # Generation request
 class GenerateCardsRequest(BaseModel):
     note_id: int
     language: Optional[str] = "auto"
-    subject: Optional[str] = "general"
\ No newline at end of file
+    subject: Optional[str] = "general"
+    use_user_distractors: bool = False  # 既存カードの正解も誤選択肢の候補にする
+
+
+class BatchGenerateCardsRequest(BaseModel):
+    note_ids: List[int] = Field(..., min_length=1)
+    language: Optional[str] = "auto"
+    subject: Optional[str] = "general"
+    use_user_distractors: bool = False
+
+
+# Job schemas
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: JobStatus
+    progress: int = 0
+    total: int = 0
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,102 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.models import DailyActivity, UserStreak
+
+
+def study_day(now: Optional[datetime] = None) -> date:
+    """学習日（STUDY_TIMEZONE での日付。タイムゾーンのない日時はUTCとみなす）"""
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    return now.astimezone(ZoneInfo(settings.STUDY_TIMEZONE)).date()
+
+
+def study_day_start(day: date) -> datetime:
+    """学習日の始まり（STUDY_TIMEZONE での0時）をタイムゾーンのないUTCの日時で返す"""
+    start = datetime.combine(day, time(), tzinfo=ZoneInfo(settings.STUDY_TIMEZONE))
+    return start.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def record_activity(
+    db: Session,
+    user_id: int,
+    reviews: int,
+    correct: int,
+    time_sec: int,
+    now: Optional[datetime] = None,
+) -> None:
+    """その日の学習量を加算し、連続学習日数を更新する（コミットは呼び出し側で行う）"""
+    if reviews <= 0:
+        return
+    day = study_day(now)
+
+    stmt = dialect_insert(db, DailyActivity).values(
+        user_id=user_id, day=day, reviews=reviews, correct=correct, time_sec=time_sec
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyActivity.user_id, DailyActivity.day],
+        set_={
+            "reviews": DailyActivity.reviews + stmt.excluded.reviews,
+            "correct": DailyActivity.correct + stmt.excluded.correct,
+            "time_sec": DailyActivity.time_sec + stmt.excluded.time_sec,
+        },
+    ))
+
+    # 同じ日なら据え置き、前日から続いていれば+1、途切れていれば1からやり直す
+    # （最終学習日より前の日付の記録（オフライン分の反映など）では変更しない）
+    current = case(
+        (UserStreak.last_active_day >= day, UserStreak.current_streak),
+        (UserStreak.last_active_day == day - timedelta(days=1), UserStreak.current_streak + 1),
+        else_=1,
+    )
+    stmt = dialect_insert(db, UserStreak).values(
+        user_id=user_id, current_streak=1, longest_streak=1, last_active_day=day
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserStreak.user_id],
+        set_={
+            "current_streak": current,
+            "longest_streak": case(
+                (current > UserStreak.longest_streak, current),
+                else_=UserStreak.longest_streak,
+            ),
+            "last_active_day": case(
+                (UserStreak.last_active_day >= day, UserStreak.last_active_day),
+                else_=day,
+            ),
+        },
+    ))
+
+
+def effective_streak(streak: Optional[UserStreak], today: Optional[date] = None) -> int:
+    """今日時点の連続学習日数（今日まだ学習していなくても前日まで続いていれば途切れていない）"""
+    if streak is None or streak.last_active_day is None:
+        return 0
+    today = today or study_day()
+    if streak.last_active_day < today - timedelta(days=1):
+        return 0
+    return streak.current_streak
+
+
+def get_user_streak(db: Session, user_id: int) -> Optional[UserStreak]:
+    return db.get(UserStreak, user_id)
+
+
+def get_study_streak(db: Session, user_id: int) -> int:
+    """連続学習日数（主キーでの1回の読み込み）"""
+    return effective_streak(get_user_streak(db, user_id))
+
+
+def get_activity(db: Session, user_id: int, start: date, end: date) -> List[DailyActivity]:
+    """期間内（start 以上 end 以下）に学習した日の記録を日付順に取得（ヒートマップ用）"""
+    return list(db.scalars(
+        select(DailyActivity)
+        .where(DailyActivity.user_id == user_id, DailyActivity.day >= start, DailyActivity.day <= end)
+        .order_by(DailyActivity.day)
+    ))
+
@@ -1,64 +1,106 @@
 import re
 import random
-from typing import List, Dict, Tuple
+from itertools import islice
+from typing import List, Dict, Iterator, Optional, Tuple
 from app.models.schemas import Card, CardCreate, QuestionType
+from app.services.distractors import BATCH_SIZE as DISTRACTOR_BATCH_SIZE, DistractorIndex
+from app.services.text_analysis import BULLET_PATTERNS, TextAnalysis, analyze_text
+
+# 正規表現はモジュール読み込み時に一度だけコンパイル
+VOCABULARY_SEPARATOR_PATTERN = re.compile(r'\s[-–—]\s')
+DEFINITION_PATTERNS = (
+    re.compile(r'(.+?)とは(.+?)である[。\.]'),
+    re.compile(r'(.+?)は(.+?)である[。\.]'),
+    re.compile(r'(.+?)とは(.+?)[。\.]'),
+)
+KATAKANA_PATTERN = re.compile(r'[ア-ン]+')
+ENGLISH_WORD_PATTERN = re.compile(r'[A-Za-z]+')
+NUMBER_PATTERN = re.compile(r'\d+')
+PARENTHESES_PATTERN = re.compile(r'（([^）]+)）')
+PUNCTUATION_PATTERN = re.compile(r'[、。，．,.]')
+
+# 生成戦略ごとの上限（全体の上限 max_cards とは別に適用）
+DEFAULT_STRATEGY_QUOTAS = {
+    "vocabulary": 20,
+    "definition": 20,
+    "list": 1,
+    "cloze": 10,
+}
 
 
 class CardGenerator:
     """テキストからクイズカードを自動生成するクラス"""
     
-    def __init__(self):
+    # 生成ロジックを変更したら更新する（生成キャッシュのキーに含まれる）
+    VERSION = "4"
+    
+    def __init__(
+        self,
+        max_cards: int = 20,
+        quotas: Optional[Dict[str, int]] = None,
+        distractor_pool: Optional[List[str]] = None,
+    ):
         self.min_answer_length = 1
         self.max_answer_length = 30
+        self.min_cards = 5  # 最低5問を目指す
+        self.max_cards = max_cards  # 最大20問まで
+        self.quotas = {**DEFAULT_STRATEGY_QUOTAS, **(quotas or {})}
+        # ノート外の誤選択肢候補（ユーザーの既存カードの正解など）
+        self.distractor_pool = distractor_pool or []
         
     def generate_cards(self, text: str, note_id: int, language: str = "auto", subject: str = "general") -> List[CardCreate]:
         """テキストからカードを自動生成"""
-        cards = []
-        
-        # 改行やカンマで区切られた語彙リストの検出
-        if self._is_vocabulary_list(text):
-            cards.extend(self._generate_vocabulary_cards(text, note_id))
-        
-        # 条文・定義文の検出
-        definition_cards = self._generate_definition_cards(text, note_id)
-        cards.extend(definition_cards)
+        return list(self.iter_cards(text, note_id, language, subject))
+    
+    def iter_cards(self, text: str, note_id: int, language: str = "auto", subject: str = "general") -> Iterator[CardCreate]:
+        """カードを1枚ずつ生成（上限に達した時点で全ての戦略を打ち切る）"""
+        # テキストは一度だけ走査し、各生成処理で共有する
+        yield from self.iter_cards_from_analysis(analyze_text(text), note_id, language, subject)
+    
+    def iter_cards_from_analysis(
+        self, analysis: TextAnalysis, note_id: int, language: str = "auto", subject: str = "general"
+    ) -> Iterator[CardCreate]:
+        """解析済みのテキストからカードを生成（ファイルを読みながら TextAnalyzer で解析した場合など）"""
+        strategies = [
+            # 改行やカンマで区切られた語彙リストの検出
+            ("vocabulary", self._generate_vocabulary_cards),
+            # 条文・定義文の検出
+            ("definition", self._generate_definition_cards),
+            # 箇条書きの検出
+            ("list", self._generate_list_cards),
+        ]
         
-        # 箇条書きの検出
-        list_cards = self._generate_list_cards(text, note_id)
-        cards.extend(list_cards)
+        produced = 0
+        for name, strategy in strategies:
+            for card in islice(strategy(analysis, note_id), self.quotas[name]):
+                yield card
+                produced += 1
+                if produced >= self.max_cards:
+                    return
         
         # 一般テキストからの穴埋め問題生成
-        if len(cards) < 5:  # 最低5問を目指す
-            cloze_cards = self._generate_cloze_cards(text, note_id)
-            cards.extend(cloze_cards)
-        
-        return cards[:20]  # 最大20問まで
+        if produced < self.min_cards:
+            limit = min(self.quotas["cloze"], self.max_cards - produced)
+            yield from islice(self._generate_cloze_cards(analysis, note_id), limit)
     
-    def _is_vocabulary_list(self, text: str) -> bool:
+    def _is_vocabulary_list(self, analysis: TextAnalysis) -> bool:
         """語彙リストかどうかを判定"""
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        if len(lines) < 3:
+        if analysis.line_count < 3:
             return False
         
-        # 各行が短く、単語または「単語 - 意味」の形式
-        for line in lines:
-            if len(line) > 100:  # 長すぎる行があると語彙リストではない
-                return False
-            if not re.match(r'^[a-zA-Z\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\s\-–—]+$', line):
-                continue  # 特殊文字が含まれていても続行
-        
-        return True
+        # 各行が短く、単語または「単語 - 意味」の形式（長すぎる行があると語彙リストではない）
+        return analysis.max_line_length <= 100
     
-    def _generate_vocabulary_cards(self, text: str, note_id: int) -> List[CardCreate]:
+    def _generate_vocabulary_cards(self, analysis: TextAnalysis, note_id: int) -> Iterator[CardCreate]:
         """語彙リストからMCQカードを生成"""
-        cards = []
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        if not self._is_vocabulary_list(analysis):
+            return
         
         vocabulary = []
-        for line in lines:
+        for line in analysis.lines:
             if ' - ' in line or ' – ' in line or ' — ' in line:
                 # 単語 - 意味の形式
-                parts = re.split(r'\s[-–—]\s', line, 1)
+                parts = VOCABULARY_SEPARATOR_PATTERN.split(line, 1)
                 if len(parts) == 2:
                     word, meaning = parts[0].strip(), parts[1].strip()
                     vocabulary.append((word, meaning))
@@ -72,16 +114,22 @@ class CardGenerator:
                 # 単語のみ
                 vocabulary.append((line, line))
         
-        # MCQ問題を生成
-        for i, (word, meaning) in enumerate(vocabulary):
-            if len(meaning) <= self.max_answer_length:
-                # 誤選択肢を生成
-                wrong_choices = self._generate_wrong_choices([v[1] for v in vocabulary], meaning, 3)
-                
+        # MCQ問題を生成（誤選択肢の索引はノートごとに1回だけ作成。ノート内の語彙を優先して登録）
+        questions = [(word, meaning) for word, meaning in vocabulary if len(meaning) <= self.max_answer_length]
+        if not questions:
+            return
+        index = DistractorIndex([v[1] for v in vocabulary] + self.distractor_pool)
+        
+        # 出題する分だけ、まとめて類似した誤選択肢を検索
+        for start in range(0, len(questions), DISTRACTOR_BATCH_SIZE):
+            batch = questions[start:start + DISTRACTOR_BATCH_SIZE]
+            batch_wrong_choices = index.nearest([meaning for _, meaning in batch], 3)
+            
+            for (word, meaning), wrong_choices in zip(batch, batch_wrong_choices):
                 choices = [meaning] + wrong_choices
                 random.shuffle(choices)
                 
-                cards.append(CardCreate(
+                yield CardCreate(
                     note_id=note_id,
                     type=QuestionType.MCQ,
                     prompt=f"「{word}」の意味として正しいものを選んでください。",
@@ -89,72 +137,50 @@ class CardGenerator:
                     choices=choices,
                     tags=["vocabulary"],
                     rationale=f"語彙: {word} - {meaning}"
-                ))
-        
-        return cards
+                )
     
-    def _generate_definition_cards(self, text: str, note_id: int) -> List[CardCreate]:
+    def _generate_definition_cards(self, analysis: TextAnalysis, note_id: int) -> Iterator[CardCreate]:
         """定義文から○×問題を生成"""
-        cards = []
+        count = 0
         
-        # 「〜とは」「〜である」などの定義パターンを検出
-        definition_patterns = [
-            r'(.+?)とは(.+?)である[。\.]',
-            r'(.+?)は(.+?)である[。\.]',
-            r'(.+?)とは(.+?)[。\.]'
-        ]
+        # 「〜とは」「〜である」などの定義パターンを検出（どのパターンも「は」を含む行のみが対象）
+        candidate_lines = [line for line in analysis.lines if 'は' in line]
         
-        for pattern in definition_patterns:
-            matches = re.finditer(pattern, text)
+        for pattern in DEFINITION_PATTERNS:
+            matches = (match for line in candidate_lines for match in pattern.finditer(line))
             for match in matches:
                 term = match.group(1).strip()
                 definition = match.group(2).strip()
                 
                 if len(term) <= 30 and len(definition) <= 100:
                     # 正しい文
-                    cards.append(CardCreate(
+                    yield CardCreate(
                         note_id=note_id,
                         type=QuestionType.TRUE_FALSE,
                         prompt=f"{term}は{definition}である。",
                         answer="true",
                         tags=["definition"],
                         rationale=f"原文: {match.group(0)}"
-                    ))
+                    )
+                    count += 1
                     
                     # 間違った文（否定形）
-                    if len(cards) < 10:
-                        cards.append(CardCreate(
+                    if count < 10:
+                        yield CardCreate(
                             note_id=note_id,
                             type=QuestionType.TRUE_FALSE,
                             prompt=f"{term}は{definition}ではない。",
                             answer="false",
                             tags=["definition"],
                             rationale=f"原文: {match.group(0)} (否定形で出題)"
-                        ))
-        
-        return cards
+                        )
+                        count += 1
     
-    def _generate_list_cards(self, text: str, note_id: int) -> List[CardCreate]:
+    def _generate_list_cards(self, analysis: TextAnalysis, note_id: int) -> Iterator[CardCreate]:
         """箇条書きから選択問題を生成"""
-        cards = []
-        
-        # 箇条書きパターンを検出
-        list_patterns = [
-            r'^[・\-\*]\s*(.+)$',
-            r'^\d+\.\s*(.+)$',
-            r'^[a-zA-Z]\)\s*(.+)$'
-        ]
-        
-        for pattern in list_patterns:
-            items = []
-            lines = text.split('\n')
-            
-            for line in lines:
-                match = re.match(pattern, line.strip())
-                if match:
-                    item = match.group(1).strip()
-                    if item and len(item) <= 50:
-                        items.append(item)
+        # 箇条書きパターンを検出（前処理で種類ごとに抽出済み）
+        for kind, _ in BULLET_PATTERNS:
+            items = analysis.bullets[kind]
             
             if len(items) >= 3:
                 # 項目の並び替え問題を生成
@@ -169,7 +195,7 @@ class CardGenerator:
                 choices = [correct_item] + wrong_choices[:3]
                 random.shuffle(choices)
                 
-                cards.append(CardCreate(
+                yield CardCreate(
                     note_id=note_id,
                     type=QuestionType.MCQ,
                     prompt=f"以下の項目のうち、リストに含まれているものを選んでください。",
@@ -177,17 +203,12 @@ class CardGenerator:
                     choices=choices,
                     tags=["list", "items"],
                     rationale="箇条書きリストからの出題"
-                ))
+                )
                 break
-        
-        return cards
     
-    def _generate_cloze_cards(self, text: str, note_id: int) -> List[CardCreate]:
-        """一般テキストから穴埋め問題を生成"""
-        cards = []
-        sentences = self._split_sentences(text)
-        
-        for sentence in sentences:
+    def _generate_cloze_cards(self, analysis: TextAnalysis, note_id: int) -> Iterator[CardCreate]:
+        """一般テキストから穴埋め問題を生成（件数の上限は呼び出し側で適用）"""
+        for sentence in analysis.sentences:
             # 固有名詞、数値、重要語句を抽出
             cloze_candidates = self._extract_cloze_candidates(sentence)
             
@@ -195,46 +216,32 @@ class CardGenerator:
                 if self._is_valid_cloze_answer(candidate):
                     cloze_text = sentence.replace(candidate, "{{" + candidate + "}}", 1)
                     
-                    cards.append(CardCreate(
+                    yield CardCreate(
                         note_id=note_id,
                         type=QuestionType.CLOZE,
                         prompt=cloze_text,
                         answer=candidate,
                         tags=["cloze"],
                         rationale=f"原文: {sentence}"
-                    ))
-                    
-                    if len(cards) >= 10:  # 最大10問まで
-                        break
-            
-            if len(cards) >= 10:
-                break
-        
-        return cards
-    
-    def _split_sentences(self, text: str) -> List[str]:
-        """テキストを文に分割"""
-        # 日本語の文区切り
-        sentences = re.split(r'[。！？\.\!\?]\s*', text)
-        return [s.strip() for s in sentences if s.strip() and len(s) > 10]
+                    )
     
     def _extract_cloze_candidates(self, sentence: str) -> List[str]:
         """穴埋め候補を抽出"""
         candidates = []
         
         # 固有名詞（カタカナ語、英単語）
-        katakana_words = re.findall(r'[ア-ン]+', sentence)
+        katakana_words = KATAKANA_PATTERN.findall(sentence)
         candidates.extend([w for w in katakana_words if 2 <= len(w) <= 15])
         
-        english_words = re.findall(r'[A-Za-z]+', sentence)
+        english_words = ENGLISH_WORD_PATTERN.findall(sentence)
         candidates.extend([w for w in english_words if 2 <= len(w) <= 15])
         
         # 数値
-        numbers = re.findall(r'\d+', sentence)
+        numbers = NUMBER_PATTERN.findall(sentence)
         candidates.extend([n for n in numbers if 1 <= len(n) <= 10])
         
         # 専門用語（括弧内の説明など）
-        parentheses = re.findall(r'（([^）]+)）', sentence)
+        parentheses = PARENTHESES_PATTERN.findall(sentence)
         candidates.extend([p for p in parentheses if 2 <= len(p) <= 20])
         
         return candidates
@@ -245,27 +252,7 @@ class CardGenerator:
             return False
         
         # 句読点を含まない
-        if re.search(r'[、。，．,.]', answer):
+        if PUNCTUATION_PATTERN.search(answer):
             return False
             
-        return True
-    
-    def _generate_wrong_choices(self, all_options: List[str], correct_answer: str, count: int) -> List[str]:
-        """誤選択肢を生成"""
-        wrong_choices = []
-        candidates = [opt for opt in all_options if opt != correct_answer]
-        
-        # 類似のものを優先的に選択
-        for candidate in candidates:
-            if len(wrong_choices) >= count:
-                break
-            if candidate not in wrong_choices:
-                wrong_choices.append(candidate)
-        
-        # 足りない場合は適当に選択
-        while len(wrong_choices) < count and len(wrong_choices) < len(candidates):
-            candidate = random.choice(candidates)
-            if candidate not in wrong_choices:
-                wrong_choices.append(candidate)
-        
-        return wrong_choices[:count]
\ No newline at end of file
+        return True
\ No newline at end of file
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Card, ReviewState
+from app.services.due_queue import track_due_dates
+from app.services.spaced_repetition import SM2Algorithm
+from app.services.tags import add_card_tags
+
+
+def insert_cards(
+    db: Session,
+    user_id: int,
+    cards: Sequence[dict],
+    with_review_states: Optional[bool] = None,
+) -> List[Card]:
+    """カードを複数行のINSERT ... RETURNINGでまとめて保存し、保存したカードを返す
+
+    タグは card_tags にも追加する。with_review_states が真なら初期ReviewStateも同じトランザクションでまとめて作成する
+    （省略時は CARD_EAGER_REVIEW_STATES）。コミットは呼び出し側で行う。
+    """
+    if not cards:
+        return []
+
+    # SQLiteでは sort_by_parameter_order を指定すると1行ずつのINSERTになるため、
+    # 複数行のINSERTで返った順序は問わずにIDで並べ直す（作成順になる）
+    db_cards = list(db.scalars(
+        insert(Card).returning(Card),
+        [{**card, "user_id": user_id} for card in cards],
+    ))
+    db_cards.sort(key=lambda card: card.id)
+    add_card_tags(db, user_id, db_cards)
+
+    if with_review_states is None:
+        with_review_states = settings.CARD_EAGER_REVIEW_STATES
+    if with_review_states:
+        now = datetime.utcnow()
+        due_date = now + timedelta(days=1)
+        initial_easiness = SM2Algorithm().initial_easiness
+        db.execute(
+            insert(ReviewState),
+            [
+                {
+                    "user_id": user_id,
+                    "card_id": card.id,
+                    "easiness": initial_easiness,
+                    "interval_days": 1,
+                    "repetition": 0,
+                    "due_date": due_date,
+                }
+                for card in db_cards
+            ],
+        )
+        track_due_dates(db, user_id, [(card.id, due_date) for card in db_cards])
+
+    return db_cards
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Quiz, QuizItem
+from app.services.activity import study_day
+
+# クイズID -> (シリアライズ済みの schemas.Quiz のJSON, アイテム数)
+# 提出時と、含まれるカードの編集・削除時に削除する（他プロセスのキャッシュは有効期限が切れるまで残る）
+daily_quiz_payloads = TTLCache(maxsize=settings.DAILY_QUIZ_CACHE_MAXSIZE, ttl=settings.DAILY_QUIZ_CACHE_TTL_SECONDS)
+
+
+def daily_quiz_key(now: Optional[datetime] = None) -> str:
+    """今日のクイズのキー（学習日。学習記録・連続学習日数と同じ日付の区切り）"""
+    return study_day(now).isoformat()
+
+
+def get_open_daily_quiz_id(db: Session, user_id: int, key: str) -> Optional[int]:
+    """未提出の今日のクイズのID（(user_id, daily_key) の一意インデックスを引くだけ）"""
+    return db.scalar(select(Quiz.id).where(Quiz.user_id == user_id, Quiz.daily_key == key))
+
+
+def open_daily_quiz_ids(db: Session, user_id: int, card_ids: Iterable[int]) -> List[int]:
+    """card_ids のいずれかを含む未提出の今日のクイズのID"""
+    return list(db.scalars(
+        select(QuizItem.quiz_id)
+        .join(Quiz, Quiz.id == QuizItem.quiz_id)
+        .where(Quiz.user_id == user_id, Quiz.daily_key.is_not(None), QuizItem.card_id.in_(card_ids))
+        .distinct()
+    ))
+
+
+def forget_daily_quizzes(quiz_ids: Iterable[int]) -> None:
+    """クイズのキャッシュを削除する（次回のGETでカードを読み直す）"""
+    for quiz_id in quiz_ids:
+        daily_quiz_payloads.pop(quiz_id)
@@ -0,0 +1,251 @@
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Card
+
+# 問題文・正解それぞれのハッシュ関数の数（署名は交互に並べて NUM_PERM 個）
+PERM_PER_FIELD = 32
+NUM_PERM = PERM_PER_FIELD * 2
+# LSHのバンド（1バンドに問題文4行・正解4行を含むため、両方が似ている場合だけ候補になる）
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+
+SHINGLE_SIZE = 3
+
+# 署名はDBに保存するため、ハッシュ関数の係数はプロセスをまたいで固定
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 62, size=(NUM_PERM, 1), dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.randint(0, 2 ** 62, size=(NUM_PERM, 1), dtype=np.int64).astype(np.uint64)
+_BAND_MIX = _rng.randint(1, 2 ** 62, size=ROWS, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_PROMPT_ROWS = np.arange(NUM_PERM) % 4 < 2  # 署名中の問題文の位置（2個ずつ交互）
+
+# 追加分がこの件数を超えたらソート済み配列を作り直す
+COMPACT_THRESHOLD = 1024
+
+
+def _shingles(text: str) -> np.ndarray:
+    padded = f" {' '.join(text.casefold().split())} "
+    grams = {padded[i:i + SHINGLE_SIZE] for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1))}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def _minhash(shingles: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # 乗算シフト法（オーバーフローは 2^64 で折り返す）で並べ替えを近似し、最小値を取る
+    with np.errstate(over="ignore"):
+        hashed = (a * shingles[None, :] + b) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def card_signature(prompt: str, answer: str) -> np.ndarray:
+    """問題文・正解のMinHash署名（uint32 × NUM_PERM）"""
+    signature = np.empty(NUM_PERM, dtype=np.uint32)
+    signature[_PROMPT_ROWS] = _minhash(_shingles(prompt), _A[_PROMPT_ROWS], _B[_PROMPT_ROWS])
+    signature[~_PROMPT_ROWS] = _minhash(_shingles(answer), _A[~_PROMPT_ROWS], _B[~_PROMPT_ROWS])
+    return signature
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+def signature_similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """推定類似度（問題文・正解それぞれの一致率の小さい方）"""
+    equal = others == signature[None, :]
+    return np.minimum(equal[:, _PROMPT_ROWS].mean(axis=1), equal[:, ~_PROMPT_ROWS].mean(axis=1))
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """署名をバンドごとの64bitキーに変換（signatures × BANDS）"""
+    rows = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return (rows * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+
+class SignatureIndex:
+    """1ユーザー分のカード署名のLSH索引
+
+    作成時の署名はバンドごとのソート済み配列（二分探索）、以降の追加分は辞書で持つ。
+    """
+
+    def __init__(self, ids: np.ndarray, signatures: np.ndarray):
+        self._lock = threading.Lock()
+        self._build(ids, signatures)
+
+    def _build(self, ids: np.ndarray, signatures: np.ndarray) -> None:
+        order = np.argsort(ids, kind="stable")
+        self._ids = ids[order]
+        self._signatures = signatures[order].reshape(len(ids), NUM_PERM)
+        keys = band_keys(self._signatures).T  # BANDS × 件数（行ごとに連続したメモリ）
+        self._band_order = np.argsort(keys, axis=1, kind="stable")
+        self._band_keys = np.ascontiguousarray(np.take_along_axis(keys, self._band_order, axis=1))
+        self._removed: Set[int] = set()
+        self._extra: Dict[int, np.ndarray] = {}
+        self._extra_bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self.count = len(self._ids)
+        self.max_id = int(self._ids[-1]) if len(self._ids) else 0
+
+    def _compact(self) -> None:
+        live = np.array([card_id not in self._removed for card_id in self._ids.tolist()], dtype=bool)
+        ids = [self._ids[live]]
+        signatures = [self._signatures[live]]
+        if self._extra:
+            ids.append(np.fromiter(self._extra, dtype=np.int64, count=len(self._extra)))
+            signatures.append(np.stack(list(self._extra.values())))
+        self._build(np.concatenate(ids), np.concatenate(signatures))
+
+    def _in_base(self, card_id: int) -> bool:
+        position = self._ids.searchsorted(np.int64(card_id))
+        return position < len(self._ids) and self._ids[position] == card_id and card_id not in self._removed
+
+    def add(self, card_id: int, signature: np.ndarray) -> None:
+        """カードを追加（既にある場合は署名を置き換える）"""
+        with self._lock:
+            if self._in_base(card_id):
+                self._removed.add(card_id)
+            elif card_id not in self._extra:
+                self.count += 1
+            self._extra[card_id] = signature
+            for band, key in enumerate(band_keys(signature[None, :])[0].tolist()):
+                self._extra_bands[band].setdefault(key, []).append(card_id)
+            self.max_id = max(self.max_id, card_id)
+            if len(self._extra) + len(self._removed) > COMPACT_THRESHOLD:
+                self._compact()
+
+    def remove(self, card_id: int) -> None:
+        with self._lock:
+            if self._extra.pop(card_id, None) is not None:
+                self.count -= 1
+                if self._in_base(card_id):
+                    self._removed.add(card_id)
+            elif self._in_base(card_id):
+                self._removed.add(card_id)
+                self.count -= 1
+
+    def find(self, signature: np.ndarray, threshold: float) -> Optional[Tuple[int, float]]:
+        """類似度が threshold 以上で最も近いカード（なければ None）"""
+        keys = band_keys(signature[None, :])[0]
+        with self._lock:
+            positions = []
+            extra_ids: Set[int] = set()
+            for band, key in enumerate(keys):
+                # キーは配列と同じ uint64 のまま渡す（Pythonのintだと配列全体の型変換が起きる）
+                sorted_keys = self._band_keys[band]
+                start = sorted_keys.searchsorted(key, side="left")
+                end = sorted_keys.searchsorted(key, side="right")
+                if end > start:
+                    positions.append(self._band_order[band, start:end])
+                extra_ids.update(self._extra_bands[band].get(int(key), ()))
+
+            candidate_ids: List[int] = []
+            candidate_signatures: List[np.ndarray] = []
+            if positions:
+                rows = np.unique(np.concatenate(positions))
+                if self._removed:
+                    rows = rows[[card_id not in self._removed for card_id in self._ids[rows].tolist()]]
+                candidate_ids.extend(self._ids[rows].tolist())
+                candidate_signatures.append(self._signatures[rows])
+            extra = [card_id for card_id in extra_ids if card_id in self._extra]
+            if extra:
+                candidate_ids.extend(extra)
+                candidate_signatures.append(np.stack([self._extra[card_id] for card_id in extra]))
+
+        if not candidate_ids:
+            return None
+        similarity = signature_similarity(signature, np.concatenate(candidate_signatures))
+        best = int(similarity.argmax())
+        if similarity[best] < threshold:
+            return None
+        return candidate_ids[best], float(similarity[best])
+
+
+# ユーザーID -> SignatureIndex（他プロセスでの追加・削除は件数と最大IDの比較で検出）
+signature_indexes = TTLCache(maxsize=settings.CARD_DEDUP_INDEX_MAXSIZE, ttl=settings.CARD_DEDUP_INDEX_TTL_SECONDS)
+
+
+def _load_signatures(db: Session, query) -> Tuple[np.ndarray, np.ndarray]:
+    """カードの署名を読み込む（未計算のものは計算して保存）"""
+    ids: List[int] = []
+    signatures: List[np.ndarray] = []
+    missing: List[dict] = []
+    for card_id, prompt, answer, minhash in db.execute(query):
+        if minhash is None:
+            signature = card_signature(prompt, answer)
+            missing.append({"id": card_id, "minhash": signature.tobytes()})
+        else:
+            signature = signature_from_bytes(minhash)
+        ids.append(card_id)
+        signatures.append(signature)
+
+    if missing:
+        db.execute(update(Card), missing)
+
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, NUM_PERM), dtype=np.uint32)
+    return np.asarray(ids, dtype=np.int64), np.stack(signatures)
+
+
+def get_signature_index(db: Session, user_id: int) -> SignatureIndex:
+    """ユーザーの署名索引を取得（DBの件数と食い違っていれば差分の読み込みか作り直し）"""
+    count, max_id = db.execute(
+        select(func.count(Card.id), func.max(Card.id)).where(Card.user_id == user_id)
+    ).one()
+    max_id = max_id or 0
+
+    columns = select(Card.id, Card.prompt, Card.answer, Card.minhash).where(Card.user_id == user_id)
+    index = signature_indexes.get(user_id)
+    if index is not None and (index.count, index.max_id) != (count, max_id):
+        # 他プロセスで追加されたカードだけなら差分を読み込む
+        ids, signatures = _load_signatures(db, columns.where(Card.id > index.max_id))
+        if index.count + len(ids) == count:
+            for card_id, signature in zip(ids.tolist(), signatures):
+                index.add(card_id, signature)
+        else:
+            index = None
+
+    if index is None:
+        index = SignatureIndex(*_load_signatures(db, columns))
+        signature_indexes.set(user_id, index)
+    return index
+
+
+def filter_duplicate_cards(db: Session, user_id: int, cards: Sequence[dict]) -> Tuple[List[dict], int]:
+    """既存カードや同時に作成するカードとほぼ同じものを除き、残りに署名を付けて返す"""
+    if not settings.CARD_DEDUP_ENABLED:
+        return list(cards), 0
+
+    threshold = settings.CARD_DEDUP_THRESHOLD
+    index = get_signature_index(db, user_id)
+    kept: List[dict] = []
+    kept_signatures: List[np.ndarray] = []
+    for card in cards:
+        signature = card_signature(card["prompt"], card["answer"])
+        if index.find(signature, threshold) is not None:
+            continue
+        if kept_signatures and signature_similarity(signature, np.stack(kept_signatures)).max() >= threshold:
+            continue
+        kept.append({**card, "minhash": signature.tobytes()})
+        kept_signatures.append(signature)
+    return kept, len(cards) - len(kept)
+
+
+def register_cards(user_id: int, cards: Iterable[Card]) -> None:
+    """保存したカードを索引に追加（索引を作成済みの場合のみ）"""
+    index = signature_indexes.get(user_id)
+    if index is None:
+        return
+    for card in cards:
+        if card.minhash is not None:
+            index.add(card.id, signature_from_bytes(card.minhash))
+
+
+def unregister_cards(user_id: int, card_ids: Iterable[int]) -> None:
+    index = signature_indexes.get(user_id)
+    if index is None:
+        return
+    for card_id in card_ids:
+        index.remove(card_id)
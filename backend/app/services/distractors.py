@@ -0,0 +1,118 @@
+from itertools import islice
+from typing import Dict, Iterable, List, Sequence, Set
+import numpy as np
+
+# 文字n-gram（前後に空白を付けて語頭・語尾も特徴にする）
+NGRAM_SIZES = (2, 3)
+
+# 一度にスコアを計算する問題数（行列は BATCH_SIZE × 選択肢数）
+BATCH_SIZE = 32
+
+# 索引に登録する選択肢の上限（巨大な語彙リストでも索引の作成・検索コストを一定に保つ）
+MAX_OPTIONS = 2000
+
+# 類似度が同じ場合は先に登録された選択肢（ノート内の語彙）を優先
+TIE_BREAK = 1e-12
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def char_ngrams(text: str) -> Set[str]:
+    """文字n-gramの集合"""
+    padded = f" {_normalize(text)} "
+    return {
+        padded[i:i + n]
+        for n in NGRAM_SIZES
+        for i in range(len(padded) - n + 1)
+    }
+
+
+class DistractorIndex:
+    """文字n-gramの転置インデックスで、正解に似た誤選択肢をまとめて検索する"""
+
+    def __init__(self, options: Iterable[str], max_options: int = MAX_OPTIONS):
+        unique = dict.fromkeys(option for option in options if option)
+        self.options = list(islice(unique, max_options))
+
+        # 正規化すると同じになる選択肢は正解と区別できないため除外対象
+        self._same: Dict[str, List[int]] = {}
+        for i, option in enumerate(self.options):
+            self._same.setdefault(_normalize(option), []).append(i)
+
+        self._gram_ids: Dict[str, int] = {}
+        grams: List[int] = []
+        owners: List[int] = []
+        for i, option in enumerate(self.options):
+            for gram in char_ngrams(option):
+                grams.append(self._gram_ids.setdefault(gram, len(self._gram_ids)))
+                owners.append(i)
+
+        # n-gram ID順に並べ、n-gramごとの出現選択肢を offsets で引けるようにする
+        grams = np.asarray(grams, dtype=np.int64)
+        owners = np.asarray(owners, dtype=np.int64)
+        order = np.argsort(grams, kind="stable")
+        self._postings = owners[order]
+        self._offsets = np.searchsorted(grams[order], np.arange(len(self._gram_ids) + 1))
+
+        # 2値ベクトルなのでノルムは n-gram 数の平方根
+        counts = np.bincount(owners, minlength=len(self.options)).astype(np.float64)
+        self._norms = np.sqrt(np.maximum(counts, 1.0))
+        self._tie_break = np.arange(len(self.options), dtype=np.float64) * TIE_BREAK
+
+    def __len__(self) -> int:
+        return len(self.options)
+
+    def _scores(self, answers: Sequence[str]) -> np.ndarray:
+        """正解ごとの全選択肢とのコサイン類似度（answers × options）"""
+        size = len(self.options)
+        rows: List[int] = []
+        gram_ids: List[int] = []
+        query_norms = np.ones(len(answers))
+        for row, answer in enumerate(answers):
+            grams = char_ngrams(answer)
+            query_norms[row] = np.sqrt(max(len(grams), 1))
+            for gram in grams:
+                gram_id = self._gram_ids.get(gram)
+                if gram_id is not None:
+                    rows.append(row)
+                    gram_ids.append(gram_id)
+
+        gram_ids = np.asarray(gram_ids, dtype=np.int64)
+        starts = self._offsets[gram_ids]
+        lengths = self._offsets[gram_ids + 1] - starts
+
+        # 該当する転置リストを連結し、(行, 選択肢) ごとに共通n-gram数を数える
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        keys = np.repeat(np.asarray(rows, dtype=np.int64), lengths) * size + self._postings[positions]
+        overlap = np.bincount(keys, minlength=len(answers) * size).reshape(len(answers), size)
+
+        return overlap / (query_norms[:, None] * self._norms[None, :]) - self._tie_break[None, :]
+
+    def nearest(self, answers: Sequence[str], count: int) -> List[List[str]]:
+        """各正解について、類似度の高い順に正解と異なる選択肢を最大 count 個返す"""
+        results: List[List[str]] = []
+        if count <= 0 or not self.options:
+            return [[] for _ in answers]
+
+        for start in range(0, len(answers), BATCH_SIZE):
+            batch = answers[start:start + BATCH_SIZE]
+            scores = self._scores(batch)
+            for row, answer in enumerate(batch):
+                scores[row, self._same.get(_normalize(answer), [])] = -np.inf
+
+            k = min(count, len(self.options))
+            if k < len(self.options):
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(len(self.options)), (len(batch), k))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            ranked = np.take_along_axis(top, np.argsort(-top_scores, axis=1, kind="stable"), axis=1)
+
+            for row in range(len(batch)):
+                results.append([
+                    self.options[i] for i in ranked[row] if np.isfinite(scores[row, i])
+                ])
+
+        return results
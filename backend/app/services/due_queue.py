@@ -0,0 +1,169 @@
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sortedcontainers import SortedList
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Card, ReviewState
+from app.services.activity import study_day, study_day_start
+
+# 期限が同じカードのうち、どのカードIDよりも後ろになる値（bisect用）
+_LAST_CARD_ID = float("inf")
+
+_PENDING_KEY = "due_queue_pending"
+
+
+class DueQueue:
+    """1ユーザー分の (期限, カードID) のソート済みリスト（期限切れの件数と先頭N件を二分探索で求める）
+
+    SortedList を使うため、カードの追加・削除もカード数 n に対して O(log n) で済む。
+    期限の学習日（STUDY_TIMEZONE）ごとのカード数も更新のたびに増減させて持つ（期限の負荷分散で使う）。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[datetime, int]]):
+        self._lock = threading.Lock()
+        self._entries: SortedList = SortedList(entries)
+        self._due: Dict[int, datetime] = {card_id: due_date for due_date, card_id in self._entries}
+        self._per_day: Counter = Counter(study_day(due_date) for due_date, _ in self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def count_due(self, now: datetime) -> int:
+        with self._lock:
+            return self._entries.bisect_right((now, _LAST_CARD_ID))
+
+    def next_due(self, now: datetime, limit: int) -> List[int]:
+        """期限切れのカードIDを期限の早い順に最大 limit 件"""
+        with self._lock:
+            end = min(self._entries.bisect_right((now, _LAST_CARD_ID)), limit)
+            return [card_id for _, card_id in self._entries.islice(0, end)]
+
+    def histogram(self, start: date, end: date) -> Dict[date, int]:
+        """期限の学習日が start から end まで（両端を含む）の日ごとのカード数"""
+        with self._lock:
+            return {
+                day: self._per_day[day]
+                for day in (start + timedelta(days=i) for i in range((end - start).days + 1))
+                if self._per_day[day]
+            }
+
+    def update(self, card_id: int, due_date: datetime) -> None:
+        with self._lock:
+            self._remove(card_id)
+            self._due[card_id] = due_date
+            self._per_day[study_day(due_date)] += 1
+            self._entries.add((due_date, card_id))
+
+    def remove(self, card_id: int) -> None:
+        with self._lock:
+            self._remove(card_id)
+
+    def _remove(self, card_id: int) -> None:
+        due_date = self._due.pop(card_id, None)
+        if due_date is None:
+            return
+        self._entries.remove((due_date, card_id))
+        day = study_day(due_date)
+        self._per_day[day] -= 1
+        if not self._per_day[day]:
+            del self._per_day[day]
+
+
+# ユーザーID -> DueQueue
+# キャッシュはプロセスごとのため、他のワーカーでの復習は DUE_QUEUE_TTL_SECONDS 秒で作り直すまで反映されない
+# （その間、件数・順序・ヒストグラムは最大でその秒数だけ古い）
+due_queues = TTLCache(maxsize=settings.DUE_QUEUE_MAXSIZE, ttl=settings.DUE_QUEUE_TTL_SECONDS)
+
+
+def get_due_queue(db: Session, user_id: int) -> DueQueue:
+    """ユーザーの期限キューを取得（なければ (user_id, due_date) のインデックスから作成し、カードのないReviewStateは含めない）"""
+    queue = due_queues.get(user_id)
+    if queue is None:
+        queue = DueQueue(db.execute(
+            select(ReviewState.due_date, ReviewState.card_id)
+            .join(Card, Card.id == ReviewState.card_id)
+            .where(Card.user_id == user_id, ReviewState.user_id == user_id)
+        ).all())
+        due_queues.set(user_id, queue)
+    return queue
+
+
+def count_due_cards(db: Session, user_id: int, now: Optional[datetime] = None) -> int:
+    """期限切れのカード数（上限なし）"""
+    now = now or datetime.utcnow()
+    if settings.DUE_QUEUE_ENABLED:
+        return get_due_queue(db, user_id).count_due(now)
+    return db.scalar(
+        select(func.count())
+        .select_from(ReviewState)
+        .join(Card, Card.id == ReviewState.card_id)
+        .where(Card.user_id == user_id, ReviewState.user_id == user_id, ReviewState.due_date <= now)
+    )
+
+
+def next_due_card_ids(db: Session, user_id: int, limit: int, now: Optional[datetime] = None) -> List[int]:
+    """期限切れのカードIDを期限の早い順に最大 limit 件"""
+    now = now or datetime.utcnow()
+    if settings.DUE_QUEUE_ENABLED:
+        return get_due_queue(db, user_id).next_due(now, limit)
+    return list(db.scalars(
+        select(ReviewState.card_id)
+        .join(Card, Card.id == ReviewState.card_id)
+        .where(Card.user_id == user_id, ReviewState.user_id == user_id, ReviewState.due_date <= now)
+        .order_by(ReviewState.due_date, ReviewState.card_id)
+        .limit(limit)
+    ))
+
+
+def due_histogram(db: Session, user_id: int, start: date, end: date) -> Dict[date, int]:
+    """期限の学習日が start から end まで（両端を含む）の日ごとのカード数"""
+    if settings.DUE_QUEUE_ENABLED:
+        return get_due_queue(db, user_id).histogram(start, end)
+    due_dates = db.scalars(
+        select(ReviewState.due_date)
+        .join(Card, Card.id == ReviewState.card_id)
+        .where(
+            Card.user_id == user_id,
+            ReviewState.user_id == user_id,
+            ReviewState.due_date >= study_day_start(start),
+            ReviewState.due_date < study_day_start(end + timedelta(days=1)),
+        )
+    )
+    return dict(Counter(study_day(due_date) for due_date in due_dates))
+
+
+def _apply_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, [])
+    for user_id, due_dates in pending:
+        queue = due_queues.get(user_id)
+        if queue is None:
+            continue
+        for card_id, due_date in due_dates:
+            queue.update(card_id, due_date)
+
+
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def track_due_dates(db: Session, user_id: int, due_dates: Iterable[Tuple[int, datetime]]) -> None:
+    """ReviewStateの期限の変更を、トランザクションのコミット後に期限キューへ反映する"""
+    if _PENDING_KEY not in db.info:
+        db.info[_PENDING_KEY] = []
+        if not event.contains(db, "after_commit", _apply_pending):
+            event.listen(db, "after_commit", _apply_pending)
+            event.listen(db, "after_rollback", _discard_pending)
+    db.info[_PENDING_KEY].append((user_id, list(due_dates)))
+
+
+def forget_cards(user_id: int, card_ids: Iterable[int]) -> None:
+    """削除したカードを期限キューから外す"""
+    queue = due_queues.get(user_id)
+    if queue is None:
+        return
+    for card_id in card_ids:
+        queue.remove(card_id)
@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import String, case, cast, func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import ReviewEvent, ReviewState
+from app.services.fsrs import GLOBAL_USER_ID
+from app.services.review_log import ReviewArchive
+from app.services.spaced_repetition import ONE_DAY, REVIEW_STATE_DTYPE, Scheduler
+
+# カードごとの正解率を全体の正解率に寄せる強さ（この回数分の復習を全体の正解率で数える）
+PRIOR_REVIEWS = 5
+
+# ReviewStateを読み込むときに一度に変換する行数
+LOAD_CHUNK_ROWS = 100000
+
+# 予測した正解・不正解の解答品質
+CORRECT_QUALITY = 4
+INCORRECT_QUALITY = 1
+
+
+@dataclass
+class ForecastStates:
+    """予測の入力（ReviewState 1行につき1要素の配列）"""
+    user_ids: np.ndarray
+    states: np.ndarray  # REVIEW_STATE_DTYPE
+    due_days: np.ndarray  # 開始日からの日数（期限切れは 0）
+    accuracy: np.ndarray  # カードの正解率
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+@dataclass
+class ForecastResult:
+    start: date
+    user_ids: np.ndarray
+    per_user: np.ndarray  # (ユーザー, 日) ごとの復習数の平均
+    totals: np.ndarray  # (試行, 日) ごとの全体の復習数
+
+    def daily(self) -> List[dict]:
+        """日ごとの全体の復習数（平均と、試行の10%点・90%点）"""
+        low, high = np.percentile(self.totals, [10, 90], axis=0)
+        return [
+            {
+                "day": date.fromordinal(self.start.toordinal() + day),
+                "reviews": round(float(self.totals[:, day].mean()), 1),
+                "low": int(np.floor(low[day])),
+                "high": int(np.ceil(high[day])),
+            }
+            for day in range(self.totals.shape[1])
+        ]
+
+
+def card_accuracy(
+    db: Session,
+    card_ids: np.ndarray,
+    archive: Optional[ReviewArchive] = None,
+    user_id: Optional[int] = None,
+) -> np.ndarray:
+    """カードごとの正解率（review_events とアーカイブの復習ログから集計し、復習の少ないカードは全体の正解率に寄せる）"""
+    size = int(card_ids.max()) + 1 if len(card_ids) else 0
+    total = np.zeros(size)
+    correct = np.zeros(size)
+
+    query = (
+        select(ReviewEvent.card_id, func.count(), func.sum(case((ReviewEvent.quality >= 3, 1), else_=0)))
+        .group_by(ReviewEvent.card_id)
+    )
+    if user_id is not None:
+        query = query.where(ReviewEvent.user_id == user_id)
+    rows = db.execute(query).all()
+    if rows:
+        ids, counts, corrects = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        keep = ids < size
+        np.add.at(total, ids[keep], counts[keep])
+        np.add.at(correct, ids[keep], corrects[keep])
+
+    if archive is not None:
+        for chunk in archive.scan(["card_id", "quality"], user_id=user_id):
+            ids = chunk["card_id"]
+            keep = ids < size
+            total += np.bincount(ids[keep], minlength=size)
+            correct += np.bincount(ids[keep], weights=chunk["quality"][keep] >= 3, minlength=size)
+
+    prior = correct.sum() / total.sum() if total.sum() else settings.FORECAST_DEFAULT_ACCURACY
+    return (correct[card_ids] + PRIOR_REVIEWS * prior) / (total[card_ids] + PRIOR_REVIEWS)
+
+
+def load_forecast_states(
+    db: Session,
+    start: datetime,
+    archive: Optional[ReviewArchive] = None,
+    user_id: Optional[int] = None,
+) -> ForecastStates:
+    """
+    ReviewStateを列ごとの配列として読み込む（user_id を省略すると全ユーザー）
+
+    行オブジェクトを溜めないよう LOAD_CHUNK_ROWS 行ずつ配列に変換する。
+    日時は文字列として受け取り、NumPyでまとめて解析する（datetime を1件ずつ変換するより大幅に速い）。
+    """
+    query = select(
+        ReviewState.user_id,
+        ReviewState.card_id,
+        ReviewState.easiness,
+        ReviewState.interval_days,
+        ReviewState.repetition,
+        ReviewState.stability,
+        ReviewState.difficulty,
+        cast(ReviewState.last_reviewed, String),
+        cast(ReviewState.due_date, String),
+    )
+    if user_id is not None:
+        query = query.where(ReviewState.user_id == user_id)
+    dtypes = [np.int64, np.int64] + [REVIEW_STATE_DTYPE[name] for name in REVIEW_STATE_DTYPE.names]
+    dtypes.append(np.dtype("datetime64[us]"))
+
+    chunks = []
+    result = db.connection().execution_options(yield_per=LOAD_CHUNK_ROWS).execute(query)
+    for rows in result.partitions():
+        # NULL の stability・difficulty は NaN、last_reviewed は NaT になる
+        chunks.append([np.array(values, dtype=dtype) for values, dtype in zip(zip(*rows), dtypes)])
+    columns = [
+        np.concatenate([chunk[i] for chunk in chunks]) if chunks else np.empty(0, dtype=dtype)
+        for i, dtype in enumerate(dtypes)
+    ]
+
+    states = np.empty(len(columns[0]), dtype=REVIEW_STATE_DTYPE)
+    for name, values in zip(REVIEW_STATE_DTYPE.names, columns[2:8]):
+        states[name] = values
+    card_ids = columns[1]
+    due_dates = columns[8]
+
+    return ForecastStates(
+        user_ids=columns[0],
+        states=states,
+        due_days=np.maximum((due_dates - np.datetime64(start, "us")) // ONE_DAY, 0).astype(np.int64),
+        accuracy=card_accuracy(db, card_ids, archive, user_id),
+    )
+
+
+def simulate_reviews(
+    data: ForecastStates,
+    scheduler: Scheduler,
+    start: datetime,
+    days: int,
+    runs: int,
+    seed: Optional[int] = None,
+) -> ForecastResult:
+    """
+    期限の来たカードを毎日すべて復習したとして、今後 days 日間の日ごとの復習数を予測する
+
+    正解・不正解をカードの正解率で抽選し、scheduler の calculate_next_reviews で次回の期限を決める。
+    これを runs 回繰り返す（新規カードの追加は含まない）。
+    """
+    rng = np.random.default_rng(seed)
+    user_ids, user_index = np.unique(data.user_ids, return_inverse=True)
+    per_user = np.zeros((len(user_ids), days))
+    totals = np.zeros((runs, days), dtype=np.int64)
+    reviewed_at = np.datetime64(start, "us") + np.arange(days) * ONE_DAY
+
+    # 期間内に期限の来るカードだけを日ごとに分けておく（各試行ではその日に復習するカードだけを扱う）
+    active = np.flatnonzero(data.due_days < days)
+    active = active[np.argsort(data.due_days[active], kind="stable")]
+    initial = [
+        (data.states[cards], cards)
+        for cards in np.split(active, np.cumsum(np.bincount(data.due_days[active], minlength=days))[:-1])
+    ]
+
+    for run in range(runs):
+        pending = [[bucket] if len(bucket[1]) else [] for bucket in initial]
+        for day in range(days):
+            if not pending[day]:
+                continue
+            states = np.concatenate([bucket[0] for bucket in pending[day]])
+            cards = np.concatenate([bucket[1] for bucket in pending[day]])
+            pending[day] = None
+            correct = rng.random(len(cards)) < data.accuracy[cards]
+            quality = np.where(correct, CORRECT_QUALITY, INCORRECT_QUALITY)
+            results = scheduler.calculate_next_reviews(states, quality, reviewed_at[day])
+            totals[run, day] = len(cards)
+            per_user[:, day] += np.bincount(user_index[cards], minlength=len(user_ids))
+
+            # 次回の期限が期間内のカードを、その日の分に加える
+            next_days = day + results["interval_days"]
+            later = np.flatnonzero(next_days < days)
+            if not len(later):
+                continue
+            later = later[np.argsort(next_days[later], kind="stable")]
+            next_states = np.empty(len(later), dtype=REVIEW_STATE_DTYPE)
+            for name in REVIEW_STATE_DTYPE.names:
+                next_states[name] = results[name][later]
+            later_cards = cards[later]
+            counts = np.bincount(next_days[later], minlength=days)
+            bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+            for due_day in np.flatnonzero(counts).tolist():
+                low, high = bounds[due_day], bounds[due_day + 1]
+                pending[due_day].append((next_states[low:high], later_cards[low:high]))
+
+    return ForecastResult(
+        start=start.date(),
+        user_ids=user_ids,
+        per_user=per_user / runs,
+        totals=totals,
+    )
+
+
+def forecast_reviews(
+    db: Session,
+    scheduler: Scheduler,
+    user_id: Optional[int] = None,
+    days: Optional[int] = None,
+    runs: Optional[int] = None,
+    archive: Optional[ReviewArchive] = None,
+    seed: Optional[int] = None,
+) -> ForecastResult:
+    """今日（UTC）から days 日間の復習数を予測（user_id を省略すると全ユーザー）"""
+    start = datetime.combine(datetime.utcnow().date(), time())
+    data = load_forecast_states(db, start, archive, user_id)
+    # 全ユーザーの予測では共通パラメータを使う
+    scheduler = scheduler.for_user(db, GLOBAL_USER_ID if user_id is None else user_id)
+    return simulate_reviews(
+        data,
+        scheduler,
+        start,
+        days or settings.FORECAST_DAYS,
+        runs or settings.FORECAST_RUNS,
+        seed,
+    )
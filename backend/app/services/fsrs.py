@@ -0,0 +1,442 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence, Union
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.models import ReviewEvent, SchedulerParams
+from app.services.review_log import ReviewArchive
+from app.services.spaced_repetition import NEXT_REVIEW_DTYPE, ONE_DAY, Scheduler
+
+# FSRS-4.5 の既定パラメータ（w0-w3: 初回評価ごとの安定度、w4-w7: 難易度、w8-w10: 正解時、w11-w14: 不正解時、
+# w15: Hard の係数、w16: Easy の係数）
+DEFAULT_PARAMS = np.array([
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031,
+    1.6474, 0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+])
+NUM_PARAMS = len(DEFAULT_PARAMS)
+
+# 推定時のパラメータの範囲
+PARAM_BOUNDS = np.array([
+    (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (0.1, 100.0),
+    (1.0, 10.0), (0.1, 5.0), (0.1, 5.0), (0.0, 0.5),
+    (0.0, 3.0), (0.1, 0.8), (0.01, 2.5),
+    (0.5, 5.0), (0.01, 0.2), (0.01, 0.9), (0.01, 2.0),
+    (0.0, 1.0), (1.0, 6.0),
+])
+
+# 忘却曲線 R = (1 + FACTOR * t / S) ^ DECAY（t = S で R = 0.9）
+DECAY = -0.5
+FACTOR = 19 / 81
+
+MIN_STABILITY = 0.01
+MAX_STABILITY = 36500.0
+
+# scheduler_params の全ユーザー共通パラメータ
+GLOBAL_USER_ID = 0
+
+# 推定時に1回の勾配計算で扱う復習数の目安（カード単位で区切る）
+BATCH_REVIEWS = 65536
+
+_EPSILON = 1e-7
+
+
+def quality_to_rating(quality: np.ndarray) -> np.ndarray:
+    """SM-2の解答品質 (0-5) をFSRSの評価 (1: Again, 2: Hard, 3: Good, 4: Easy) に変換"""
+    quality = np.asarray(quality)
+    return np.where(quality < 3, 1, np.where(quality == 3, 2, np.where(quality == 4, 3, 4)))
+
+
+def retrievability(elapsed_days: np.ndarray, stability: np.ndarray) -> np.ndarray:
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def next_interval(stability: np.ndarray, desired_retention: float, maximum_interval: int) -> np.ndarray:
+    """想起率が desired_retention まで下がる日数"""
+    interval = stability / FACTOR * (desired_retention ** (1 / DECAY) - 1)
+    return np.clip(np.round(interval), 1, maximum_interval).astype(np.int64)
+
+
+def _initial_difficulty(w: np.ndarray, rating: np.ndarray) -> np.ndarray:
+    return w[4] - (rating - 3) * w[5]
+
+
+def _next_difficulty(w: np.ndarray, difficulty: np.ndarray, rating: np.ndarray) -> np.ndarray:
+    # 評価に応じて増減させ、初期値（Good）に向けて少し戻す
+    return w[7] * w[4] + (1 - w[7]) * (difficulty - w[6] * (rating - 3))
+
+
+def _stability_after_success(w, stability, difficulty, recall, rating):
+    bonus = np.where(rating == 2, w[15], 1.0) * np.where(rating == 4, w[16], 1.0)
+    growth = np.exp(w[8]) * (11 - difficulty) * stability ** -w[9] * (np.exp(w[10] * (1 - recall)) - 1)
+    return stability * (1 + growth * bonus)
+
+
+def _stability_after_failure(w, stability, difficulty, recall):
+    forgotten = w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - recall))
+    return np.minimum(forgotten, stability)
+
+
+class FSRSScheduler(Scheduler):
+    """FSRS（記憶の安定度・難易度のモデル）による間隔反復"""
+
+    name = "fsrs"
+
+    def __init__(
+        self,
+        params: Optional[Sequence[float]] = None,
+        desired_retention: Optional[float] = None,
+        maximum_interval: Optional[int] = None,
+    ):
+        super().__init__()
+        self.params = np.asarray(params if params is not None else DEFAULT_PARAMS, dtype=np.float64)
+        self.desired_retention = desired_retention or settings.FSRS_DESIRED_RETENTION
+        self.maximum_interval = maximum_interval or settings.FSRS_MAXIMUM_INTERVAL_DAYS
+
+    def for_user(self, db: Session, user_id: int) -> "FSRSScheduler":
+        params = load_params(db, user_id)
+        if params is None:
+            return self
+        return FSRSScheduler(params, self.desired_retention, self.maximum_interval)
+
+    def calculate_next_reviews(
+        self,
+        states: np.ndarray,
+        quality: np.ndarray,
+        reviewed_at: Union[datetime, np.ndarray, None] = None,
+    ) -> np.ndarray:
+        """次回の状態をまとめて計算（引数・戻り値は SM2Algorithm.calculate_next_reviews と同じ）"""
+        w = self.params
+        quality = np.clip(np.asarray(quality, dtype=np.int64), 0, 5)
+        rating = quality_to_rating(quality)
+        if reviewed_at is None:
+            reviewed_at = datetime.utcnow()
+        reviewed_at = np.broadcast_to(np.asarray(reviewed_at, dtype="datetime64[us]"), quality.shape)
+
+        stability = states["stability"].copy()
+        difficulty = states["difficulty"].copy()
+        interval = states["interval_days"]
+        repetition = states["repetition"]
+
+        # SM-2で学習済みのカードは、前回の間隔を安定度、EF値（2.5 → 5, 1.3 → 10）を難易度とみなす
+        last_reviewed = states["last_reviewed"]
+        never_reviewed = np.isnat(last_reviewed)
+        unknown = np.isnan(stability)
+        seeded = unknown & ((repetition > 0) | ~never_reviewed)
+        stability[seeded] = np.maximum(interval[seeded], 1)
+        difficulty[seeded] = np.clip(5 + (2.5 - states["easiness"][seeded]) * 5 / 1.2, 1, 10)
+        first = unknown & ~seeded
+
+        # 前回の復習からの日数（記録がなければ前回の間隔）
+        since = (reviewed_at - np.where(never_reviewed, reviewed_at, last_reviewed)) / ONE_DAY
+        elapsed = np.maximum(np.where(never_reviewed, interval, since), 0).astype(np.float64)
+
+        stability = np.where(first, 1.0, stability)
+        difficulty = np.where(first, w[4], difficulty)
+        recall = retrievability(elapsed, stability)
+        next_stability = np.where(
+            rating > 1,
+            _stability_after_success(w, stability, difficulty, recall, rating),
+            _stability_after_failure(w, stability, difficulty, recall),
+        )
+        next_difficulty = _next_difficulty(w, difficulty, rating)
+
+        # 初めての復習は評価ごとの初期値
+        next_stability = np.where(first, w[np.clip(rating - 1, 0, 3)], next_stability)
+        next_difficulty = np.where(first, _initial_difficulty(w, rating), next_difficulty)
+        next_stability = np.clip(next_stability, MIN_STABILITY, MAX_STABILITY)
+        next_difficulty = np.clip(next_difficulty, 1, 10)
+
+        result = np.empty(len(states), dtype=NEXT_REVIEW_DTYPE)
+        result["easiness"] = states["easiness"]
+        result["interval_days"] = next_interval(next_stability, self.desired_retention, self.maximum_interval)
+        result["repetition"] = np.where(rating > 1, repetition + 1, 0)
+        result["due_date"] = reviewed_at + result["interval_days"] * ONE_DAY
+        result["last_result"] = quality
+        result["last_reviewed"] = reviewed_at
+        result["stability"] = next_stability
+        result["difficulty"] = next_difficulty
+        return result
+
+
+def load_params(db: Session, user_id: int) -> Optional[List[float]]:
+    """ユーザーのパラメータ（なければ全ユーザー共通、それもなければ None）"""
+    rows = dict(db.execute(
+        select(SchedulerParams.user_id, SchedulerParams.params)
+        .where(SchedulerParams.scheduler == FSRSScheduler.name, SchedulerParams.user_id.in_([user_id, GLOBAL_USER_ID]))
+    ).all())
+    return rows.get(user_id, rows.get(GLOBAL_USER_ID))
+
+
+def save_params(db: Session, user_id: int, result: "FitResult") -> None:
+    """推定したパラメータを保存（コミットは呼び出し側で行う）"""
+    values = {
+        "params": result.params,
+        "review_count": result.reviews,
+        "loss": result.loss,
+        "fitted_at": datetime.utcnow(),
+    }
+    stmt = dialect_insert(db, SchedulerParams).values(scheduler=FSRSScheduler.name, user_id=user_id, **values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SchedulerParams.scheduler, SchedulerParams.user_id],
+        set_=values,
+    ))
+
+
+# パラメータの推定
+
+
+@dataclass
+class ReviewHistory:
+    """カードごとに時刻順に並べた復習履歴"""
+    user_ids: np.ndarray
+    first: np.ndarray  # カードの最初の復習か
+    elapsed_days: np.ndarray  # 前回の復習からの日数（最初の復習は 0）
+    ratings: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def for_user(self, user_id: int) -> "ReviewHistory":
+        mask = self.user_ids == user_id
+        return ReviewHistory(self.user_ids[mask], self.first[mask], self.elapsed_days[mask], self.ratings[mask])
+
+
+def build_history(
+    user_ids: np.ndarray,
+    card_ids: np.ndarray,
+    reviewed_at: np.ndarray,
+    quality: np.ndarray,
+) -> ReviewHistory:
+    """復習ログの列から ReviewHistory を作る（並び順は問わない）"""
+    order = np.lexsort((reviewed_at, card_ids, user_ids))
+    user_ids = np.asarray(user_ids)[order]
+    card_ids = np.asarray(card_ids)[order]
+    reviewed_at = np.asarray(reviewed_at, dtype="datetime64[us]")[order]
+
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (user_ids[1:] != user_ids[:-1]) | (card_ids[1:] != card_ids[:-1])
+    elapsed = np.zeros(len(order))
+    elapsed[1:] = (reviewed_at[1:] - reviewed_at[:-1]) / ONE_DAY
+    elapsed[first] = 0
+    return ReviewHistory(user_ids, first, elapsed, quality_to_rating(np.asarray(quality)[order]).astype(np.int8))
+
+
+def load_review_history(
+    db: Session,
+    archive: Optional[ReviewArchive] = None,
+    user_id: Optional[int] = None,
+) -> ReviewHistory:
+    """アーカイブと review_events の復習ログを読み込む（アーカイブ済みで未削除の行は除く）"""
+    columns = ["id", "user_id", "card_id", "reviewed_at", "quality"]
+    chunks = []
+    if archive is not None:
+        chunks.append(archive.load(columns, user_id=user_id))
+
+    query = select(ReviewEvent.id, ReviewEvent.user_id, ReviewEvent.card_id, ReviewEvent.reviewed_at, ReviewEvent.quality)
+    if user_id is not None:
+        query = query.where(ReviewEvent.user_id == user_id)
+    rows = db.execute(query).all()
+    if rows:
+        values = list(zip(*rows))
+        chunks.append({
+            name: np.array(column, dtype="datetime64[us]" if name == "reviewed_at" else np.int64)
+            for name, column in zip(columns, values)
+        })
+
+    if not chunks:
+        return build_history(*(np.empty(0, dtype=np.int64) for _ in range(4)))
+    merged = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+    _, unique = np.unique(merged["id"], return_index=True)
+    return build_history(*(merged[name][unique] for name in columns[1:]))
+
+
+@dataclass
+class FitResult:
+    params: List[float]
+    loss: float  # 推定後の平均対数損失
+    initial_loss: float
+    reviews: int  # 損失の計算に使った復習数（各カードの2回目以降）
+
+
+def _plan_batches(history: ReviewHistory, batch_reviews: int) -> List[tuple]:
+    """カード単位で区切ったバッチごとに、n回目の復習をまとめた配列を作る（n回目どうしは独立に計算できる）"""
+    starts = np.flatnonzero(history.first)
+    bounds = [0]
+    for start in starts[1:]:
+        if start - bounds[-1] >= batch_reviews:
+            bounds.append(int(start))
+    bounds.append(len(history))
+
+    batches = []
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        if high <= low:
+            continue
+        first = history.first[low:high]
+        card = np.cumsum(first) - 1
+        card_starts = np.flatnonzero(first)
+        step = np.arange(high - low) - card_starts[card]
+        order = np.argsort(step, kind="stable")
+        step_counts = np.bincount(step)
+        steps = []
+        for indices in np.split(order, np.cumsum(step_counts)[:-1]):
+            steps.append((
+                card[indices],
+                history.elapsed_days[low:high][indices],
+                history.ratings[low:high][indices].astype(np.int64),
+            ))
+        batches.append((len(card_starts), steps))
+    return batches
+
+
+def _loss_and_grad(w: np.ndarray, batch: tuple, need_grad: bool = True):
+    """1バッチの対数損失の合計と勾配（安定度・難易度のパラメータ微分を前向きに伝播する）"""
+    num_cards, steps = batch
+    stability = np.empty(num_cards)
+    difficulty = np.empty(num_cards)
+    if need_grad:
+        d_stability = np.zeros((num_cards, NUM_PARAMS))
+        d_difficulty = np.zeros((num_cards, NUM_PARAMS))
+    loss = 0.0
+    grad = np.zeros(NUM_PARAMS)
+    count = 0
+
+    cards, _, rating = steps[0]
+    stability[cards] = w[rating - 1]
+    initial = _initial_difficulty(w, rating)
+    difficulty[cards] = np.clip(initial, 1, 10)
+    if need_grad:
+        inside = ((initial > 1) & (initial < 10)).astype(np.float64)
+        d_stability[cards, rating - 1] = 1
+        d_difficulty[cards, 4] = inside
+        d_difficulty[cards, 5] = -(rating - 3) * inside
+
+    for cards, elapsed, rating in steps[1:]:
+        s = stability[cards]
+        d = difficulty[cards]
+        recalled = rating > 1
+
+        base = 1 + FACTOR * elapsed / s
+        recall = base ** DECAY
+        r = np.clip(recall, _EPSILON, 1 - _EPSILON)
+        loss -= np.sum(np.where(recalled, np.log(r), np.log(1 - r)))
+        count += len(cards)
+
+        next_d = _next_difficulty(w, d, rating)
+        bonus = np.where(rating == 2, w[15], 1.0) * np.where(rating == 4, w[16], 1.0)
+        a = np.exp(w[8])
+        b = 11 - d
+        c = s ** -w[9]
+        e = np.exp(w[10] * (1 - recall)) - 1
+        growth = a * b * c * e * bonus
+        success = s * (1 + growth)
+        p = d ** -w[12]
+        q = (s + 1) ** w[13] - 1
+        x = np.exp(w[14] * (1 - recall))
+        forgotten = w[11] * p * q * x
+        use_forgotten = forgotten < s
+        next_s = np.where(recalled, success, np.where(use_forgotten, forgotten, s))
+
+        if need_grad:
+            ds = d_stability[cards]
+            dd = d_difficulty[cards]
+            d_recall = (0.5 * FACTOR * elapsed / s ** 2 * base ** (DECAY - 1))[:, None] * ds
+            d_loss = np.where(recalled, -1 / r, 1 / (1 - r))
+            grad += d_loss @ d_recall
+
+            # 正解時の安定度
+            dc = c[:, None] * (-w[9] * ds / s[:, None])
+            dc[:, 9] -= c * np.log(s)
+            de = (e + 1)[:, None] * (-w[10] * d_recall)
+            de[:, 10] += (e + 1) * (1 - recall)
+            d_growth = (
+                (a * c * e * bonus)[:, None] * -dd
+                + (a * b * e * bonus)[:, None] * dc
+                + (a * b * c * bonus)[:, None] * de
+            )
+            d_growth[:, 8] += growth
+            d_growth[:, 15] += np.where(rating == 2, a * b * c * e, 0)
+            d_growth[:, 16] += np.where(rating == 4, a * b * c * e, 0)
+            d_success = ds * (1 + growth)[:, None] + s[:, None] * d_growth
+
+            # 不正解時の安定度
+            dp = p[:, None] * (-w[12] * dd / d[:, None])
+            dp[:, 12] -= p * np.log(d)
+            dq = ((q + 1) * w[13] / (s + 1))[:, None] * ds
+            dq[:, 13] += (q + 1) * np.log(s + 1)
+            dx = x[:, None] * (-w[14] * d_recall)
+            dx[:, 14] += x * (1 - recall)
+            d_forgotten = (w[11] * q * x)[:, None] * dp + (w[11] * p * x)[:, None] * dq + (w[11] * p * q)[:, None] * dx
+            d_forgotten[:, 11] += p * q * x
+
+            next_ds = np.where(
+                recalled[:, None], d_success, np.where(use_forgotten[:, None], d_forgotten, ds)
+            )
+            next_ds[(next_s <= MIN_STABILITY) | (next_s >= MAX_STABILITY)] = 0
+
+            next_dd = (1 - w[7]) * dd
+            next_dd[:, 4] += w[7]
+            next_dd[:, 6] -= (1 - w[7]) * (rating - 3)
+            next_dd[:, 7] += w[4] - (d - w[6] * (rating - 3))
+            next_dd[(next_d <= 1) | (next_d >= 10)] = 0
+
+            d_stability[cards] = next_ds
+            d_difficulty[cards] = next_dd
+
+        stability[cards] = np.clip(next_s, MIN_STABILITY, MAX_STABILITY)
+        difficulty[cards] = np.clip(next_d, 1, 10)
+
+    return loss, grad, count
+
+
+def evaluate_loss(history: ReviewHistory, params: Sequence[float], batch_reviews: int = BATCH_REVIEWS) -> float:
+    """パラメータの平均対数損失（各カードの2回目以降の復習で、想起できたかの予測を評価）"""
+    w = np.asarray(params, dtype=np.float64)
+    total = 0.0
+    count = 0
+    for batch in _plan_batches(history, batch_reviews):
+        loss, _, n = _loss_and_grad(w, batch, need_grad=False)
+        total += loss
+        count += n
+    return total / count if count else 0.0
+
+
+def fit_params(
+    history: ReviewHistory,
+    initial: Optional[Sequence[float]] = None,
+    epochs: int = 4,
+    learning_rate: float = 0.04,
+    batch_reviews: int = BATCH_REVIEWS,
+    seed: int = 0,
+) -> FitResult:
+    """復習履歴の対数損失を最小にするパラメータをミニバッチのAdamで推定"""
+    w = np.clip(np.asarray(initial if initial is not None else DEFAULT_PARAMS, dtype=np.float64), *PARAM_BOUNDS.T)
+    batches = _plan_batches(history, batch_reviews)
+    initial_loss = evaluate_loss(history, w, batch_reviews)
+
+    rng = np.random.RandomState(seed)
+    m = np.zeros(NUM_PARAMS)
+    v = np.zeros(NUM_PARAMS)
+    beta1, beta2 = 0.9, 0.999
+    t = 0
+    for _ in range(epochs):
+        for index in rng.permutation(len(batches)):
+            loss, grad, count = _loss_and_grad(w, batches[index])
+            if not count:
+                continue
+            grad /= count
+            t += 1
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad ** 2
+            step = learning_rate * (m / (1 - beta1 ** t)) / (np.sqrt(v / (1 - beta2 ** t)) + 1e-8)
+            w = np.clip(w - step, *PARAM_BOUNDS.T)
+
+    reviews = int(np.count_nonzero(~history.first))
+    loss = evaluate_loss(history, w, batch_reviews)
+    # 既定値（初期値）より悪くなった場合は採用しない
+    if loss > initial_loss:
+        w = np.clip(np.asarray(initial if initial is not None else DEFAULT_PARAMS, dtype=np.float64), *PARAM_BOUNDS.T)
+        loss = initial_loss
+    return FitResult(params=[round(float(value), 6) for value in w], loss=loss, initial_loss=initial_loss, reviews=reviews)
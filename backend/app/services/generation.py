@@ -0,0 +1,158 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.core.process_pool import BoundedProcessPool
+from app.models.models import Card, GenerationCacheEntry
+from app.models.schemas import QuestionType
+from app.services.card_generator import CardGenerator
+from app.services.text_analysis import TextAnalysis
+
+# カード生成はCPU処理のため、複数ノートをまとめて処理する場合はプロセスに分散
+generation_pool = BoundedProcessPool(
+    "card_generation",
+    max_workers=settings.CARD_GENERATION_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.CARD_GENERATION_MAX_PENDING,
+)
+
+# キャッシュキー -> カード（note_idなし）。DBの generation_cache の前段
+generation_cache = TTLCache(
+    maxsize=settings.GENERATION_CACHE_MAXSIZE, ttl=settings.GENERATION_CACHE_TTL_SECONDS
+)
+
+
+def generate_note_cards(
+    text: str,
+    note_id: int,
+    language: str = "auto",
+    subject: str = "general",
+    distractor_pool: Optional[List[str]] = None,
+) -> List[dict]:
+    """ノート1件分のカードを生成（ワーカープロセス上で実行されるため結果はdictで返す）"""
+    generator = CardGenerator(distractor_pool=distractor_pool)
+    return [
+        card.model_dump(mode="json")
+        for card in generator.iter_cards(text, note_id, language=language, subject=subject)
+    ]
+
+
+def generate_analysis_cards(
+    analysis: TextAnalysis, note_id: int, language: str = "auto", subject: str = "general"
+) -> List[dict]:
+    """解析済みのテキストからカードを生成（アップロード時に読みながら解析した場合）"""
+    generator = CardGenerator()
+    return [
+        card.model_dump(mode="json")
+        for card in generator.iter_cards_from_analysis(analysis, note_id, language=language, subject=subject)
+    ]
+
+
+def load_distractor_pool(db: Session, user_id: int) -> List[str]:
+    """ユーザーの既存の選択問題の正解（新しい順）を誤選択肢の候補として取得"""
+    return list(db.scalars(
+        select(Card.answer)
+        .where(Card.user_id == user_id, Card.type == QuestionType.MCQ.value)
+        .order_by(Card.created_at.desc())
+        .limit(settings.DISTRACTOR_POOL_MAX_CARDS)
+    ))
+
+
+def normalize_note_text(text: str) -> str:
+    """生成結果に影響しない差異（改行コード・行末の空白）を除去"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def generation_cache_hasher(language: str = "auto", subject: str = "general"):
+    """キャッシュキーのハッシュ（続けて正規化したテキストと b"\\0" を渡す）"""
+    digest = hashlib.sha256()
+    for part in (CardGenerator.VERSION, language or "", subject or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest
+
+
+def generation_cache_key(text: str, language: str = "auto", subject: str = "general") -> str:
+    """正規化したテキスト・生成器バージョン・言語・分野からキャッシュキーを作成"""
+    digest = generation_cache_hasher(language, subject)
+    digest.update(normalize_note_text(text).encode("utf-8"))
+    digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def clone_cached_cards(cards: List[dict], note_id: int) -> List[dict]:
+    """キャッシュのカードを指定ノートのカードとして複製"""
+    return [{**card, "note_id": note_id} for card in cards]
+
+
+def lookup_cached_cards(db: Session, keys: Iterable[str]) -> Dict[str, List[dict]]:
+    """キャッシュ済みのカードをまとめて取得（プロセス内LRU → DBの順）"""
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        cards = generation_cache.get(key)
+        if cards is None:
+            missing.append(key)
+        else:
+            found[key] = cards
+
+    if missing:
+        rows = db.execute(
+            select(GenerationCacheEntry.key, GenerationCacheEntry.cards)
+            .where(GenerationCacheEntry.key.in_(missing))
+        ).all()
+        for key, cards in rows:
+            generation_cache.set(key, cards)
+            found[key] = cards
+
+    return found
+
+
+def store_cached_cards(
+    db: Session, key: str, cards: List[dict], language: str = "auto", subject: str = "general"
+) -> None:
+    """生成結果をキャッシュに保存（同じキーが既にあれば何もしない）"""
+    cards = [{field: value for field, value in card.items() if field != "note_id"} for card in cards]
+    generation_cache.set(key, cards)
+
+    db.execute(
+        dialect_insert(db, GenerationCacheEntry)
+        .values(
+            key=key,
+            generator_version=CardGenerator.VERSION,
+            language=language,
+            subject=subject,
+            cards=cards,
+            card_count=len(cards),
+            created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=[GenerationCacheEntry.key])
+    )
+
+
+def get_or_generate_note_cards(
+    db: Session,
+    text: str,
+    note_id: int,
+    language: str = "auto",
+    subject: str = "general",
+    distractor_pool: Optional[List[str]] = None,
+) -> Tuple[List[dict], bool]:
+    """キャッシュがあれば複製し、なければ生成して保存する。(カード, キャッシュヒットか) を返す"""
+    # ユーザーごとの候補を使う場合は結果がノート内容だけで決まらないためキャッシュしない
+    if distractor_pool:
+        return generate_note_cards(text, note_id, language, subject, distractor_pool), False
+
+    key = generation_cache_key(text, language, subject)
+    cached = lookup_cached_cards(db, [key]).get(key)
+    if cached is not None:
+        return clone_cached_cards(cached, note_id), True
+
+    cards = generate_note_cards(text, note_id, language, subject)
+    store_cached_cards(db, key, cards, language, subject)
+    return cards, False
@@ -0,0 +1,204 @@
+import codecs
+import csv
+import io
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, List
+from app.services.generation import generation_cache_hasher
+from app.services.text_analysis import TextAnalysis, TextAnalyzer
+
+# アップロードを受け付ける拡張子 -> CSVとして読むか
+UPLOAD_EXTENSIONS = {
+    ".txt": False,
+    ".md": False,
+    ".markdown": False,
+    ".csv": True,
+}
+
+# BOMで判別できるエンコーディング
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# BOMがなくUTF-8として読めない場合は Shift_JIS（Windows）とみなす
+FALLBACK_ENCODING = "cp932"
+
+
+class UploadTooLarge(Exception):
+    """アップロードされたファイルがサイズの上限を超えている"""
+
+
+class UndecodableUpload(Exception):
+    """ファイルのエンコーディングを判別できない"""
+
+
+@dataclass
+class IngestedNote:
+    """アップロードされたファイルを正規化したノート本文と、読みながら行った解析の結果"""
+    text: str
+    analysis: TextAnalysis
+    cache_key: str
+    encoding: str
+    size_bytes: int
+
+
+def iter_chunks(file: BinaryIO, max_bytes: int, chunk_size: int) -> Iterator[bytes]:
+    """ファイルを一定サイズずつ読む（上限を超えたら UploadTooLarge）"""
+    total = 0
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+        yield chunk
+
+
+class IncrementalTextDecoder:
+    """エンコーディングを判別しながら逐次デコード（マルチバイト文字がチャンクをまたいでもよい）
+
+    BOMがあればそれに従い、なければASCII以外のバイトが初めて現れたチャンクで
+    UTF-8として読めるかを判定する（読めなければ Shift_JIS）。
+    """
+
+    def __init__(self):
+        self.encoding = None
+        self._decoder = None
+        self._head = b""
+
+    def decode(self, chunk: bytes, final: bool = False) -> str:
+        try:
+            return self._decode(chunk, final)
+        except UnicodeDecodeError as exc:
+            raise UndecodableUpload(f"File is not valid {self.encoding} text") from exc
+
+    def _decode(self, chunk: bytes, final: bool) -> str:
+        if self._decoder is not None:
+            return self._decoder.decode(chunk, final)
+
+        # BOMの判別に必要なバイト数が揃うまで待つ
+        self._head += chunk
+        if len(self._head) < len(codecs.BOM_UTF8) and not final:
+            return ""
+        head, self._head = self._head, b""
+        for bom, encoding in BOM_ENCODINGS:
+            if head.startswith(bom):
+                return self._start(encoding, head[len(bom):], final)
+
+        # ASCIIの範囲ではどちらのエンコーディングでも同じ
+        if head.isascii():
+            return head.decode("ascii")
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(head, final)
+        except UnicodeDecodeError:
+            return self._start(FALLBACK_ENCODING, head, final)
+        return self._start("utf-8", head, final)
+
+    def _start(self, encoding: str, data: bytes, final: bool) -> str:
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        return self._decoder.decode(data, final)
+
+
+def iter_decoded(chunks: Iterable[bytes], decoder: IncrementalTextDecoder) -> Iterator[str]:
+    """チャンクを逐次デコード"""
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """改行コードを統一して1行ずつ返す（行末の空白は除去）"""
+    pending: List[str] = []
+    carriage_return = False
+    for piece in pieces:
+        # CRLFがチャンクの境界で分かれている場合に備えて、末尾のCRは次のチャンクと合わせて処理
+        if carriage_return:
+            piece = "\r" + piece
+        carriage_return = piece.endswith("\r")
+        if carriage_return:
+            piece = piece[:-1]
+
+        lines = piece.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        if len(lines) == 1:
+            pending.append(lines[0])
+            continue
+        pending.append(lines[0])
+        yield "".join(pending).rstrip()
+        yield from (line.rstrip() for line in lines[1:-1])
+        pending = [lines[-1]]
+
+    if carriage_return:
+        yield "".join(pending).rstrip()
+        pending = []
+    yield "".join(pending).rstrip()
+
+
+def iter_csv_lines(lines: Iterable[str]) -> Iterator[str]:
+    """CSVの各行を「1列目 - 残りの列」の形式に変換（語彙リストとして扱える）"""
+    for row in csv.reader(line + "\n" for line in lines):
+        cells = [" ".join(cell.split()) for cell in row]
+        cells = [cell for cell in cells if cell]
+        if len(cells) >= 2:
+            yield f"{cells[0]} - {', '.join(cells[1:])}"
+        else:
+            yield cells[0] if cells else ""
+
+
+def ingest_upload(
+    file: BinaryIO,
+    is_csv: bool,
+    language: str,
+    subject: str,
+    max_bytes: int,
+    chunk_size: int,
+) -> IngestedNote:
+    """
+    ファイルを読みながら正規化・解析・キャッシュキーの計算を1回の走査で行う
+
+    アップロードのバイト列と解析器の保持する量はチャンク・上限の分だけだが、ノート本文は notes.raw_text に
+    1つの値として保存するためメモリ上に組み立てる（最後に取り出すときは一時的に本文の約2倍になる）。
+    """
+    decoder = IncrementalTextDecoder()
+    lines = iter_lines(iter_decoded(iter_chunks(file, max_bytes, chunk_size), decoder))
+    if is_csv:
+        lines = iter_csv_lines(lines)
+
+    # normalize_note_text と同じ正規化（先頭・末尾の空行を除去）を行いながら書き出す
+    buffer = io.StringIO()
+    analyzer = TextAnalyzer()
+    hasher = generation_cache_hasher(language, subject)
+    blank_lines = 0
+    started = False
+    for line in lines:
+        if not started:
+            line = line.lstrip()
+            if not line:
+                continue
+            segment = line
+            started = True
+        elif not line:
+            blank_lines += 1
+            continue
+        else:
+            segment = "\n" * (blank_lines + 1) + line
+            blank_lines = 0
+
+        buffer.write(segment)
+        analyzer.feed(segment)
+        hasher.update(segment.encode("utf-8"))
+
+    hasher.update(b"\0")
+    return IngestedNote(
+        text=buffer.getvalue(),
+        analysis=analyzer.close(),
+        cache_key=hasher.hexdigest(),
+        encoding=decoder.encoding or "ascii",
+        size_bytes=file.tell(),
+    )
@@ -0,0 +1,228 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Job, Note
+from app.models.schemas import JobStatus
+from app.services.card_writer import insert_cards
+from app.services.dedup import filter_duplicate_cards, register_cards
+from app.services.generation import get_or_generate_note_cards, load_distractor_pool
+
+
+class JobCancelled(Exception):
+    """キャンセルが要求された"""
+
+
+class LeaseLost(Exception):
+    """リースが期限切れになり、他のワーカーに取得された"""
+
+
+def _claimable(now: datetime):
+    # 待機中のジョブか、リースが切れた実行中のジョブ（ワーカー停止など）
+    return or_(
+        and_(Job.status == JobStatus.QUEUED.value, Job.available_at <= now),
+        and_(Job.status == JobStatus.RUNNING.value, Job.lease_expires_at < now),
+    )
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[Job]:
+    """実行可能なジョブを1件取得してリースを設定"""
+    now = datetime.utcnow()
+
+    # PostgreSQLでは他のワーカーがロック中の行を飛ばす（SQLiteでは無視される）
+    job_id = db.scalar(
+        select(Job.id)
+        .where(_claimable(now))
+        .order_by(Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if job_id is None:
+        db.rollback()
+        return None
+
+    # 条件付きUPDATEで取得を確定（同時に取得した他のワーカーとは1件しか競合しない）
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, _claimable(now))
+        .values(
+            status=JobStatus.RUNNING.value,
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            attempts=Job.attempts + 1,
+            started_at=now,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+
+    if claimed != 1:
+        return None
+    return db.get(Job, job_id)
+
+
+class JobContext:
+    """実行中のジョブから進捗を記録し、リースの延長とキャンセル確認を行う"""
+
+    def __init__(self, db: Session, job: Job, worker_id: str):
+        self.db = db
+        self.job_id = job.id
+        self.worker_id = worker_id
+
+    def checkpoint(self, progress: Optional[int] = None, result: Optional[dict] = None) -> None:
+        """進捗を保存してコミット（同じトランザクションの書き込みも確定する）"""
+        now = datetime.utcnow()
+        values = {
+            "lease_expires_at": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            "updated_at": now,
+        }
+        if progress is not None:
+            values["progress"] = progress
+        if result is not None:
+            values["result"] = result
+
+        updated = self.db.execute(
+            update(Job)
+            .where(
+                Job.id == self.job_id,
+                Job.lease_owner == self.worker_id,
+                Job.status == JobStatus.RUNNING.value,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated != 1:
+            raise LeaseLost()
+
+        cancel_requested = self.db.scalar(select(Job.cancel_requested).where(Job.id == self.job_id))
+        self.db.commit()
+
+        if cancel_requested:
+            raise JobCancelled()
+
+
+def _finish(db: Session, job_id: int, worker_id: str, **values) -> None:
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id)
+        .values(updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _run_generate_cards(db: Session, job: Job, context: JobContext) -> dict:
+    """ノートごとにカードを生成して保存"""
+    payload = job.payload or {}
+    # 前回の試行で保存済みのノートは飛ばす（リトライしても重複しない）
+    notes = dict((job.result or {}).get("notes", {}))
+    distractor_pool = None
+    if payload.get("use_user_distractors"):
+        distractor_pool = load_distractor_pool(db, job.user_id)
+
+    for note_id in payload.get("note_ids", []):
+        key = str(note_id)
+        if key in notes:
+            continue
+
+        note = db.scalar(select(Note).where(Note.id == note_id, Note.user_id == job.user_id))
+        db_cards = []
+        if note is None:
+            notes[key] = {"status": "not_found"}
+        else:
+            cards, cache_hit = get_or_generate_note_cards(
+                db, note.raw_text, note_id, payload.get("language", "auto"), payload.get("subject", "general"),
+                distractor_pool,
+            )
+            cards, skipped = filter_duplicate_cards(db, job.user_id, cards)
+            db_cards = insert_cards(db, job.user_id, cards)
+            notes[key] = {
+                "status": "done",
+                "cache": "hit" if cache_hit else "miss",
+                "card_ids": [card.id for card in db_cards],
+                "skipped_duplicates": skipped,
+            }
+
+        # カードと進捗を同じトランザクションでコミット
+        context.checkpoint(progress=len(notes), result={"notes": notes})
+        register_cards(job.user_id, db_cards)
+
+    return {
+        "notes": notes,
+        "cards": sum(len(note.get("card_ids", [])) for note in notes.values()),
+    }
+
+
+JOB_HANDLERS: Dict[str, Callable[[Session, Job, JobContext], dict]] = {
+    "generate_cards": _run_generate_cards,
+}
+
+
+def run_job(db: Session, job: Job, worker_id: str) -> None:
+    """取得したジョブを実行し、結果に応じて状態を更新"""
+    context = JobContext(db, job, worker_id)
+
+    try:
+        if job.cancel_requested:
+            raise JobCancelled()
+        if job.attempts > job.max_attempts:
+            raise RuntimeError("Job lease expired too many times")
+
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise RuntimeError(f"Unknown job kind: {job.kind}")
+
+        result = handler(db, job, context)
+        _finish(
+            db, job.id, worker_id,
+            status=JobStatus.SUCCEEDED.value, result=result, error=None, finished_at=datetime.utcnow(),
+        )
+    except JobCancelled:
+        db.rollback()
+        _finish(db, job.id, worker_id, status=JobStatus.CANCELLED.value, finished_at=datetime.utcnow())
+    except LeaseLost:
+        db.rollback()
+    except Exception as exc:
+        db.rollback()
+        if job.attempts < job.max_attempts:
+            # 指数バックオフで再実行
+            delay = settings.JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            _finish(
+                db, job.id, worker_id,
+                status=JobStatus.QUEUED.value, error=str(exc), lease_owner=None,
+                lease_expires_at=None, available_at=datetime.utcnow() + timedelta(seconds=delay),
+            )
+        else:
+            _finish(
+                db, job.id, worker_id,
+                status=JobStatus.FAILED.value, error=str(exc), finished_at=datetime.utcnow(),
+            )
+
+
+def run_worker(
+    worker_id: Optional[str] = None,
+    stop_event: Optional[threading.Event] = None,
+    poll_interval: float = None,
+    once: bool = False,
+) -> None:
+    """ジョブを取得して実行するループ（stop_event がセットされるまで）"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    poll_interval = poll_interval if poll_interval is not None else settings.JOB_POLL_INTERVAL_SECONDS
+
+    while not stop_event.is_set():
+        with SessionLocal() as db:
+            job = claim_job(db, worker_id)
+            if job is not None:
+                run_job(db, job, worker_id)
+                continue
+
+        if once:
+            return
+        stop_event.wait(poll_interval)
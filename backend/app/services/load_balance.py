@@ -0,0 +1,70 @@
+from datetime import timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.services.activity import study_day
+from app.services.due_queue import due_histogram
+
+# 間隔がこれ未満のカードは期限をずらさない
+MIN_FUZZ_INTERVAL = 2.5
+
+
+def fuzz_range(interval_days: np.ndarray) -> np.ndarray:
+    """
+    期限をずらしてよい幅（日）
+
+    間隔の 2.5-7 日の部分は15%、7-20 日の部分は10%、20 日を超える部分は5% を、1日に足した幅。
+    例えば間隔 6 日なら ±2 日、30 日なら ±3 日、100 日なら ±7 日（端数は四捨五入）。
+    """
+    interval = np.asarray(interval_days, dtype=np.float64)
+    delta = (
+        1.0
+        + 0.15 * np.clip(np.minimum(interval, 7) - MIN_FUZZ_INTERVAL, 0, None)
+        + 0.10 * np.clip(np.minimum(interval, 20) - 7, 0, None)
+        + 0.05 * np.clip(interval - 20, 0, None)
+    )
+    return np.where(interval < MIN_FUZZ_INTERVAL, 0.0, delta)
+
+
+def balance_due_dates(
+    db: Session,
+    user_id: int,
+    results: np.ndarray,
+    previous_due: Optional[np.ndarray] = None,
+) -> None:
+    """
+    次回の期限を、本来の間隔の前後 fuzz_range 日のうち期限のカードが最も少ない日に移す（results をその場で書き換える）
+
+    同じ枚数の日が複数あれば本来の間隔に近い日（同じ近さなら早い日）を選ぶ。
+    日ごとの枚数はユーザーの期限キューの学習日（STUDY_TIMEZONE）ごとのヒストグラムから読み、同じ回答で移したカードも数に加える。
+    previous_due（results と同じ並びの、復習前の期限）を渡すと、そのカード自身の今の期限はヒストグラムから除いて数える。
+    """
+    if not len(results):
+        return
+    interval = results["interval_days"]
+    delta = fuzz_range(interval)
+    low = np.maximum(np.round(interval - delta), 1).astype(np.int64)
+    high = np.maximum(np.round(interval + delta), low).astype(np.int64)
+    movable = np.flatnonzero(high > low)
+    if not len(movable):
+        return
+
+    reviewed_days = {i: study_day(results["last_reviewed"][i].item()) for i in movable.tolist()}
+    first_day = min(reviewed_days[i] + timedelta(days=int(low[i])) for i in reviewed_days)
+    last_day = max(reviewed_days[i] + timedelta(days=int(high[i])) for i in reviewed_days)
+    counts = due_histogram(db, user_id, first_day, last_day)
+
+    for i, reviewed_day in reviewed_days.items():
+        if previous_due is not None and not np.isnat(previous_due[i]):
+            old_day = study_day(previous_due[i].item())
+            if counts.get(old_day, 0) > 0:
+                counts[old_day] -= 1
+        target = int(interval[i])
+        best = min(
+            range(int(low[i]), int(high[i]) + 1),
+            key=lambda days: (counts.get(reviewed_day + timedelta(days=days), 0), abs(days - target), days),
+        )
+        counts[reviewed_day + timedelta(days=best)] = counts.get(reviewed_day + timedelta(days=best), 0) + 1
+        if best != target:
+            results["interval_days"][i] = best
+            results["due_date"][i] = results["last_reviewed"][i] + best * np.timedelta64(1, "D")
@@ -0,0 +1,292 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import ReviewEvent
+
+# アーカイブの列と型（quiz_id・time_sec がない場合は MISSING）
+ARCHIVE_COLUMNS = {
+    "id": np.int64,
+    "user_id": np.int64,
+    "card_id": np.int64,
+    "quiz_id": np.int64,
+    "reviewed_at": np.dtype("datetime64[us]"),
+    "quality": np.int8,
+    "time_sec": np.int32,
+    "easiness": np.float64,
+    "interval_days": np.int32,
+    "repetition": np.int32,
+}
+MISSING = -1
+
+# パート内の並び順（ユーザーごと・カードごとの復習履歴を連続した範囲として読める）
+SORT_COLUMNS = ("user_id", "card_id", "reviewed_at", "id")
+
+MANIFEST_NAME = "manifest.json"
+PART_META_NAME = "part.json"
+
+
+def record_review_events(
+    db: Session,
+    user_id: int,
+    card_ids: Sequence[int],
+    results: np.ndarray,
+    time_secs: Optional[Sequence[Optional[int]]] = None,
+    quiz_id: Optional[int] = None,
+) -> None:
+    """復習結果（calculate_next_reviews の戻り値）を review_events に追記（コミットは呼び出し側で行う）"""
+    if not len(card_ids):
+        return
+    db.execute(
+        insert(ReviewEvent),
+        [
+            {
+                "user_id": user_id,
+                "card_id": card_id,
+                "quiz_id": quiz_id,
+                "reviewed_at": last_reviewed,
+                "quality": last_result,
+                "time_sec": time_secs[i] if time_secs is not None else None,
+                "easiness": easiness,
+                "interval_days": interval_days,
+                "repetition": repetition,
+            }
+            for i, (card_id, (easiness, interval_days, repetition, _, last_result, last_reviewed, *_)) in enumerate(
+                zip(card_ids, results.tolist())
+            )
+        ],
+    )
+
+
+class ReviewArchive:
+    """アーカイブした復習ログ（月ごとのディレクトリに、パート単位で列ごとの .npy を置く）
+
+    manifest.json にパートの一覧と、アーカイブ済みの期間（archived_before より前）を記録する。
+    読み込みはメモリマップで行うため、DBに触れずに数百万件の復習を集計できる。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def manifest(self) -> dict:
+        path = os.path.join(self.root, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {"archived_before": None, "parts": []}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def parts(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+        """期間（start 以上 end 未満）に含まれる可能性のあるパート"""
+        parts = self.manifest()["parts"]
+        if start is not None:
+            parts = [part for part in parts if datetime.fromisoformat(part["max_reviewed_at"]) >= start]
+        if end is not None:
+            parts = [part for part in parts if datetime.fromisoformat(part["min_reviewed_at"]) < end]
+        return parts
+
+    def read_part(self, part: dict, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """パートの列をメモリマップで開く"""
+        directory = os.path.join(self.root, part["path"])
+        return {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in (columns or ARCHIVE_COLUMNS)
+        }
+
+    def scan(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        user_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """条件に合う行をパートごとに返す（ユーザーの絞り込みはコピーせずに範囲を切り出す）"""
+        columns = list(columns or ARCHIVE_COLUMNS)
+        needed = set(columns)
+        if user_id is not None:
+            needed.add("user_id")
+        if start is not None or end is not None:
+            needed.add("reviewed_at")
+
+        for part in self.parts(start, end):
+            data = self.read_part(part, list(needed))
+            if user_id is not None:
+                user_ids = data["user_id"]
+                low = user_ids.searchsorted(np.int64(user_id), side="left")
+                high = user_ids.searchsorted(np.int64(user_id), side="right")
+                if low == high:
+                    continue
+                data = {name: values[low:high] for name, values in data.items()}
+            if start is not None or end is not None:
+                mask = np.ones(len(data["reviewed_at"]), dtype=bool)
+                if start is not None:
+                    mask &= data["reviewed_at"] >= np.datetime64(start, "us")
+                if end is not None:
+                    mask &= data["reviewed_at"] < np.datetime64(end, "us")
+                if not mask.any():
+                    continue
+                data = {name: values[mask] for name, values in data.items()}
+            yield {name: data[name] for name in columns}
+
+    def load(self, columns: Optional[Sequence[str]] = None, **filters) -> Dict[str, np.ndarray]:
+        """条件に合う行を列ごとに連結して返す"""
+        columns = list(columns or ARCHIVE_COLUMNS)
+        chunks = list(self.scan(columns, **filters))
+        return {
+            name: np.concatenate([chunk[name] for chunk in chunks])
+            if chunks else np.empty(0, dtype=ARCHIVE_COLUMNS[name])
+            for name in columns
+        }
+
+    def archived_ids(self, month: str) -> np.ndarray:
+        """その月のアーカイブ済みの復習ID（書き出し後にDBから削除する前に中断した場合の重複防止）"""
+        ids = [
+            self.read_part(part, ["id"])["id"]
+            for part in self._scan_parts()
+            if part["month"] == month
+        ]
+        return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+
+    def write_part(self, month: str, columns: Dict[str, np.ndarray]) -> dict:
+        """1パートを書き出す（一時ディレクトリに書いてから名前を変えるため、途中のパートは読まれない）"""
+        order = np.lexsort([columns[name] for name in reversed(SORT_COLUMNS)])
+        ids = columns["id"]
+        reviewed_at = columns["reviewed_at"]
+        name = f"part-{int(ids.min()):012d}-{uuid.uuid4().hex[:8]}"
+        part = {
+            "month": month,
+            "path": f"{month}/{name}",
+            "rows": len(ids),
+            "min_id": int(ids.min()),
+            "max_id": int(ids.max()),
+            "min_reviewed_at": str(reviewed_at.min()),
+            "max_reviewed_at": str(reviewed_at.max()),
+            "sorted_by": list(SORT_COLUMNS),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+
+        month_dir = os.path.join(self.root, month)
+        temporary = os.path.join(month_dir, f".tmp-{name}")
+        os.makedirs(temporary)
+        for column, dtype in ARCHIVE_COLUMNS.items():
+            np.save(os.path.join(temporary, f"{column}.npy"), columns[column][order].astype(dtype, copy=False))
+        with open(os.path.join(temporary, PART_META_NAME), "w", encoding="utf-8") as f:
+            json.dump(part, f)
+        os.rename(temporary, os.path.join(month_dir, name))
+        return part
+
+    def _scan_parts(self) -> List[dict]:
+        parts = []
+        if not os.path.isdir(self.root):
+            return parts
+        for month in sorted(os.listdir(self.root)):
+            month_dir = os.path.join(self.root, month)
+            if not os.path.isdir(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                meta = os.path.join(month_dir, name, PART_META_NAME)
+                if name.startswith("part-") and os.path.exists(meta):
+                    with open(meta, encoding="utf-8") as f:
+                        parts.append(json.load(f))
+        parts.sort(key=lambda part: (part["month"], part["min_id"]))
+        return parts
+
+    def refresh_manifest(self, archived_before: Optional[datetime] = None) -> dict:
+        """ディレクトリ上のパートから manifest.json を作り直す"""
+        previous = self.manifest()["archived_before"]
+        if archived_before is not None:
+            candidate = archived_before.isoformat()
+            if previous is None or candidate > previous:
+                previous = candidate
+        manifest = {"archived_before": previous, "parts": self._scan_parts()}
+
+        os.makedirs(self.root, exist_ok=True)
+        temporary = os.path.join(self.root, f".{MANIFEST_NAME}.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temporary, os.path.join(self.root, MANIFEST_NAME))
+        return manifest
+
+
+def archive_cutoff(now: Optional[datetime] = None, retention_days: Optional[int] = None) -> datetime:
+    """アーカイブする境界（保持期間を過ぎた月の翌月1日。月の途中では区切らない）"""
+    if retention_days is None:
+        retention_days = settings.REVIEW_EVENTS_RETENTION_DAYS
+    boundary = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    return datetime(boundary.year, boundary.month, 1)
+
+
+def _to_columns(rows) -> Dict[str, np.ndarray]:
+    names = list(ARCHIVE_COLUMNS)
+    values = list(zip(*rows))
+    columns = {}
+    for name, column in zip(names, values):
+        if name in ("quiz_id", "time_sec"):
+            column = [MISSING if value is None else value for value in column]
+        columns[name] = np.array(column, dtype=ARCHIVE_COLUMNS[name])
+    return columns
+
+
+def compact_review_events(
+    db: Session,
+    archive: ReviewArchive,
+    before: datetime,
+    chunk_rows: Optional[int] = None,
+) -> dict:
+    """before より前の復習をファイルに書き出してからDBから削除する
+
+    chunk_rows 件ずつ ID順に読み込み、月ごとのパートを書き出して manifest を更新してから削除をコミットする。
+    削除の前に中断しても、次回はアーカイブ済みのIDを書き出さずに削除する。
+    """
+    chunk_rows = chunk_rows or settings.REVIEW_ARCHIVE_CHUNK_ROWS
+    columns = [getattr(ReviewEvent, name) for name in ARCHIVE_COLUMNS]
+    archive.refresh_manifest()
+
+    archived: Dict[str, np.ndarray] = {}
+    archived_rows = 0
+    written_parts = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(*columns)
+            .where(ReviewEvent.reviewed_at < before, ReviewEvent.id > last_id)
+            .order_by(ReviewEvent.id)
+            .limit(chunk_rows)
+        ).all()
+        if not rows:
+            break
+
+        chunk = _to_columns(rows)
+        first_id, last_id = int(chunk["id"][0]), int(chunk["id"][-1])
+        months = chunk["reviewed_at"].astype("datetime64[M]")
+        for month in np.unique(months):
+            key = str(month)
+            if key not in archived:
+                archived[key] = archive.archived_ids(key)
+            selected = (months == month) & ~np.isin(chunk["id"], archived[key])
+            if not selected.any():
+                continue
+            archive.write_part(key, {name: values[selected] for name, values in chunk.items()})
+            archived_rows += int(selected.sum())
+            written_parts += 1
+        archive.refresh_manifest()
+
+        # 読み込んだ範囲のIDは連続して条件に合う行なので、範囲で削除できる
+        db.execute(
+            delete(ReviewEvent)
+            .where(ReviewEvent.reviewed_at < before, ReviewEvent.id >= first_id, ReviewEvent.id <= last_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    manifest = archive.refresh_manifest(archived_before=before)
+    return {
+        "archived": archived_rows,
+        "parts": written_parts,
+        "total_parts": len(manifest["parts"]),
+        "archived_before": manifest["archived_before"],
+    }
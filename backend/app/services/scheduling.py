@@ -0,0 +1,35 @@
+from typing import Dict, Optional, Type
+from app.core.config import settings
+from app.services.fsrs import FSRSScheduler
+from app.services.spaced_repetition import Scheduler, SM2Algorithm
+
+SCHEDULERS: Dict[str, Type[Scheduler]] = {
+    SM2Algorithm.name: SM2Algorithm,
+    FSRSScheduler.name: FSRSScheduler,
+}
+
+
+def get_scheduler(name: Optional[str] = None) -> Scheduler:
+    """設定（SCHEDULER）で選んだスケジューラ"""
+    name = name or settings.SCHEDULER
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler: {name}")
+    return SCHEDULERS[name]()
+
+
+def answer_quality(is_correct: bool, time_sec: Optional[int] = None) -> int:
+    """
+    採点結果と回答時間から解答品質 (0-5) を決める
+
+    不正解は 1、正解は回答時間が ANSWER_FAST_SECONDS 以内なら 5、ANSWER_SLOW_SECONDS 以内なら 4、
+    それより遅ければ 3（回答時間がなければ 4）。
+    """
+    if not is_correct:
+        return 1
+    if time_sec is None:
+        return 4
+    if time_sec <= settings.ANSWER_FAST_SECONDS:
+        return 5
+    if time_sec <= settings.ANSWER_SLOW_SECONDS:
+        return 4
+    return 3
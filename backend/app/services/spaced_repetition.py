@@ -1,15 +1,358 @@
+import math
+from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional, Sequence, Union
+import numpy as np
+from sqlalchemy import case, func, literal, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import dialect_insert
 from app.models.models import ReviewState, Card
-import math
+from app.services.activity import get_study_streak
+from app.services.due_queue import count_due_cards, next_due_card_ids, track_due_dates
+from app.services.load_balance import balance_due_dates
+from app.services.review_log import record_review_events
+from app.services.tags import get_weak_tags
 
+# 一括計算で扱う復習状態（calculate_next_reviews の入力、stability・difficulty がない場合は NaN）
+REVIEW_STATE_DTYPE = np.dtype([
+    ("easiness", np.float64),
+    ("interval_days", np.int64),
+    ("repetition", np.int64),
+    ("stability", np.float64),
+    ("difficulty", np.float64),
+    ("last_reviewed", "datetime64[us]"),
+])
 
-class SM2Algorithm:
-    """SM-2間隔反復アルゴリズムの実装"""
+# 一括計算の結果（ReviewStateの更新後の値）
+NEXT_REVIEW_DTYPE = np.dtype([
+    ("easiness", np.float64),
+    ("interval_days", np.int64),
+    ("repetition", np.int64),
+    ("due_date", "datetime64[us]"),
+    ("last_result", np.int64),
+    ("last_reviewed", "datetime64[us]"),
+    ("stability", np.float64),
+    ("difficulty", np.float64),
+])
+
+ONE_DAY = np.timedelta64(1, "D").astype("timedelta64[us]")
+
+# 今日のクイズの枚数と、そのうち新規カードの上限
+DAILY_DECK_SIZE = 10
+DAILY_NEW_CARDS = 3
+
+
+class Scheduler(ABC):
+    """間隔反復スケジューラの共通部分（次回の状態の計算 calculate_next_reviews はサブクラスで実装）"""
+    
+    name = ""
     
     def __init__(self):
         self.initial_easiness = 2.5
+    
+    def for_user(self, db: Session, user_id: int) -> "Scheduler":
+        """ユーザーごとのパラメータを使うスケジューラ（パラメータがなければ自身）"""
+        return self
+    
+    @abstractmethod
+    def calculate_next_reviews(
+        self,
+        states: np.ndarray,
+        quality: np.ndarray,
+        reviewed_at: Union[datetime, np.ndarray, None] = None,
+    ) -> np.ndarray:
+        """REVIEW_STATE_DTYPE の状態と解答品質から、NEXT_REVIEW_DTYPE の次回の状態をまとめて計算する"""
+    
+    def apply_reviews(
+        self,
+        db: Session,
+        user_id: int,
+        card_ids: Sequence[int],
+        qualities: Sequence[int],
+        reviewed_at: Optional[Sequence[datetime]] = None,
+        time_secs: Optional[Sequence[Optional[int]]] = None,
+        quiz_id: Optional[int] = None,
+    ) -> int:
+        """
+        複数の復習結果をまとめて反映し、更新したReviewStateの件数を返す
+        
+        状態は1回のSELECTで読み込み、1回の一括UPDATE（主キー指定）で書き戻す。
+        同じカードが複数回含まれる場合は渡した順に適用する。
+        DUE_LOAD_BALANCING が有効なら、次回の期限を期限のカードが少ない日に寄せる。
+        各復習は review_events にも追記する（コミットは呼び出し側で行う）。
+        """
+        if not card_ids:
+            return 0
+        
+        rows = db.execute(
+            select(
+                ReviewState.id,
+                ReviewState.card_id,
+                ReviewState.easiness,
+                ReviewState.interval_days,
+                ReviewState.repetition,
+                ReviewState.stability,
+                ReviewState.difficulty,
+                ReviewState.last_reviewed,
+                ReviewState.due_date,
+            )
+            .where(ReviewState.user_id == user_id, ReviewState.card_id.in_(set(card_ids)))
+        ).all()
+        if not rows:
+            return 0
+        
+        state_ids = np.array([row.id for row in rows], dtype=np.int64)
+        state_card_ids = np.array([row.card_id for row in rows], dtype=np.int64)
+        states = np.array(
+            [
+                (
+                    row.easiness,
+                    row.interval_days,
+                    row.repetition,
+                    np.nan if row.stability is None else row.stability,
+                    np.nan if row.difficulty is None else row.difficulty,
+                    row.last_reviewed,
+                )
+                for row in rows
+            ],
+            dtype=REVIEW_STATE_DTYPE,
+        )
+        # 期限の負荷分散で、復習するカード自身の今の期限を日ごとの枚数から除くため
+        previous_due = np.array([row.due_date for row in rows], dtype="datetime64[us]")
+        position = {row.card_id: i for i, row in enumerate(rows)}
+        
+        # ReviewStateがないカードの回答は無視
+        reviews = [i for i, card_id in enumerate(card_ids) if card_id in position]
+        targets = np.array([position[card_ids[i]] for i in reviews], dtype=np.int64)
+        quality = np.array([qualities[i] for i in reviews], dtype=np.int64)
+        times = (
+            np.array([reviewed_at[i] for i in reviews], dtype="datetime64[us]")
+            if reviewed_at is not None
+            else np.datetime64(datetime.utcnow(), "us")
+        )
+        
+        # 同じカードの2回目以降の復習は、前の結果を入力にして順に適用する
+        occurrence = np.zeros(len(targets), dtype=np.int64)
+        seen = {}
+        for i, target in enumerate(targets.tolist()):
+            occurrence[i] = seen.get(target, 0)
+            seen[target] = occurrence[i] + 1
+        
+        scheduler = self.for_user(db, user_id)
+        results = np.empty(len(states), dtype=NEXT_REVIEW_DTYPE)
+        review_results = np.empty(len(targets), dtype=NEXT_REVIEW_DTYPE)
+        updated = np.zeros(len(states), dtype=bool)
+        for round_number in range(int(occurrence.max()) + 1):
+            batch = occurrence == round_number
+            batch_targets = targets[batch]
+            batch_times = times[batch] if reviewed_at is not None else times
+            next_states = scheduler.calculate_next_reviews(states[batch_targets], quality[batch], batch_times)
+            if settings.DUE_LOAD_BALANCING:
+                balance_due_dates(db, user_id, next_states, previous_due[batch_targets])
+            results[batch_targets] = next_states
+            review_results[batch] = next_states
+            for field in REVIEW_STATE_DTYPE.names:
+                states[field][batch_targets] = next_states[field]
+            updated[batch_targets] = True
+        
+        record_review_events(
+            db,
+            user_id,
+            [card_ids[i] for i in reviews],
+            review_results,
+            [time_secs[i] for i in reviews] if time_secs is not None else None,
+            quiz_id,
+        )
+        
+        changed = np.flatnonzero(updated)
+        track_due_dates(db, user_id, zip(state_card_ids[changed].tolist(), results["due_date"][changed].tolist()))
+        db.execute(
+            update(ReviewState),
+            [
+                {
+                    "id": state_id,
+                    "easiness": easiness,
+                    "interval_days": interval_days,
+                    "repetition": repetition,
+                    "due_date": due_date,
+                    "last_result": last_result,
+                    "last_reviewed": last_reviewed,
+                    "stability": None if math.isnan(stability) else stability,
+                    "difficulty": None if math.isnan(difficulty) else difficulty,
+                }
+                for state_id, (
+                    easiness, interval_days, repetition, due_date, last_result, last_reviewed, stability, difficulty,
+                ) in zip(state_ids[changed].tolist(), results[changed].tolist())
+            ],
+        )
+        return len(changed)
+    
+    def get_due_cards(self, db: Session, user_id: int, limit: int = 10) -> List[Card]:
+        """期限が来ているカードを取得（期限の早い順）"""
+        card_ids = next_due_card_ids(db, user_id, limit)
+        if not card_ids:
+            return []
+        cards = {card.id: card for card in db.scalars(select(Card).where(Card.id.in_(card_ids)))}
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+    
+    def count_due_cards(self, db: Session, user_id: int) -> int:
+        """期限が来ているカードの件数"""
+        return count_due_cards(db, user_id)
+    
+    def get_new_cards(self, db: Session, user_id: int, limit: int = 3) -> List[Card]:
+        """新規カードを取得（ReviewStateが存在しないカード）"""
+        new_cards = (
+            db.query(Card)
+            .outerjoin(ReviewState)
+            .filter(
+                Card.user_id == user_id,
+                ReviewState.id.is_(None)  # ReviewStateが存在しない
+            )
+            .order_by(Card.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+        
+        return new_cards
+    
+    def create_initial_review_state(self, db: Session, user_id: int, card_id: int) -> ReviewState:
+        """新規カードに対する初期ReviewStateを作成"""
+        now = datetime.utcnow()
+        
+        review_state = ReviewState(
+            user_id=user_id,
+            card_id=card_id,
+            easiness=self.initial_easiness,
+            interval_days=1,
+            repetition=0,
+            due_date=now + timedelta(days=1)
+        )
+        
+        db.add(review_state)
+        return review_state
+    
+    def get_daily_cards(self, db: Session, user_id: int) -> List[Card]:
+        """
+        今日学習すべきカードを取得（復習 + 新規）
+        
+        期限の近い復習カード（最大 DAILY_DECK_SIZE 枚）の残り枠を新規カード（最大 DAILY_NEW_CARDS 枚）で埋める。
+        カードは1回のクエリで選び、出題する新規カードの初期ReviewStateは1回のINSERTでまとめて作成する。
+        """
+        now = datetime.utcnow()
+        
+        due = (
+            select(ReviewState.card_id, ReviewState.due_date)
+            .join(Card, Card.id == ReviewState.card_id)
+            .where(Card.user_id == user_id, ReviewState.user_id == user_id, ReviewState.due_date <= now)
+            .order_by(ReviewState.due_date, ReviewState.card_id)
+            .limit(DAILY_DECK_SIZE)
+            .subquery()
+        )
+        new = (
+            select(Card.id.label("card_id"), Card.created_at)
+            .outerjoin(ReviewState, ReviewState.card_id == Card.id)
+            .where(Card.user_id == user_id, ReviewState.id.is_(None))
+            .order_by(Card.created_at.desc(), Card.id.desc())
+            .limit(DAILY_NEW_CARDS)
+            .subquery()
+        )
+        deck = union_all(
+            select(
+                due.c.card_id,
+                literal(0).label("kind"),
+                func.row_number().over(order_by=(due.c.due_date, due.c.card_id)).label("rank"),
+            ),
+            select(
+                new.c.card_id,
+                literal(1).label("kind"),
+                func.row_number().over(order_by=(new.c.created_at.desc(), new.c.card_id.desc())).label("rank"),
+            ),
+        ).subquery()
+        ranked = select(
+            deck.c.card_id,
+            deck.c.kind,
+            deck.c.rank,
+            func.sum(case((deck.c.kind == 0, 1), else_=0)).over().label("due_count"),
+        ).subquery()
+        
+        rows = db.execute(
+            select(Card, ranked.c.kind)
+            .join(ranked, ranked.c.card_id == Card.id)
+            .where(or_(ranked.c.kind == 0, ranked.c.rank <= DAILY_DECK_SIZE - ranked.c.due_count))
+            .order_by(ranked.c.kind, ranked.c.rank)
+        ).all()
+        
+        # 新規カードに初期ReviewStateを作成（同時に作成された場合は既存のものを使う）
+        new_card_ids = [card.id for card, kind in rows if kind == 1]
+        if new_card_ids:
+            db.execute(
+                dialect_insert(db, ReviewState)
+                .values([
+                    {
+                        "user_id": user_id,
+                        "card_id": card_id,
+                        "easiness": self.initial_easiness,
+                        "interval_days": 1,
+                        "repetition": 0,
+                        "due_date": now + timedelta(days=1),
+                    }
+                    for card_id in new_card_ids
+                ])
+                .on_conflict_do_nothing(index_elements=[ReviewState.user_id, ReviewState.card_id])
+            )
+            track_due_dates(db, user_id, [(card_id, now + timedelta(days=1)) for card_id in new_card_ids])
+        
+        return [card for card, _ in rows]
+    
+    def calculate_study_streak(self, db: Session, user_id: int) -> int:
+        """連続学習日数を取得（クイズ提出時に更新している user_streaks から読む）"""
+        return get_study_streak(db, user_id)
+    
+    def get_weak_tags(self, db: Session, user_id: int, limit: int = 3) -> List[dict]:
+        """弱点タグを取得（クイズ提出時に更新している tag_stats から読む）"""
+        return get_weak_tags(db, user_id, limit)
+    
+    # 非同期版（AsyncSession上で同じクエリを実行）
+    
+    async def get_due_cards_async(self, db: AsyncSession, user_id: int, limit: int = 10) -> List[Card]:
+        return await db.run_sync(self.get_due_cards, user_id, limit)
+    
+    async def count_due_cards_async(self, db: AsyncSession, user_id: int) -> int:
+        return await db.run_sync(self.count_due_cards, user_id)
+    
+    async def get_new_cards_async(self, db: AsyncSession, user_id: int, limit: int = 3) -> List[Card]:
+        return await db.run_sync(self.get_new_cards, user_id, limit)
+    
+    async def get_daily_cards_async(self, db: AsyncSession, user_id: int) -> List[Card]:
+        return await db.run_sync(self.get_daily_cards, user_id)
+    
+    async def calculate_study_streak_async(self, db: AsyncSession, user_id: int) -> int:
+        return await db.run_sync(self.calculate_study_streak, user_id)
+    
+    async def apply_reviews_async(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        card_ids: Sequence[int],
+        qualities: Sequence[int],
+        time_secs: Optional[Sequence[Optional[int]]] = None,
+        quiz_id: Optional[int] = None,
+    ) -> int:
+        return await db.run_sync(self.apply_reviews, user_id, card_ids, qualities, None, time_secs, quiz_id)
+    
+    async def get_weak_tags_async(self, db: AsyncSession, user_id: int, limit: int = 3) -> List[dict]:
+        return await db.run_sync(self.get_weak_tags, user_id, limit)
+
+
+class SM2Algorithm(Scheduler):
+    """SM-2間隔反復アルゴリズムの実装"""
+    
+    name = "sm2"
+    
+    def __init__(self):
+        super().__init__()
         self.min_easiness = 1.3
         
     def calculate_next_review(self, review_state: ReviewState, quality: int) -> ReviewState:
@@ -60,148 +403,47 @@ class SM2Algorithm:
         
         return review_state
     
-    def get_due_cards(self, db: Session, user_id: int, limit: int = 10) -> List[Card]:
-        """期限が来ているカードを取得"""
-        now = datetime.utcnow()
-        
-        due_cards = (
-            db.query(Card)
-            .join(ReviewState)
-            .filter(
-                Card.user_id == user_id,
-                ReviewState.due_date <= now
-            )
-            .order_by(ReviewState.due_date)
-            .limit(limit)
-            .all()
-        )
-        
-        return due_cards
-    
-    def get_new_cards(self, db: Session, user_id: int, limit: int = 3) -> List[Card]:
-        """新規カードを取得（ReviewStateが存在しないカード）"""
-        new_cards = (
-            db.query(Card)
-            .outerjoin(ReviewState)
-            .filter(
-                Card.user_id == user_id,
-                ReviewState.id.is_(None)  # ReviewStateが存在しない
-            )
-            .order_by(Card.created_at.desc())
-            .limit(limit)
-            .all()
-        )
+    def calculate_next_reviews(
+        self,
+        states: np.ndarray,
+        quality: np.ndarray,
+        reviewed_at: Union[datetime, np.ndarray, None] = None,
+    ) -> np.ndarray:
+        """
+        calculate_next_review を配列でまとめて計算（結果は1件ずつ計算した場合と同じ）
         
-        return new_cards
-    
-    def create_initial_review_state(self, db: Session, user_id: int, card_id: int) -> ReviewState:
-        """新規カードに対する初期ReviewStateを作成"""
-        now = datetime.utcnow()
+        Args:
+            states: REVIEW_STATE_DTYPE の構造化配列
+            quality: 解答品質 (0-5) の配列
+            reviewed_at: 復習日時（配列なら1件ごと。オフラインで記録した復習の反映用）
         
-        review_state = ReviewState(
-            user_id=user_id,
-            card_id=card_id,
-            easiness=self.initial_easiness,
-            interval_days=1,
-            repetition=0,
-            due_date=now + timedelta(days=1)
-        )
+        Returns:
+            NEXT_REVIEW_DTYPE の構造化配列
+        """
+        quality = np.clip(np.asarray(quality, dtype=np.int64), 0, 5)
+        if reviewed_at is None:
+            reviewed_at = datetime.utcnow()
+        reviewed_at = np.broadcast_to(np.asarray(reviewed_at, dtype="datetime64[us]"), quality.shape)
         
-        db.add(review_state)
-        return review_state
-    
-    def get_daily_cards(self, db: Session, user_id: int) -> List[Card]:
-        """今日学習すべきカードを取得（復習 + 新規）"""
-        # 復習カード（最大10枚）
-        due_cards = self.get_due_cards(db, user_id, limit=10)
-        
-        # 新規カード（2-3枚）
-        remaining_slots = max(0, 10 - len(due_cards))
-        new_card_limit = min(3, remaining_slots + 2)  # 最低2枚、最大3枚
-        new_cards = self.get_new_cards(db, user_id, limit=new_card_limit)
-        
-        # 新規カードに初期ReviewStateを作成
-        for card in new_cards:
-            existing_state = db.query(ReviewState).filter(
-                ReviewState.user_id == user_id,
-                ReviewState.card_id == card.id
-            ).first()
-            
-            if not existing_state:
-                self.create_initial_review_state(db, user_id, card.id)
+        easiness = states["easiness"]
+        interval = states["interval_days"]
+        repetition = states["repetition"]
+        correct = quality >= 3
         
-        # 合計10枚まで
-        all_cards = due_cards + new_cards
-        return all_cards[:10]
-    
-    def calculate_study_streak(self, db: Session, user_id: int) -> int:
-        """連続学習日数を計算"""
-        # 過去の学習記録から連続日数を算出
-        # 簡易実装：ReviewStateのlast_reviewedを使用
-        now = datetime.utcnow().date()
-        streak = 0
-        
-        # 今日から逆順に学習記録をチェック
-        check_date = now
-        while True:
-            # その日に学習したレビュー記録があるかチェック
-            next_day = check_date + timedelta(days=1)
-            reviewed_count = (
-                db.query(ReviewState)
-                .filter(
-                    ReviewState.user_id == user_id,
-                    ReviewState.last_reviewed >= datetime.combine(check_date, datetime.min.time()),
-                    ReviewState.last_reviewed < datetime.combine(next_day, datetime.min.time())
-                )
-                .count()
-            )
-            
-            if reviewed_count > 0:
-                streak += 1
-                check_date -= timedelta(days=1)
-            else:
-                break
-                
-            # 最大365日まで
-            if streak >= 365:
-                break
+        # 正解の場合の間隔（1回目: 1日、2回目: 6日、以降: 前回の間隔 × EF値）
+        grown = np.trunc(interval * easiness).astype(np.int64)
+        next_interval = np.where(repetition == 0, 1, np.where(repetition == 1, 6, grown))
         
-        return streak
-    
-    def get_weak_tags(self, db: Session, user_id: int, limit: int = 3) -> List[dict]:
-        """弱点タグを取得"""
-        # タグ別の正答率を計算
-        from sqlalchemy import func
-        from app.models.models import QuizItem, Quiz
-        
-        tag_stats = (
-            db.query(
-                func.json_extract(Card.tags, '$[0]').label('tag'),
-                func.avg(func.cast(QuizItem.is_correct, func.Integer)).label('accuracy'),
-                func.count(QuizItem.id).label('total_count')
-            )
-            .join(QuizItem, Card.id == QuizItem.card_id)
-            .join(Quiz, QuizItem.quiz_id == Quiz.id)
-            .filter(
-                Card.user_id == user_id,
-                Quiz.completed == True,
-                Card.tags.isnot(None)
-            )
-            .group_by(func.json_extract(Card.tags, '$[0]'))
-            .having(func.count(QuizItem.id) >= 3)  # 最低3回は出題されたタグ
-            .order_by(func.avg(func.cast(QuizItem.is_correct, func.Integer)))
-            .limit(limit)
-            .all()
-        )
+        result = np.empty(len(states), dtype=NEXT_REVIEW_DTYPE)
+        result["interval_days"] = np.where(correct, next_interval, 1)
+        result["repetition"] = np.where(correct, repetition + 1, 0)
+        result["due_date"] = reviewed_at + result["interval_days"] * ONE_DAY
         
-        weak_tags = []
-        for tag, accuracy, total_count in tag_stats:
-            if tag and accuracy < 0.7:  # 70%未満を弱点とする
-                weak_tags.append({
-                    'tag': tag,
-                    'accuracy_rate': float(accuracy),
-                    'total_count': int(total_count),
-                    'correct_count': int(total_count * accuracy)
-                })
-        
-        return weak_tags
\ No newline at end of file
+        # EF値の更新
+        penalty = 5 - quality
+        result["easiness"] = np.maximum(easiness + (0.1 - penalty * (0.08 + penalty * 0.02)), self.min_easiness)
+        result["last_result"] = quality
+        result["last_reviewed"] = reviewed_at
+        result["stability"] = states["stability"]
+        result["difficulty"] = states["difficulty"]
+        return result
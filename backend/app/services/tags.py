@@ -0,0 +1,101 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import Float, cast, delete, insert, select
+from sqlalchemy.orm import Session
+from app.core.database import dialect_insert
+from app.models.models import Card, CardTag, ReviewState, TagStat
+
+MAX_TAG_LENGTH = 100
+
+# 弱点タグ（最低 WEAK_TAG_MIN_REVIEWS 回出題され、正答率が WEAK_TAG_MAX_ACCURACY 未満）
+WEAK_TAG_MIN_REVIEWS = 3
+WEAK_TAG_MAX_ACCURACY = 0.7
+
+
+def normalize_tags(tags: Optional[Iterable]) -> List[str]:
+    """Card.tags から空・重複を除いたタグのリスト"""
+    normalized = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip()[:MAX_TAG_LENGTH]
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+
+def add_card_tags(db: Session, user_id: int, cards: Sequence[Card]) -> None:
+    """作成したカードのタグを card_tags に1回のINSERTで追加（コミットは呼び出し側で行う）"""
+    rows = [
+        {"card_id": card.id, "tag": tag, "user_id": user_id}
+        for card in cards
+        for tag in normalize_tags(card.tags)
+    ]
+    if rows:
+        db.execute(insert(CardTag), rows)
+
+
+def replace_card_tags(db: Session, card: Card) -> None:
+    """カードのタグが変更された場合に card_tags を置き換える"""
+    db.execute(delete(CardTag).where(CardTag.card_id == card.id))
+    add_card_tags(db, card.user_id, [card])
+
+
+def record_tag_results(db: Session, user_id: int, results: Iterable[Tuple[Optional[Iterable], bool]]) -> None:
+    """(カードのタグ, 正解か) の列からタグごとの回答数・正解数を1回のUPSERTで加算"""
+    totals: Dict[str, int] = Counter()
+    corrects: Dict[str, int] = Counter()
+    for tags, is_correct in results:
+        for tag in normalize_tags(tags):
+            totals[tag] += 1
+            corrects[tag] += 1 if is_correct else 0
+    if not totals:
+        return
+
+    stmt = dialect_insert(db, TagStat).values([
+        {"user_id": user_id, "tag": tag, "correct": corrects[tag], "total": total}
+        for tag, total in totals.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TagStat.user_id, TagStat.tag],
+        set_={
+            "correct": TagStat.correct + stmt.excluded.correct,
+            "total": TagStat.total + stmt.excluded.total,
+        },
+    ))
+
+
+def get_weak_tags(db: Session, user_id: int, limit: int = 3) -> List[dict]:
+    """正答率の低いタグ（tag_stats の主キーの範囲読み込み）"""
+    accuracy = cast(TagStat.correct, Float) / TagStat.total
+    rows = db.execute(
+        select(TagStat.tag, TagStat.correct, TagStat.total)
+        .where(
+            TagStat.user_id == user_id,
+            TagStat.total >= WEAK_TAG_MIN_REVIEWS,
+            accuracy < WEAK_TAG_MAX_ACCURACY,
+        )
+        .order_by(accuracy, TagStat.tag)
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "tag": tag,
+            "accuracy_rate": correct / total,
+            "total_count": total,
+            "correct_count": correct,
+        }
+        for tag, correct, total in rows
+    ]
+
+
+def get_tag_cards(db: Session, user_id: int, tag: str, limit: int) -> List[Card]:
+    """タグの付いたカードを期限の早い順に取得（未学習のカードは最後）"""
+    return list(db.scalars(
+        select(Card)
+        .join(CardTag, CardTag.card_id == Card.id)
+        .outerjoin(ReviewState, ReviewState.card_id == Card.id)
+        .where(CardTag.user_id == user_id, CardTag.tag == tag)
+        .order_by(ReviewState.due_date.is_(None), ReviewState.due_date, Card.id)
+        .limit(limit)
+    ))
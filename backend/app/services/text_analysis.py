@@ -0,0 +1,118 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+# 箇条書きパターン（種類ごとに判定）
+BULLET_PATTERNS = (
+    ("bullet", re.compile(r'^[・\-\*]\s*(.+)$')),
+    ("numbered", re.compile(r'^\d+\.\s*(.+)$')),
+    ("lettered", re.compile(r'^[a-zA-Z]\)\s*(.+)$')),
+)
+
+# 日本語・英語の文区切り
+SENTENCE_SPLIT_PATTERN = re.compile(r'[。！？\.\!\?]\s*')
+
+MAX_BULLET_ITEM_LENGTH = 50
+MIN_SENTENCE_LENGTH = 10
+
+# 保持する件数の上限（カード生成に使うのは先頭の一部だけなので、巨大なノートでもメモリを一定に保つ）
+MAX_LINES = 5000
+MAX_BULLETS_PER_KIND = 1000
+MAX_SENTENCES = 1000
+# これより長い行・文は途中までしか保持しない（改行や句点のない巨大なファイル対策）
+MAX_BUFFER_LENGTH = 10000
+
+
+@dataclass
+class TextAnalysis:
+    """ノートを1回走査して得た行・文・箇条書きの構造"""
+    lines: List[str] = field(default_factory=list)  # 空行を除いた行（前後の空白を除去済み、先頭 MAX_LINES 行）
+    line_count: int = 0  # 空行を除いた全行数
+    max_line_length: int = 0
+    bullets: Dict[str, List[str]] = field(default_factory=dict)  # 箇条書きの種類 -> 項目
+    sentences: List[str] = field(default_factory=list)
+
+
+class TextAnalyzer:
+    """テキストを分割して渡しながら解析する（アップロードされたファイルを読みながら解析する場合）"""
+
+    def __init__(self):
+        self.analysis = TextAnalysis(bullets={kind: [] for kind, _ in BULLET_PATTERNS})
+        self._line_buffer = ""
+        self._sentence_buffer = ""
+        self._sentence_overflow = False  # 長すぎる文を読み飛ばしている途中
+
+    def feed(self, text: str) -> None:
+        """テキストの続きを解析（行や文の途中で区切られていてもよい）"""
+        lines = (self._line_buffer + text).split('\n')
+        self._line_buffer = lines.pop()[:MAX_BUFFER_LENGTH]
+        for line in lines:
+            self._add_line(line)
+
+        if len(self.analysis.sentences) >= MAX_SENTENCES:
+            return
+        self._sentence_buffer += text
+        # 区切り文字の後の空白が次の断片に続く可能性があるため、末尾に達した区切りは次回に持ち越す
+        start = 0
+        last = None
+        for match in SENTENCE_SPLIT_PATTERN.finditer(self._sentence_buffer):
+            if match.end() == len(self._sentence_buffer) or len(self.analysis.sentences) >= MAX_SENTENCES:
+                last = match
+                break
+            self._add_sentence(self._sentence_buffer[start:match.start()])
+            start = match.end()
+
+        # 長すぎる文は使わないため、区切り文字まで揃っていれば捨て、途中なら次の区切りまで読み飛ばす
+        pending_end = last.start() if last else len(self._sentence_buffer)
+        if pending_end - start > MAX_BUFFER_LENGTH:
+            if last:
+                start = last.start()
+            else:
+                start = len(self._sentence_buffer)
+                self._sentence_overflow = True
+        self._sentence_buffer = self._sentence_buffer[start:]
+
+    def close(self) -> TextAnalysis:
+        """残りのテキストを解析して結果を返す"""
+        self._add_line(self._line_buffer)
+        for sentence in SENTENCE_SPLIT_PATTERN.split(self._sentence_buffer):
+            self._add_sentence(sentence)
+        self._line_buffer = self._sentence_buffer = ""
+        return self.analysis
+
+    def _add_line(self, raw_line: str) -> None:
+        line = raw_line[:MAX_BUFFER_LENGTH].strip()
+        if not line:
+            return
+
+        analysis = self.analysis
+        analysis.line_count += 1
+        analysis.max_line_length = max(analysis.max_line_length, len(line))
+        if len(analysis.lines) < MAX_LINES:
+            analysis.lines.append(line)
+
+        for kind, pattern in BULLET_PATTERNS:
+            items = analysis.bullets[kind]
+            if len(items) >= MAX_BULLETS_PER_KIND:
+                continue
+            match = pattern.match(line)
+            if match:
+                item = match.group(1).strip()
+                if item and len(item) <= MAX_BULLET_ITEM_LENGTH:
+                    items.append(item)
+
+    def _add_sentence(self, sentence: str) -> None:
+        if self._sentence_overflow:
+            self._sentence_overflow = False
+            return
+        if len(self.analysis.sentences) >= MAX_SENTENCES or len(sentence) > MAX_BUFFER_LENGTH:
+            return
+        if sentence.strip() and len(sentence) > MIN_SENTENCE_LENGTH:
+            self.analysis.sentences.append(sentence.strip())
+
+
+def analyze_text(text: str) -> TextAnalysis:
+    """テキストを行・文・箇条書きに分解"""
+    analyzer = TextAnalyzer()
+    analyzer.feed(text)
+    return analyzer.close()
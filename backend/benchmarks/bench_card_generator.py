@@ -0,0 +1,49 @@
+"""ノートサイズに対するカード生成時間を計測するベンチマーク
+
+    cd backend && python -m benchmarks.bench_card_generator --sizes 64 256 1024
+"""
+import argparse
+import random
+import time
+
+from app.services.card_generator import CardGenerator
+
+
+def make_note(size_kb: int, seed: int = 0) -> str:
+    """語彙・箇条書き・定義文・一般文が混在したノートを生成"""
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    i = 0
+    while size < size_kb * 1024:
+        line = rng.choice([
+            f"word{i} - 意味{i}",
+            f"・項目{i}",
+            f"API{i}とはアプリケーションの接続仕様である。",
+            f"This is sentence number {i} about Tokyo and React.",
+        ])
+        lines.append(line)
+        size += len(line.encode())
+        i += 1
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024], help="ノートサイズ（KB）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = CardGenerator()
+    for size_kb in args.sizes:
+        text = make_note(size_kb)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            cards = generator.generate_cards(text, note_id=1)
+            timings.append(time.perf_counter() - started)
+        print(f"{size_kb:>6} KB: {min(timings) * 1000:9.1f} ms  cards={len(cards)}")
+
+
+if __name__ == "__main__":
+    main()
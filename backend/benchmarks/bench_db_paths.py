@@ -0,0 +1,76 @@
+"""同期セッション（スレッドプール）と AsyncSession の同時実行性能を比較するベンチマーク
+
+    cd backend && python -m benchmarks.bench_db_paths --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import anyio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import Settings
+from app.core.database import create_async_db_engine, create_db_engine, to_async_url
+from app.services.spaced_repetition import SM2Algorithm
+from benchmarks.bench_sqlite_concurrency import _seed
+
+
+async def _run(label: str, handler, concurrency: int, requests: int, users: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await handler(i % users + 1)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:>6}: {requests / elapsed:8.1f} req/s  ({elapsed:.2f}s)")
+
+
+async def main_async(args) -> None:
+    sm2 = SM2Algorithm()
+    config = Settings()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        sync_engine = create_db_engine(url, config)
+        _seed(sync_engine, args.users, args.cards)
+        SyncSession = sessionmaker(bind=sync_engine, autoflush=False)
+
+        async_engine = create_async_db_engine(to_async_url(url), config)
+        AsyncSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+        def sync_request(user_id: int):
+            with SyncSession() as db:
+                sm2.get_due_cards(db, user_id, limit=100)
+
+        async def sync_handler(user_id: int):
+            # FastAPIの同期ハンドラと同じくスレッドプールで実行
+            await anyio.to_thread.run_sync(sync_request, user_id)
+
+        async def async_handler(user_id: int):
+            async with AsyncSession() as db:
+                await sm2.get_due_cards_async(db, user_id, limit=100)
+
+        await _run("sync", sync_handler, args.concurrency, args.requests, args.users)
+        await _run("async", async_handler, args.concurrency, args.requests, args.users)
+
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--cards", type=int, default=50)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
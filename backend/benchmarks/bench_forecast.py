@@ -0,0 +1,97 @@
+"""復習数の予測（ReviewStateの読み込み + モンテカルロ法）の所要時間を測るベンチマーク
+
+    cd backend && python -m benchmarks.bench_forecast --states 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import Settings
+from app.core.database import create_db_engine
+from app.models import models
+from app.services.forecast import forecast_reviews, load_forecast_states, simulate_reviews
+from app.services.scheduling import get_scheduler
+
+BATCH_ROWS = 50000
+
+
+def _seed(engine, states: int, users: int) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow()
+    with Session() as db:
+        db.execute(insert(models.User), [
+            {"id": i, "name": f"u{i}", "email": f"u{i}@example.com", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ])
+        db.add(models.Note(id=1, user_id=1, raw_text="seed"))
+        db.flush()
+        for low in range(0, states, BATCH_ROWS):
+            ids = range(low + 1, min(low + BATCH_ROWS, states) + 1)
+            user_ids = rng.integers(1, users + 1, len(ids)).tolist()
+            intervals = rng.integers(1, 60, len(ids)).tolist()
+            offsets = rng.integers(-5, 60, len(ids)).tolist()
+            db.execute(insert(models.Card), [
+                {"id": i, "user_id": u, "note_id": 1, "type": "cloze", "prompt": "p", "answer": "a"}
+                for i, u in zip(ids, user_ids)
+            ])
+            db.execute(insert(models.ReviewState), [
+                {
+                    "user_id": u,
+                    "card_id": i,
+                    "easiness": 2.5,
+                    "interval_days": interval,
+                    "repetition": 3,
+                    "due_date": now + timedelta(days=offset),
+                    "last_reviewed": now + timedelta(days=offset - interval),
+                }
+                for i, u, interval, offset in zip(ids, user_ids, intervals, offsets)
+            ])
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--states", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", Settings())
+        started = time.perf_counter()
+        _seed(engine, args.states, args.users)
+        print(f"seed       {args.states:9d} states:  {time.perf_counter() - started:7.2f} s")
+        Session = sessionmaker(bind=engine)
+
+        for name in ("sm2", "fsrs"):
+            scheduler = get_scheduler(name)
+            with Session() as db:
+                start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+                started = time.perf_counter()
+                data = load_forecast_states(db, start)
+                loaded = time.perf_counter()
+                result = simulate_reviews(data, scheduler, start, args.days, args.runs, seed=0)
+                finished = time.perf_counter()
+            print(
+                f"{name:4s}       load: {loaded - started:6.2f} s  simulate ({args.runs} runs): "
+                f"{finished - loaded:6.2f} s  peak: {int(result.totals.mean(axis=0).max())}"
+            )
+
+        with Session() as db:
+            started = time.perf_counter()
+            forecast_reviews(db, get_scheduler("sm2"), user_id=1, days=args.days, runs=args.runs, seed=0)
+            print(f"one user   total:  {(time.perf_counter() - started) * 1000:7.1f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""FSRSパラメータ推定（fit_params）の所要時間と、既知のパラメータで生成した復習履歴の損失を測るベンチマーク
+
+    cd backend && python -m benchmarks.bench_fsrs_optimizer --reviews 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.fsrs import DEFAULT_PARAMS, FSRSScheduler, build_history, evaluate_loss, fit_params
+from app.services.spaced_repetition import ONE_DAY, REVIEW_STATE_DTYPE
+
+
+def _simulate(scheduler: FSRSScheduler, cards: int, reviews_per_card: int, seed: int):
+    """scheduler のモデルに従って想起・忘却させた復習履歴（予定日に復習し、評価は想起の可否から決める）"""
+    rng = np.random.default_rng(seed)
+    states = np.zeros(cards, dtype=REVIEW_STATE_DTYPE)
+    states["stability"] = np.nan
+    states["difficulty"] = np.nan
+    states["last_reviewed"] = np.datetime64("NaT")
+    reviewed_at = np.datetime64("2026-01-01", "us") + (rng.random(cards) * 30 * ONE_DAY).astype("timedelta64[us]")
+
+    card_ids, times, qualities = [], [], []
+    for step in range(reviews_per_card):
+        if step == 0:
+            recalled = rng.random(cards) < 0.7
+        else:
+            elapsed = (reviewed_at - states["last_reviewed"]) / ONE_DAY
+            recalled = rng.random(cards) < (1 + 19 / 81 * elapsed / states["stability"]) ** -0.5
+        quality = np.where(recalled, rng.choice([3, 4, 5], cards, p=[0.15, 0.7, 0.15]), 1)
+        card_ids.append(np.arange(cards))
+        times.append(reviewed_at.copy())
+        qualities.append(quality)
+
+        results = scheduler.calculate_next_reviews(states, quality, reviewed_at)
+        for field in REVIEW_STATE_DTYPE.names:
+            states[field] = results[field]
+        # 予定日の前後に少しずらして復習する
+        jitter = rng.uniform(0.7, 1.5, cards)
+        reviewed_at = reviewed_at + (results["interval_days"] * jitter * ONE_DAY).astype("timedelta64[us]")
+
+    card_ids = np.concatenate(card_ids)
+    return build_history(np.ones(len(card_ids), dtype=np.int64), card_ids, np.concatenate(times), np.concatenate(qualities))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=1000000)
+    parser.add_argument("--reviews-per-card", type=int, default=10)
+    parser.add_argument("--epochs", type=int, default=4)
+    args = parser.parse_args()
+
+    # 既定値からずらした「真の」パラメータで履歴を作り、既定値から推定する
+    rng = np.random.default_rng(0)
+    true_params = DEFAULT_PARAMS * rng.uniform(0.7, 1.3, len(DEFAULT_PARAMS))
+    started = time.perf_counter()
+    history = _simulate(FSRSScheduler(true_params), args.reviews // args.reviews_per_card, args.reviews_per_card, 1)
+    print(f"simulate   {len(history):9d} reviews: {time.perf_counter() - started:7.2f} s")
+
+    started = time.perf_counter()
+    result = fit_params(history, epochs=args.epochs)
+    print(f"fit        {args.epochs} epochs:        {time.perf_counter() - started:7.2f} s")
+    print(f"loss       default:  {result.initial_loss:.5f}")
+    print(f"loss       fitted:   {result.loss:.5f}")
+    print(f"loss       true:     {evaluate_loss(history, true_params):.5f}")
+
+
+if __name__ == "__main__":
+    main()
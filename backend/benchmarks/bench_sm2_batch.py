@@ -0,0 +1,88 @@
+"""SM-2の1件ずつの更新と一括更新（calculate_next_reviews + 一括UPDATE）を比較するベンチマーク
+
+    cd backend && python -m benchmarks.bench_sm2_batch --cards 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import Settings
+from app.core.database import create_db_engine
+from app.models import models
+from app.services.spaced_repetition import REVIEW_STATE_DTYPE, SM2Algorithm
+
+
+def _seed(engine, cards: int) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(models.User(id=1, name="u1", email="u1@example.com", hashed_password="x"))
+        db.add(models.Note(id=1, user_id=1, raw_text="seed"))
+        db.flush()
+        db.execute(insert(models.Card), [
+            {"id": i, "user_id": 1, "note_id": 1, "type": "cloze", "prompt": f"p{i}", "answer": f"a{i}"}
+            for i in range(1, cards + 1)
+        ])
+        db.execute(insert(models.ReviewState), [
+            {"user_id": 1, "card_id": i, "due_date": datetime.utcnow() - timedelta(days=1)}
+            for i in range(1, cards + 1)
+        ])
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=10000)
+    args = parser.parse_args()
+
+    sm2 = SM2Algorithm()
+    rng = random.Random(0)
+    card_ids = list(range(1, args.cards + 1))
+    qualities = [rng.randint(0, 5) for _ in card_ids]
+
+    # 計算のみ
+    states = np.zeros(len(card_ids), dtype=REVIEW_STATE_DTYPE)
+    states["easiness"] = [rng.uniform(1.3, 3.0) for _ in card_ids]
+    states["interval_days"] = [rng.randint(1, 100) for _ in card_ids]
+    states["repetition"] = [rng.randint(0, 10) for _ in card_ids]
+    states["stability"] = np.nan
+    states["difficulty"] = np.nan
+    states["last_reviewed"] = np.datetime64("NaT")
+    started = time.perf_counter()
+    sm2.calculate_next_reviews(states, np.asarray(qualities))
+    print(f"calculate  vectorized: {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+    # DBへの書き戻しを含む
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", Settings())
+        _seed(engine, args.cards)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as db:
+            started = time.perf_counter()
+            for card_id, quality in zip(card_ids, qualities):
+                state = db.scalar(
+                    select(models.ReviewState)
+                    .where(models.ReviewState.user_id == 1, models.ReviewState.card_id == card_id)
+                )
+                sm2.calculate_next_review(state, quality)
+            db.commit()
+            print(f"apply      per-row:    {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+        with Session() as db:
+            started = time.perf_counter()
+            sm2.apply_reviews(db, 1, card_ids, qualities)
+            db.commit()
+            print(f"apply      batch:      {(time.perf_counter() - started) * 1000:9.1f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""SQLiteの同時クイズ提出スループットを比較するベンチマーク
+
+    cd backend && python -m benchmarks.bench_sqlite_concurrency --threads 16 --seconds 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import Settings
+from app.core.database import create_db_engine
+from app.models import models
+
+
+def _seed(engine, users: int, cards_per_user: int) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        now = datetime.utcnow()
+        for user_id in range(1, users + 1):
+            db.add(models.User(id=user_id, name=f"u{user_id}", email=f"u{user_id}@example.com", hashed_password="x"))
+            db.add(models.Note(id=user_id, user_id=user_id, raw_text="seed"))
+        db.flush()
+        for user_id in range(1, users + 1):
+            for i in range(cards_per_user):
+                card = models.Card(user_id=user_id, note_id=user_id, type="cloze", prompt=f"p{i}", answer=f"a{i}")
+                db.add(card)
+                db.flush()
+                db.add(models.ReviewState(user_id=user_id, card_id=card.id, due_date=now - timedelta(days=1)))
+        db.commit()
+
+
+def _submit_quiz(Session, user_id: int, cards_per_user: int, answers: int) -> None:
+    """submit_quizと同程度の読み書きを1トランザクションで行う"""
+    with Session() as db:
+        quiz = models.Quiz(user_id=user_id, title="bench")
+        db.add(quiz)
+        db.flush()
+        states = (
+            db.query(models.ReviewState)
+            .filter(models.ReviewState.user_id == user_id)
+            .order_by(models.ReviewState.due_date)
+            .limit(answers)
+            .all()
+        )
+        for state in states:
+            db.add(models.QuizItem(quiz_id=quiz.id, card_id=state.card_id, user_answer="a", is_correct=True, time_sec=3))
+            state.repetition += 1
+            state.due_date = datetime.utcnow() + timedelta(days=random.randint(1, 30))
+        quiz.completed = True
+        quiz.completed_at = datetime.utcnow()
+        db.commit()
+
+
+def run(engine, threads: int, seconds: float, users: int, cards_per_user: int, answers: int) -> dict:
+    _seed(engine, users, cards_per_user)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    deadline = time.perf_counter() + seconds
+    results = {"ok": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            try:
+                _submit_quiz(Session, random.randint(1, users), cards_per_user, answers)
+                key = "ok"
+            except OperationalError:
+                key = "locked"
+            with lock:
+                results[key] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    engine.dispose()
+    results["per_sec"] = results["ok"] / seconds
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--answers", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 旧実装相当: check_same_thread=False のみ
+        baseline = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'baseline.db')}",
+            connect_args={"check_same_thread": False},
+        )
+        tuned = create_db_engine(f"sqlite:///{os.path.join(tmp, 'tuned.db')}", Settings())
+
+        for label, engine in (("baseline", baseline), ("tuned", tuned)):
+            result = run(engine, args.threads, args.seconds, args.users, args.cards, args.answers)
+            print(f"{label:>8}: {result['per_sec']:8.1f} submissions/s  ok={result['ok']}  locked={result['locked']}")
+
+
+if __name__ == "__main__":
+    main()
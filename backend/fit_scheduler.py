@@ -0,0 +1,51 @@
+import argparse
+import json
+import time
+import numpy as np
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.fsrs import GLOBAL_USER_ID, fit_params, load_params, load_review_history, save_params
+from app.services.review_log import ReviewArchive
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learn2Quiz FSRSパラメータの推定")
+    parser.add_argument("--archive-dir", default=settings.REVIEW_ARCHIVE_DIR)
+    parser.add_argument("--user-id", type=int, help="このユーザーの復習履歴だけで推定する")
+    parser.add_argument("--per-user", action="store_true", help="共通パラメータに加えて、復習数の多いユーザーごとにも推定する")
+    parser.add_argument("--min-reviews", type=int, default=settings.FSRS_OPTIMIZER_MIN_REVIEWS)
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="推定結果を表示するだけで保存しない")
+    args = parser.parse_args()
+
+    archive = ReviewArchive(args.archive_dir)
+    with SessionLocal() as db:
+        history = load_review_history(db, archive, user_id=args.user_id)
+        targets = [GLOBAL_USER_ID if args.user_id is None else args.user_id]
+        if args.per_user and args.user_id is None:
+            # 2回目以降の復習が min_reviews 以上あるユーザー
+            user_ids, counts = np.unique(history.user_ids[~history.first], return_counts=True)
+            targets += user_ids[counts >= args.min_reviews].tolist()
+
+        # ユーザーごとの推定は共通パラメータから始める
+        initial = load_params(db, GLOBAL_USER_ID)
+        for user_id in targets:
+            user_history = history if user_id == targets[0] else history.for_user(user_id)
+            started = time.perf_counter()
+            result = fit_params(user_history, initial=initial, epochs=args.epochs)
+            summary = {
+                "user_id": user_id,
+                "reviews": result.reviews,
+                "initial_loss": round(result.initial_loss, 6),
+                "loss": round(result.loss, 6),
+                "seconds": round(time.perf_counter() - started, 2),
+                "params": result.params,
+            }
+            if result.reviews < args.min_reviews:
+                summary["skipped"] = "not enough reviews"
+            elif not args.dry_run:
+                save_params(db, user_id, result)
+            print(json.dumps(summary, ensure_ascii=False))
+            if user_id == GLOBAL_USER_ID and "skipped" not in summary:
+                initial = result.params
+        db.commit()
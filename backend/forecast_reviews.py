@@ -0,0 +1,53 @@
+import argparse
+import csv
+import json
+import time
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.forecast import forecast_reviews
+from app.services.review_log import ReviewArchive
+from app.services.scheduling import get_scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learn2Quiz 今後の復習数の予測")
+    parser.add_argument("--archive-dir", default=settings.REVIEW_ARCHIVE_DIR)
+    parser.add_argument("--user-id", type=int, help="このユーザーだけを予測する（省略すると全ユーザー）")
+    parser.add_argument("--days", type=int, default=settings.FORECAST_DAYS)
+    parser.add_argument("--runs", type=int, default=settings.FORECAST_RUNS)
+    parser.add_argument("--scheduler", default=settings.SCHEDULER)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--per-user", metavar="CSV", help="ユーザーごと・日ごとの復習数（平均）をCSVに書き出す")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        forecast = forecast_reviews(
+            db,
+            get_scheduler(args.scheduler),
+            user_id=args.user_id,
+            days=args.days,
+            runs=args.runs,
+            archive=ReviewArchive(args.archive_dir),
+            seed=args.seed,
+        )
+
+    daily = forecast.daily()
+    for row in daily:
+        print(json.dumps({**row, "day": row["day"].isoformat()}, ensure_ascii=False))
+
+    if args.per_user:
+        with open(args.per_user, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["user_id"] + [row["day"].isoformat() for row in daily])
+            for user_id, counts in zip(forecast.user_ids.tolist(), forecast.per_user):
+                writer.writerow([user_id] + [round(float(count), 2) for count in counts])
+
+    peak = max(daily, key=lambda row: row["reviews"])
+    print(json.dumps({
+        "users": len(forecast.user_ids),
+        "runs": args.runs,
+        "peak_day": peak["day"].isoformat(),
+        "peak_reviews": peak["reviews"],
+        "seconds": round(time.perf_counter() - started, 2),
+    }, ensure_ascii=False))
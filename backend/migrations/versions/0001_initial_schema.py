@@ -0,0 +1,110 @@
+"""initial schema
+
+create_all で作成していた既存DBは `alembic stamp 0001` で取り込む。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("hashed_password", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "notes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("raw_text", sa.Text(), nullable=False),
+        sa.Column("source_type", sa.String(length=50)),
+        sa.Column("title", sa.String(length=200)),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_notes_id", "notes", ["id"])
+
+    op.create_table(
+        "cards",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("note_id", sa.Integer(), sa.ForeignKey("notes.id"), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("prompt", sa.Text(), nullable=False),
+        sa.Column("answer", sa.Text(), nullable=False),
+        sa.Column("choices", sa.JSON()),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("rationale", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_cards_id", "cards", ["id"])
+
+    op.create_table(
+        "review_states",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id"), nullable=False),
+        sa.Column("easiness", sa.Float()),
+        sa.Column("interval_days", sa.Integer()),
+        sa.Column("repetition", sa.Integer()),
+        sa.Column("due_date", sa.DateTime(), nullable=False),
+        sa.Column("last_result", sa.Integer()),
+        sa.Column("last_reviewed", sa.DateTime()),
+    )
+    op.create_index("ix_review_states_id", "review_states", ["id"])
+
+    op.create_table(
+        "quizzes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("title", sa.String(length=200)),
+        sa.Column("completed", sa.Boolean()),
+        sa.Column("score", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("completed_at", sa.DateTime()),
+    )
+    op.create_index("ix_quizzes_id", "quizzes", ["id"])
+
+    op.create_table(
+        "quiz_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("quiz_id", sa.Integer(), sa.ForeignKey("quizzes.id"), nullable=False),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id"), nullable=False),
+        sa.Column("user_answer", sa.Text()),
+        sa.Column("is_correct", sa.Boolean()),
+        sa.Column("time_sec", sa.Integer()),
+    )
+    op.create_index("ix_quiz_items_id", "quiz_items", ["id"])
+
+    op.create_table(
+        "assignments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("owner_user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("title", sa.String(length=200), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("card_ids", sa.JSON()),
+        sa.Column("assignee_ids", sa.JSON()),
+        sa.Column("due_on", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_assignments_id", "assignments", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("assignments", "quiz_items", "quizzes", "review_states", "cards", "notes", "users"):
+        op.drop_table(table)
@@ -0,0 +1,37 @@
+"""hot path composite indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 一意制約の前に重複したReviewStateを整理（最も古い行を残す）
+    op.execute(
+        "DELETE FROM review_states WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM review_states GROUP BY user_id, card_id) AS keep"
+        ")"
+    )
+
+    op.create_index("ix_review_states_user_due", "review_states", ["user_id", "due_date", "card_id"])
+    op.create_index("uq_review_states_user_card", "review_states", ["user_id", "card_id"], unique=True)
+    op.create_index("ix_cards_user_created", "cards", ["user_id", "created_at"])
+    op.create_index("ix_quiz_items_quiz_card", "quiz_items", ["quiz_id", "card_id"])
+    op.create_index("ix_quizzes_user_completed", "quizzes", ["user_id", "completed", "completed_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_quizzes_user_completed", table_name="quizzes")
+    op.drop_index("ix_quiz_items_quiz_card", table_name="quiz_items")
+    op.drop_index("ix_cards_user_created", table_name="cards")
+    op.drop_index("uq_review_states_user_card", table_name="review_states")
+    op.drop_index("ix_review_states_user_due", table_name="review_states")
@@ -0,0 +1,46 @@
+"""jobs table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("payload", sa.JSON()),
+        sa.Column("result", sa.JSON()),
+        sa.Column("error", sa.Text()),
+        sa.Column("progress", sa.Integer()),
+        sa.Column("total", sa.Integer()),
+        sa.Column("attempts", sa.Integer()),
+        sa.Column("max_attempts", sa.Integer()),
+        sa.Column("cancel_requested", sa.Boolean()),
+        sa.Column("available_at", sa.DateTime()),
+        sa.Column("lease_owner", sa.String(length=100)),
+        sa.Column("lease_expires_at", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_jobs_id", "jobs", ["id"])
+    op.create_index("ix_jobs_status_available", "jobs", ["status", "available_at"])
+    op.create_index("ix_jobs_user_created", "jobs", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("jobs")
@@ -0,0 +1,31 @@
+"""generation cache
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "generation_cache",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("generator_version", sa.String(length=20), nullable=False),
+        sa.Column("language", sa.String(length=50)),
+        sa.Column("subject", sa.String(length=50)),
+        sa.Column("cards", sa.JSON(), nullable=False),
+        sa.Column("card_count", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("generation_cache")
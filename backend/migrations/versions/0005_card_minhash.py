@@ -0,0 +1,25 @@
+"""card minhash signatures
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 既存カードの署名は索引の作成時に計算して保存する
+    with op.batch_alter_table("cards") as batch_op:
+        batch_op.add_column(sa.Column("minhash", sa.LargeBinary()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("cards") as batch_op:
+        batch_op.drop_column("minhash")
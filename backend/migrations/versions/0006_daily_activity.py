@@ -0,0 +1,89 @@
+"""daily activity rollup and user streaks
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+"""
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    daily_activity = op.create_table(
+        "daily_activity",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("reviews", sa.Integer(), nullable=False),
+        sa.Column("correct", sa.Integer(), nullable=False),
+        sa.Column("time_sec", sa.Integer(), nullable=False),
+    )
+    user_streaks = op.create_table(
+        "user_streaks",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("current_streak", sa.Integer(), nullable=False),
+        sa.Column("longest_streak", sa.Integer(), nullable=False),
+        sa.Column("last_active_day", sa.Date()),
+    )
+
+    # 既存の提出済みクイズから日ごとの学習量を集計
+    quizzes = sa.table("quizzes", sa.column("id"), sa.column("user_id"), sa.column("completed_at"))
+    quiz_items = sa.table(
+        "quiz_items", sa.column("quiz_id"), sa.column("is_correct"), sa.column("time_sec")
+    )
+    day = sa.func.date(quizzes.c.completed_at)
+    rows = op.get_bind().execute(
+        sa.select(
+            quizzes.c.user_id,
+            day,
+            sa.func.count(),
+            sa.func.sum(sa.case((quiz_items.c.is_correct == sa.true(), 1), else_=0)),
+            sa.func.sum(sa.func.coalesce(quiz_items.c.time_sec, 0)),
+        )
+        .select_from(quizzes.join(quiz_items, quiz_items.c.quiz_id == quizzes.c.id))
+        .where(quizzes.c.completed_at.is_not(None), quiz_items.c.is_correct.is_not(None))
+        .group_by(quizzes.c.user_id, day)
+        .order_by(quizzes.c.user_id, day)
+    ).all()
+
+    activity = []
+    for user_id, activity_day, reviews, correct, time_sec in rows:
+        # SQLiteの date() は文字列を返す
+        if isinstance(activity_day, str):
+            activity_day = date.fromisoformat(activity_day)
+        activity.append({
+            "user_id": user_id,
+            "day": activity_day,
+            "reviews": reviews,
+            "correct": correct or 0,
+            "time_sec": time_sec or 0,
+        })
+    if activity:
+        op.bulk_insert(daily_activity, activity)
+
+    streaks = {}
+    for row in activity:
+        streak = streaks.setdefault(row["user_id"], {
+            "user_id": row["user_id"], "current_streak": 0, "longest_streak": 0, "last_active_day": None,
+        })
+        last_day = streak["last_active_day"]
+        if last_day is not None and row["day"] - last_day == timedelta(days=1):
+            streak["current_streak"] += 1
+        else:
+            streak["current_streak"] = 1
+        streak["longest_streak"] = max(streak["longest_streak"], streak["current_streak"])
+        streak["last_active_day"] = row["day"]
+    if streaks:
+        op.bulk_insert(user_streaks, list(streaks.values()))
+
+
+def downgrade() -> None:
+    op.drop_table("user_streaks")
+    op.drop_table("daily_activity")
@@ -0,0 +1,39 @@
+"""append-only review event log
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 過去の復習は quiz_items に残っているが、復習後の状態は記録されていないため移行しない
+    op.create_table(
+        "review_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id"), nullable=False),
+        sa.Column("quiz_id", sa.Integer(), sa.ForeignKey("quizzes.id")),
+        sa.Column("reviewed_at", sa.DateTime(), nullable=False),
+        sa.Column("quality", sa.Integer(), nullable=False),
+        sa.Column("time_sec", sa.Integer()),
+        sa.Column("easiness", sa.Float(), nullable=False),
+        sa.Column("interval_days", sa.Integer(), nullable=False),
+        sa.Column("repetition", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_review_events_reviewed", "review_events", ["reviewed_at"])
+    op.create_index("ix_review_events_user_reviewed", "review_events", ["user_id", "reviewed_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_review_events_user_reviewed", table_name="review_events")
+    op.drop_index("ix_review_events_reviewed", table_name="review_events")
+    op.drop_table("review_events")
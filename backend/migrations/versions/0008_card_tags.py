@@ -0,0 +1,95 @@
+"""normalized card tags and per-user tag counters
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+"""
+import json
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+MAX_TAG_LENGTH = 100
+BATCH_SIZE = 10000
+
+
+def _normalize_tags(tags):
+    # app.services.tags.normalize_tags と同じ正規化（JSON列は方言により文字列で返る）
+    if isinstance(tags, str):
+        tags = json.loads(tags)
+    normalized = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip()[:MAX_TAG_LENGTH]
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+
+def upgrade() -> None:
+    card_tags = op.create_table(
+        "card_tags",
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id"), primary_key=True),
+        sa.Column("tag", sa.String(length=100), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+    )
+    op.create_index("ix_card_tags_user_tag", "card_tags", ["user_id", "tag", "card_id"])
+    tag_stats = op.create_table(
+        "tag_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("tag", sa.String(length=100), primary_key=True),
+        sa.Column("correct", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+    )
+
+    connection = op.get_bind()
+    cards = sa.table("cards", sa.column("id"), sa.column("user_id"), sa.column("tags"))
+    quizzes = sa.table("quizzes", sa.column("id"), sa.column("completed"))
+    quiz_items = sa.table("quiz_items", sa.column("quiz_id"), sa.column("card_id"), sa.column("is_correct"))
+
+    # カードのJSON列から card_tags を作成
+    rows = []
+    for card_id, user_id, tags in connection.execute(
+        sa.select(cards.c.id, cards.c.user_id, cards.c.tags).where(cards.c.tags.is_not(None))
+    ):
+        rows.extend({"card_id": card_id, "tag": tag, "user_id": user_id} for tag in _normalize_tags(tags))
+        if len(rows) >= BATCH_SIZE:
+            op.bulk_insert(card_tags, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(card_tags, rows)
+
+    # 提出済みクイズの回答からタグごとの回答数・正解数を集計
+    totals = Counter()
+    corrects = Counter()
+    for user_id, tags, is_correct in connection.execute(
+        sa.select(cards.c.user_id, cards.c.tags, quiz_items.c.is_correct)
+        .select_from(
+            quiz_items
+            .join(quizzes, quizzes.c.id == quiz_items.c.quiz_id)
+            .join(cards, cards.c.id == quiz_items.c.card_id)
+        )
+        .where(quizzes.c.completed == sa.true(), quiz_items.c.is_correct.is_not(None), cards.c.tags.is_not(None))
+    ):
+        for tag in _normalize_tags(tags):
+            totals[(user_id, tag)] += 1
+            corrects[(user_id, tag)] += 1 if is_correct else 0
+    if totals:
+        op.bulk_insert(tag_stats, [
+            {"user_id": user_id, "tag": tag, "correct": corrects[(user_id, tag)], "total": total}
+            for (user_id, tag), total in totals.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table("tag_stats")
+    op.drop_index("ix_card_tags_user_tag", table_name="card_tags")
+    op.drop_table("card_tags")
@@ -0,0 +1,38 @@
+"""fsrs memory state and fitted scheduler parameters
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 既存のカードはFSRSで初めて復習したときにSM-2の間隔・EF値から初期化する
+    with op.batch_alter_table("review_states") as batch_op:
+        batch_op.add_column(sa.Column("stability", sa.Float()))
+        batch_op.add_column(sa.Column("difficulty", sa.Float()))
+
+    op.create_table(
+        "scheduler_params",
+        sa.Column("scheduler", sa.String(length=20), primary_key=True),
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("params", sa.JSON(), nullable=False),
+        sa.Column("review_count", sa.Integer()),
+        sa.Column("loss", sa.Float()),
+        sa.Column("fitted_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduler_params")
+    with op.batch_alter_table("review_states") as batch_op:
+        batch_op.drop_column("difficulty")
+        batch_op.drop_column("stability")
@@ -0,0 +1,27 @@
+"""reuse the open daily quiz per user and local date
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 既存のクイズは使い回さない（daily_key は NULL のまま）
+    with op.batch_alter_table("quizzes") as batch_op:
+        batch_op.add_column(sa.Column("daily_key", sa.String(length=32)))
+    op.create_index("uq_quizzes_user_daily_key", "quizzes", ["user_id", "daily_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("uq_quizzes_user_daily_key", table_name="quizzes")
+    with op.batch_alter_table("quizzes") as batch_op:
+        batch_op.drop_column("daily_key")
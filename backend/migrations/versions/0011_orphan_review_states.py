@@ -0,0 +1,23 @@
+"""delete review states whose cards were deleted with their note
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ノートの削除でカードだけが消え、残っていたReviewStateを削除する
+    op.execute("DELETE FROM review_states WHERE card_id NOT IN (SELECT id FROM cards)")
+
+
+def downgrade() -> None:
+    # 削除した行は戻せない
+    pass
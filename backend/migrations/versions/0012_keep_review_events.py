@@ -0,0 +1,36 @@
+"""keep review events of deleted cards
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+# SQLiteでは外部キーに名前がないため、この規則で付けた名前で削除・作成する
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+CARD_FK = "fk_review_events_card_id_cards"
+
+
+def upgrade() -> None:
+    # 追記専用の復習ログはカードを削除しても残す（FSRSの推定にも使う）ため、cards への外部キーを外す
+    name = next(
+        fk["name"]
+        for fk in sa.inspect(op.get_bind()).get_foreign_keys("review_events")
+        if fk["constrained_columns"] == ["card_id"]
+    )
+    with op.batch_alter_table("review_events", naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(name or CARD_FK, type_="foreignkey")
+
+
+def downgrade() -> None:
+    # 外部キーを戻す前に、削除済みのカードの復習ログを削除する
+    op.execute("DELETE FROM review_events WHERE card_id NOT IN (SELECT id FROM cards)")
+    with op.batch_alter_table("review_events", naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.create_foreign_key(CARD_FK, "cards", ["card_id"], ["id"])
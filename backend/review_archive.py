@@ -0,0 +1,71 @@
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+import numpy as np
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.review_log import MISSING, ReviewArchive, archive_cutoff, compact_review_events
+
+
+def _compact(archive: ReviewArchive, args) -> None:
+    before = archive_cutoff(retention_days=args.retention_days)
+    with SessionLocal() as db:
+        result = compact_review_events(db, archive, before, args.chunk_rows)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def _info(archive: ReviewArchive, args) -> None:
+    manifest = archive.manifest()
+    months = {}
+    for part in manifest["parts"]:
+        months[part["month"]] = months.get(part["month"], 0) + part["rows"]
+    print(f"archived_before: {manifest['archived_before']}")
+    for month, rows in sorted(months.items()):
+        print(f"{month}: {rows} reviews")
+
+
+def _export(archive: ReviewArchive, args) -> None:
+    start = datetime.fromisoformat(args.start) if args.start else None
+    end = datetime.fromisoformat(args.end) if args.end else None
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output != "-" else sys.stdout
+    try:
+        writer = None
+        for chunk in archive.scan(user_id=args.user_id, start=start, end=end):
+            if writer is None:
+                writer = csv.writer(out)
+                writer.writerow(list(chunk))
+            values = [
+                np.datetime_as_string(column, unit="s") if column.dtype.kind == "M" else column
+                for column in chunk.values()
+            ]
+            for row in zip(*(column.tolist() for column in values)):
+                writer.writerow(["" if value == MISSING else value for value in row])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learn2Quiz 復習ログのアーカイブ")
+    parser.add_argument("--archive-dir", default=settings.REVIEW_ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact = commands.add_parser("compact", help="保持期間を過ぎた月の復習ログをファイルに移す")
+    compact.add_argument("--retention-days", type=int, default=settings.REVIEW_EVENTS_RETENTION_DAYS)
+    compact.add_argument("--chunk-rows", type=int, default=settings.REVIEW_ARCHIVE_CHUNK_ROWS)
+    compact.set_defaults(handler=_compact)
+
+    info = commands.add_parser("info", help="アーカイブ済みの月と件数を表示")
+    info.set_defaults(handler=_info)
+
+    export = commands.add_parser("export", help="アーカイブをCSVに書き出す")
+    export.add_argument("output", help="出力ファイル（- で標準出力）")
+    export.add_argument("--user-id", type=int)
+    export.add_argument("--start", help="開始日時（ISO形式、この日時を含む）")
+    export.add_argument("--end", help="終了日時（ISO形式、この日時を含まない）")
+    export.set_defaults(handler=_export)
+
+    args = parser.parse_args()
+    args.handler(ReviewArchive(args.archive_dir), args)
@@ -1,11 +1,16 @@
 import uvicorn
+from alembic import command
+from alembic.config import Config
 from app.main import app
 
 if __name__ == "__main__":
+    # 開発サーバー起動前にマイグレーションを適用（本番はデプロイ時に1回だけ実行）
+    command.upgrade(Config("alembic.ini"), "head")
+    
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
         log_level="info"
-    )
\ No newline at end of file
+    )
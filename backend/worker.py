@@ -0,0 +1,33 @@
+import argparse
+import multiprocessing
+import signal
+import threading
+from app.services.jobs import run_worker
+
+
+def _serve() -> None:
+    stop_event = threading.Event()
+    # SIGTERM/SIGINT を受けたら実行中のジョブを終えてから停止
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    run_worker(stop_event=stop_event)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learn2Quiz ジョブワーカー")
+    parser.add_argument("--processes", type=int, default=1, help="ワーカープロセス数")
+    args = parser.parse_args()
+    
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_serve, name=f"worker-{i}") for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()